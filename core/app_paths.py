@@ -0,0 +1,13 @@
+# EthoGrid_App/core/app_paths.py
+
+import os
+
+def get_cache_dir(*subdirs):
+    """
+    Returns (and creates) a per-user cache folder for EthoGrid.
+    Honors the ETHOGRID_CACHE_DIR environment variable, otherwise uses ~/.ethogrid/cache.
+    """
+    base_dir = os.environ.get("ETHOGRID_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".ethogrid", "cache")
+    path = os.path.join(base_dir, *subdirs)
+    os.makedirs(path, exist_ok=True)
+    return path
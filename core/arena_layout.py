@@ -0,0 +1,110 @@
+# EthoGrid_App/core/arena_layout.py
+
+import cv2
+import numpy as np
+from core.tank_assignment import TankGrid, settings_matrix, NO_TANK
+
+ARENA_GRID, ARENA_WELLS, ARENA_POLYGONS = "grid", "wells", "polygons"
+WELL_SEGMENTS = 72   # vertices of the polygon a circular well is outlined with
+_SUBPIXEL_BITS = 4   # outlines are rasterized with 1/16 px precision
+
+
+class ArenaLayout:
+    """
+    The tanks of a recording as outlines in video pixels: the cells of a (transformed) uniform
+    grid, circular wells, or arbitrary polygons.
+
+    The layout is rasterized once into a label image at video resolution (0 outside every tank,
+    otherwise the tank number), so looking up the tank of any number of points is one array
+    index, and clipping a mask to its tank is a comparison against the same image. Grid layouts
+    keep their TankGrid and assign points through its exact inverse transform instead, so points
+    on or near a grid line get the same tank as everywhere else in the app.
+    """
+    def __init__(self, outlines, video_size, kind=ARENA_POLYGONS, grid=None):
+        self.kind = kind
+        self.grid = grid                # TankGrid of a grid layout, None for wells and polygons
+        self.video_size = (int(video_size[0]), int(video_size[1]))
+        self.outlines = {int(tank): np.asarray(points, dtype=np.float64).reshape(-1, 2) for tank, points in outlines.items()}
+        self.tank_numbers = sorted(self.outlines)
+        self._labels = None
+
+    @classmethod
+    def grid(cls, matrix, video_size, cols, rows):
+        """The cells of a rows x cols grid placed by a grid matrix (see core.tank_assignment)."""
+        grid = TankGrid(matrix, video_size, cols, rows)
+        return cls(grid.cell_outlines(), video_size, ARENA_GRID, grid)
+
+    @classmethod
+    def wells(cls, wells, video_size):
+        """Circular wells from {tank: (cx, cy, radius)} in video pixels."""
+        angles = np.linspace(0.0, 2.0 * np.pi, WELL_SEGMENTS, endpoint=False)
+        outlines = {tank: np.column_stack((cx + r * np.cos(angles), cy + r * np.sin(angles))) for tank, (cx, cy, r) in wells.items()}
+        return cls(outlines, video_size, ARENA_WELLS)
+
+    @classmethod
+    def polygons(cls, polygons, video_size):
+        """Arbitrary tank outlines from {tank: [(x, y), ...]} in video pixels."""
+        return cls(polygons, video_size, ARENA_POLYGONS)
+
+    @classmethod
+    def from_settings(cls, settings_data, video_size):
+        """
+        The layout of a settings JSON. Without an 'arena' block (or with type 'grid') it is the
+        grid of 'grid_settings'/'grid_transform'. Otherwise 'arena' holds
+        {"type": "wells", "wells": [{"tank": 1, "center": [x, y], "radius": r}, ...]} or
+        {"type": "polygons", "polygons": [{"tank": 1, "points": [[x, y], ...]}, ...]}, in pixels of
+        'video_dimensions' (scaled to `video_size` when the video differs).
+        """
+        w, h = video_size
+        arena = settings_data.get('arena') or {}
+        kind = arena.get('type', ARENA_GRID)
+        if kind == ARENA_GRID:
+            grid_settings = settings_data['grid_settings']
+            return cls.grid(settings_matrix(settings_data['grid_transform'], w, h), video_size, grid_settings['cols'], grid_settings['rows'])
+        dims = settings_data.get('video_dimensions') or {'width': w, 'height': h}
+        sx, sy = w / float(dims['width']), h / float(dims['height'])
+        if kind == ARENA_WELLS:
+            return cls.wells({int(well['tank']): (well['center'][0] * sx, well['center'][1] * sy, well['radius'] * (sx + sy) / 2.0)
+                              for well in arena['wells']}, video_size)
+        if kind == ARENA_POLYGONS:
+            return cls.polygons({int(p['tank']): np.asarray(p['points'], dtype=np.float64) * (sx, sy) for p in arena['polygons']}, video_size)
+        raise ValueError(f"Unknown arena type: {kind}")
+
+    def __len__(self):
+        return len(self.tank_numbers)
+
+    @property
+    def max_tank(self):
+        return max(self.tank_numbers, default=0)
+
+    @property
+    def labels(self):
+        """(height, width) label image: the tank number of every pixel, 0 outside the tanks. Built on first use."""
+        if self._labels is None:
+            w, h = self.video_size
+            labels = np.zeros((h, w), dtype=np.uint8 if self.max_tank < 256 else np.uint16)
+            scale = 1 << _SUBPIXEL_BITS
+            for tank in self.tank_numbers:  # where outlines overlap, the higher tank number wins
+                points = np.rint(self.outlines[tank] * scale).astype(np.int32)
+                cv2.fillPoly(labels, [points], int(tank), lineType=cv2.LINE_8, shift=_SUBPIXEL_BITS)
+            self._labels = labels
+        return self._labels
+
+    def assign(self, x, y):
+        """Tank numbers (int64) of the points (x, y); NO_TANK outside every tank, off-frame or NaN."""
+        if self.grid is not None: return self.grid.assign(x, y)
+        w, h = self.video_size
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            inside = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+        xi, yi = np.where(inside, x, 0.0).astype(np.int64), np.where(inside, y, 0.0).astype(np.int64)
+        return np.where(inside, self.labels[yi, xi], NO_TANK).astype(np.int64)
+
+    def tank_for_point(self, x, y):
+        """Tank number of a single point, or None outside the tanks."""
+        tank = int(self.assign(x, y))
+        return tank if tank != NO_TANK else None
+
+    def outline(self, tank):
+        """The outline of a tank as an (N, 2) int32 pixel polygon, e.g. for drawing."""
+        return np.rint(self.outlines[int(tank)]).astype(np.int32)
@@ -0,0 +1,160 @@
+# EthoGrid_App/core/batch_tuner.py
+
+import os
+import json
+import time
+import socket
+import threading
+from core.app_paths import get_cache_dir
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_CANDIDATES = (1, 2, 4, 8, 12, 16, 24, 32)
+CACHE_FILENAME = "batch_sizes.json"
+_cache_lock = threading.Lock()
+_warned_unenforced = False   # the "ceiling cannot be enforced" warning is logged once per process
+
+
+def _cache_path():
+    return os.path.join(get_cache_dir(), CACHE_FILENAME)
+
+def _cache_key(model_path, width, height, device, memory_limit_mb):
+    """A cached choice is only valid for the same weights file, resolution, machine, device and ceiling."""
+    try:
+        stat = os.stat(model_path)
+        model_id = f"{os.path.abspath(model_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+    except OSError:
+        model_id = os.path.abspath(model_path)
+    return f"{model_id}|{width}x{height}|{socket.gethostname()}|{device}|{memory_limit_mb or 0}"
+
+def _read_cache():
+    try:
+        with open(_cache_path(), 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_cached_batch_size(model_path, width, height, device, memory_limit_mb=None):
+    entry = _read_cache().get(_cache_key(model_path, width, height, device, memory_limit_mb))
+    return entry.get('batch_size') if entry else None
+
+def save_cached_batch_size(model_path, width, height, device, memory_limit_mb, batch_size, fps):
+    with _cache_lock:
+        cache = _read_cache()
+        cache[_cache_key(model_path, width, height, device, memory_limit_mb)] = {'batch_size': batch_size, 'fps': round(fps, 2), 'tuned_at': time.strftime("%Y-%m-%d %H:%M:%S")}
+        tmp_path = _cache_path() + ".tmp"
+        with open(tmp_path, 'w') as f: json.dump(cache, f, indent=4)
+        os.replace(tmp_path, _cache_path())
+
+class _MemoryProbe:
+    """
+    Measures the extra memory the calls inside a `with` block need: the peak CUDA allocation on GPU,
+    or the peak resident set size (sampled every `interval` seconds) on CPU, minus the baseline
+    taken on entry. The model, frame buffers and GUI the process already holds are not counted.
+    `peak_mb` is None if memory cannot be measured.
+    """
+    def __init__(self, device, interval=0.005):
+        self.device, self.interval = device, interval
+        self.peak_mb = None
+        self._baseline, self._peak, self._stop, self._thread = None, None, threading.Event(), None
+
+    def __enter__(self):
+        if self.device == "cuda":
+            try:
+                import torch
+                torch.cuda.empty_cache(); torch.cuda.reset_peak_memory_stats()
+                self._baseline = torch.cuda.memory_allocated()
+            except Exception:
+                self._baseline = None
+        elif psutil is not None:
+            process = psutil.Process()
+            self._baseline = self._peak = process.memory_info().rss
+            def sample():
+                while not self._stop.wait(self.interval):
+                    self._peak = max(self._peak, process.memory_info().rss)
+            self._thread = threading.Thread(target=sample, daemon=True); self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._baseline is None: return False
+        if self.device == "cuda":
+            try:
+                import torch
+                self.peak_mb = max(0, torch.cuda.max_memory_allocated() - self._baseline) / 2**20
+            except Exception:
+                pass
+        else:
+            self._stop.set(); self._thread.join()
+            self._peak = max(self._peak, psutil.Process().memory_info().rss)
+            self.peak_mb = max(0, self._peak - self._baseline) / 2**20
+        return False
+
+def autotune_batch_size(predict, frames, device="cpu", candidates=DEFAULT_CANDIDATES, memory_limit_mb=None, repeats=2):
+    """
+    Times `predict` on growing slices of the warm-up frames and picks the fastest batch size.
+
+    Each candidate gets one untimed warm-up call followed by `repeats` timed calls; the best
+    time is kept. The sweep stops at the first batch size that raises (e.g. out of memory)
+    or whose calls need more than `memory_limit_mb` on top of what the process already held
+    before them, since larger batches would only need more.
+
+    Returns:
+        tuple: (best_batch_size, trials) where trials is a list of dicts describing each candidate.
+    """
+    trials = []
+    best_size, best_fps = 1, 0.0
+    for size in sorted(c for c in candidates if c <= len(frames)):
+        batch = frames[:size]
+        try:
+            with _MemoryProbe(device) as probe:
+                predict(batch)
+                elapsed = min(_timed(predict, batch) for _ in range(max(1, repeats)))
+        except Exception as e:
+            trials.append({'batch_size': size, 'fps': 0.0, 'memory_mb': None, 'error': str(e).splitlines()[0] if str(e) else type(e).__name__})
+            break
+        fps = size / elapsed if elapsed > 0 else float('inf')
+        memory_mb = probe.peak_mb
+        over_limit = bool(memory_limit_mb) and memory_mb is not None and memory_mb > memory_limit_mb
+        trials.append({'batch_size': size, 'fps': fps, 'memory_mb': memory_mb, 'error': "memory ceiling exceeded" if over_limit else None})
+        if over_limit: break
+        if fps > best_fps: best_size, best_fps = size, fps
+    return best_size, trials
+
+def _timed(predict, batch):
+    start = time.perf_counter()
+    predict(batch)
+    return time.perf_counter() - start
+
+def resolve_batch_size(model_path, predict, get_frames, width, height, device, memory_limit_mb=None, candidates=DEFAULT_CANDIDATES, log=print):
+    """
+    Returns the batch size to use for this model/resolution/host, running a sweep only on a cache miss.
+    `get_frames` is only called on a miss and must return the warm-up frames.
+    Progress and the reason for the final choice are reported through `log`.
+    """
+    cached = load_cached_batch_size(model_path, width, height, device, memory_limit_mb)
+    if cached:
+        log(f"Using cached batch size {cached} for {os.path.basename(model_path)} at {width}x{height} on {device}.")
+        return cached
+
+    frames = get_frames()
+    if not frames:
+        return max(1, min(candidates))
+    log(f"Auto-tuning batch size on {len(frames)} warm-up frames (candidates: {', '.join(map(str, candidates))})...")
+    best_size, trials = autotune_batch_size(predict, frames, device, candidates, memory_limit_mb)
+    for t in trials:
+        mem_str = f", {t['memory_mb']:.0f} MB" if t['memory_mb'] is not None else ""
+        status = f" - stopped: {t['error']}" if t['error'] else ""
+        log(f"  - batch {t['batch_size']:>3}: {t['fps']:.2f} FPS{mem_str}{status}")
+    global _warned_unenforced
+    if memory_limit_mb and not _warned_unenforced and any(t['memory_mb'] is None and not t['error'] for t in trials):
+        _warned_unenforced = True
+        log(f"[WARNING] The {memory_limit_mb} MB memory ceiling could not be enforced: memory use on {device} cannot be measured"
+            + (" without psutil (pip install psutil)." if device != "cuda" else "."))
+    best_fps = max((t['fps'] for t in trials if t['batch_size'] == best_size and not t['error']), default=0.0)
+    log(f"Selected batch size {best_size} ({best_fps:.2f} FPS).")
+    if best_fps > 0:
+        try: save_cached_batch_size(model_path, width, height, device, memory_limit_mb, best_size, best_fps)
+        except OSError as e: log(f"[WARNING] Could not cache batch size: {e}")
+    return best_size
@@ -0,0 +1,308 @@
+# EthoGrid_App/core/benchmark.py
+
+"""
+Inference throughput benchmark: `python -m ethogrid bench ...`.
+
+Renders synthetic multi-tank videos with moving worm-like blobs, runs the detection and
+segmentation workers on them headless with per-stage timings (see core/stage_timer.py) and
+compares the results with a baseline JSON so slowdowns show up. Without a model argument a
+randomly initialised YOLOv8 model is built from the configs bundled with ultralytics, so it
+runs on a CPU-only machine without network access. Such a model measures speed only: it finds
+few or no animals, which leaves post-processing and drawing lightly loaded. Pass trained
+weights to measure those stages under a realistic number of detections.
+
+`python -m ethogrid bench-tracking` measures the trackers alone on synthetic per-tank
+detections and reports how closely the built-in centroid tracker agrees with Norfair.
+"""
+
+import os
+import json
+import math
+import time
+import platform
+import numpy as np
+import cv2
+
+RESULTS_VERSION = 1
+TASKS = ("detect", "segment")
+DEFAULT_TOLERANCE = 0.15     # relative slowdown that counts as a regression
+MIN_STAGE_DELTA_MS = 0.5     # stage slowdowns below this many ms per frame are treated as noise
+SYNTHETIC_CLASS = "worm"
+
+
+# --- Synthetic videos ---
+
+def grid_shape(tanks):
+    """(rows, cols) of the most square grid holding `tanks` tanks."""
+    cols = max(1, math.ceil(math.sqrt(tanks)))
+    return max(1, math.ceil(tanks / cols)), cols
+
+def write_grid_settings(path, tanks, width, height):
+    """Writes a settings JSON (as saved from the main window) whose untransformed grid matches the synthetic tanks."""
+    rows, cols = grid_shape(tanks)
+    settings_data = {
+        'video_dimensions': {'width': width, 'height': height},
+        'grid_settings': {'cols': cols, 'rows': rows},
+        'line_thickness': 2,
+        'grid_transform': {'center_x': 0.5, 'center_y': 0.5, 'angle': 0.0, 'scale_x': 1.0, 'scale_y': 1.0},
+    }
+    with open(path, 'w') as f: json.dump(settings_data, f, indent=4)
+    return path
+
+
+class _Worm:
+    """A head doing a correlated random walk inside its tank; the body follows the head's trail."""
+    def __init__(self, rng, bounds, length):
+        self.rng, self.bounds = rng, bounds
+        x0, y0, x1, y1 = bounds
+        self.x, self.y = rng.uniform(x0, x1), rng.uniform(y0, y1)
+        self.heading = rng.uniform(0, 2 * np.pi)
+        self.speed = length / 30.0
+        self.trail = []
+        self.trail_length = max(2, int(length / self.speed))
+        for _ in range(self.trail_length): self.step()
+
+    def step(self):
+        x0, y0, x1, y1 = self.bounds
+        self.heading += self.rng.normal(0.0, 0.3)
+        x, y = self.x + self.speed * np.cos(self.heading), self.y + self.speed * np.sin(self.heading)
+        if not x0 <= x <= x1: self.heading = np.pi - self.heading; x = min(max(x, x0), x1)
+        if not y0 <= y <= y1: self.heading = -self.heading; y = min(max(y, y0), y1)
+        self.x, self.y = x, y
+        self.trail.append((x, y))
+        del self.trail[:-self.trail_length]
+
+    def points(self, segments=10):
+        trail = np.asarray(self.trail)
+        return np.rint(trail[np.linspace(0, len(trail) - 1, segments).astype(int)]).astype(np.int32)
+
+
+def write_synthetic_video(path, width=1280, height=720, fps=30.0, frames=300, tanks=6, worms_per_tank=1, seed=0):
+    """
+    Renders `frames` frames of `tanks` light tanks on a dark background, each with
+    `worms_per_tank` dark worm-like blobs moving about. The video is fully determined by `seed`.
+    """
+    rng = np.random.default_rng(seed)
+    rows, cols = grid_shape(tanks)
+    cell_w, cell_h = width / cols, height / rows
+
+    background = np.full((height, width, 3), 35, dtype=np.uint8)
+    worms, thickness = [], max(2, int(min(cell_w, cell_h) / 40))
+    for t in range(tanks):
+        r, c = divmod(t, cols)
+        margin_x, margin_y = cell_w * 0.06, cell_h * 0.06
+        x0, y0 = int(c * cell_w + margin_x), int(r * cell_h + margin_y)
+        x1, y1 = int((c + 1) * cell_w - margin_x), int((r + 1) * cell_h - margin_y)
+        cv2.rectangle(background, (x0, y0), (x1, y1), (205, 210, 200), -1)
+        cv2.rectangle(background, (x0, y0), (x1, y1), (120, 120, 120), 2)
+        inner = (x0 + 2 * thickness, y0 + 2 * thickness, x1 - 2 * thickness, y1 - 2 * thickness)
+        worms.extend(_Worm(rng, inner, 0.25 * min(x1 - x0, y1 - y0)) for _ in range(worms_per_tank))
+    # Static sensor noise, so the frames are not trivially compressible
+    noise = rng.normal(0.0, 4.0, background.shape)
+    background = np.clip(background + noise, 0, 255).astype(np.uint8)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open a video writer for {path}")
+    try:
+        for _ in range(frames):
+            frame = background.copy()
+            for worm in worms:
+                worm.step()
+                points = worm.points()
+                cv2.polylines(frame, [points], False, (45, 55, 60), thickness, cv2.LINE_AA)
+                cv2.circle(frame, tuple(points[-1].tolist()), thickness, (30, 35, 40), -1, cv2.LINE_AA)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+# --- Models ---
+
+def build_random_model(task, path, seed=0, scale="n"):
+    """Saves a randomly initialised single-class YOLOv8 `task` model to `path`; no download needed."""
+    import torch
+    from ultralytics.nn.tasks import DetectionModel, SegmentationModel
+    torch.manual_seed(seed)
+    if task == "segment": model = SegmentationModel(f"yolov8{scale}-seg.yaml", nc=1, verbose=False)
+    else: model = DetectionModel(f"yolov8{scale}.yaml", nc=1, verbose=False)
+    model.names = {0: SYNTHETIC_CLASS}
+    torch.save({"model": model, "train_args": {"task": task}}, path)
+    return path
+
+
+# --- Runs ---
+
+def environment():
+    """Versions and hardware the results were measured on."""
+    info = {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.processor(),
+            "cpu_count": os.cpu_count(), "numpy": np.__version__, "opencv": cv2.__version__}
+    for module in ("torch", "ultralytics"):
+        try: info[module] = __import__(module).__version__
+        except Exception: info[module] = None
+    try:
+        import torch
+        info["cuda"] = torch.cuda.is_available()
+    except Exception:
+        info["cuda"] = False
+    return info
+
+def run_case(task, video_path, model_path, output_dir, confidence=0.25, **worker_kwargs):
+    """
+    Runs the `task` worker on one video and returns its measurements: the processing time of the
+    video (from the first to the last frame, i.e. without loading the model), frames per second,
+    the total wall time and the time per stage.
+    """
+    from PyQt5.QtCore import Qt
+    from core.cli import run_worker, EventStream
+    from core.stage_timer import StageTimer
+    if task == "detect": from workers.yolo_processor_batch import YoloProcessor as worker_cls
+    else: from workers.yolo_segmentation_processor import YoloSegmentationProcessor as worker_cls
+
+    timer, last = StageTimer(), []
+    worker = worker_cls([video_path], model_path, output_dir, confidence, stage_timer=timer, **worker_kwargs)
+
+    def on_progress(update):
+        if update.total: last[:] = [update]  # the empty update at the start of a file is skipped
+    worker.progress_updated.connect(on_progress, Qt.DirectConnection)
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as sink:
+        exit_code = run_worker(worker, EventStream(sink))
+    wall = time.perf_counter() - started
+
+    update = last[0] if last else None
+    frames = update.done if update is not None else 0
+    seconds = update.elapsed if update is not None else 0.0
+    return {"exit_code": exit_code, "frames": frames, "processing_seconds": round(seconds, 4),
+            "fps": round(frames / seconds, 3) if seconds > 0 else 0.0, "wall_seconds": round(wall, 4),
+            "stages": timer.summary(frames)}
+
+def fastest(runs):
+    """The run with the highest throughput among the successful `runs` (the first run if none succeeded)."""
+    ok = [r for r in runs if r["exit_code"] == 0]
+    return max(ok, key=lambda r: r["fps"]) if ok else runs[0]
+
+
+# --- Results ---
+
+def save_results(path, results):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f: json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_results(path):
+    with open(path, 'r') as f: results = json.load(f)
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{path} is not a version {RESULTS_VERSION} benchmark result")
+    return results
+
+def config_differences(results, baseline):
+    """Names of the settings that differ between two results; their timings are not comparable."""
+    a, b = results.get("config", {}), baseline.get("config", {})
+    return sorted(key for key in set(a) | set(b) if a.get(key) != b.get(key))
+
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE, min_stage_delta_ms=MIN_STAGE_DELTA_MS):
+    """
+    Lists the regressions of `results` against `baseline`: cases whose throughput dropped by more
+    than `tolerance`, and stages whose time per frame grew by more than `tolerance` (and by at
+    least `min_stage_delta_ms`, so sub-millisecond stages do not flag on noise).
+    """
+    regressions = []
+    for name, case in results.get("cases", {}).items():
+        base = baseline.get("cases", {}).get(name)
+        if not base or case.get("exit_code") or base.get("exit_code"): continue
+        if base.get("fps") and case["fps"] < base["fps"] * (1.0 - tolerance):
+            regressions.append({"case": name, "metric": "fps", "baseline": base["fps"], "value": case["fps"],
+                                "change": round(case["fps"] / base["fps"] - 1.0, 4)})
+        for stage, entry in case.get("stages", {}).items():
+            base_ms, ms = base.get("stages", {}).get(stage, {}).get("ms_per_frame"), entry.get("ms_per_frame")
+            if not base_ms or ms is None: continue
+            if ms > base_ms * (1.0 + tolerance) and ms - base_ms >= min_stage_delta_ms:
+                regressions.append({"case": name, "metric": f"{stage}_ms_per_frame", "baseline": base_ms, "value": ms,
+                                    "change": round(ms / base_ms - 1.0, 4)})
+    return regressions
+
+
+# --- Tracking ---
+
+def _synthetic_detection(x, y, conf, half_size=10.0):
+    return {'class_name': SYNTHETIC_CLASS, 'conf': conf, 'x1': x - half_size, 'y1': y - half_size,
+            'x2': x + half_size, 'y2': y + half_size, 'cx': x, 'cy': y, 'polygon': ''}
+
+def synthetic_tank_detections(tanks=48, frames=1800, animals_per_tank=1, seed=0, miss_rate=0.05, false_rate=0.02, noise=2.0, tank_size=200.0):
+    """
+    Per-tank detections as the trackers take them ({tank: [(frame_idx, [detection dict, ...]), ...]}),
+    without rendering a video: `animals_per_tank` worms walk about each `tank_size` px tank and are
+    detected with probability 1 - `miss_rate` and `noise` px of centroid jitter, plus a spurious
+    detection in a random spot with probability `false_rate` per tank and frame.
+    """
+    rng = np.random.default_rng(seed)
+    frames_by_tank = {}
+    for tank in range(1, tanks + 1):
+        worms = [_Worm(rng, (0.0, 0.0, tank_size, tank_size), 0.25 * tank_size) for _ in range(animals_per_tank)]
+        tank_frames = []
+        for frame_idx in range(frames):
+            dets = []
+            for worm in worms:
+                worm.step()
+                if rng.random() >= miss_rate:
+                    dets.append(_synthetic_detection(worm.x + rng.normal(0.0, noise), worm.y + rng.normal(0.0, noise), rng.uniform(0.5, 1.0)))
+            if rng.random() < false_rate:
+                dets.append(_synthetic_detection(rng.uniform(0.0, tank_size), rng.uniform(0.0, tank_size), rng.uniform(0.25, 0.5)))
+            if dets: tank_frames.append((frame_idx, dets))
+        frames_by_tank[tank] = tank_frames
+    return frames_by_tank
+
+def run_tracking_case(method, frames_by_tank, params, fps=30.0, num_processes=1):
+    """
+    Tracks all tanks with `method` (see core.tracker) and returns (measurements, per-tank results).
+    `video_fps` is how many video frames, with every tank, are tracked per second; `realtime` tells
+    whether that keeps up with a `fps` recording.
+    """
+    from core.tracker import track_tanks
+    frames = 1 + max((tank_frames[-1][0] for tank_frames in frames_by_tank.values() if tank_frames), default=-1)
+    tank_frames = sum(len(tank_frames) for tank_frames in frames_by_tank.values())
+    started = time.perf_counter()
+    results = track_tanks(frames_by_tank, params, num_processes=num_processes, method=method)
+    seconds = time.perf_counter() - started
+    video_fps = frames / seconds if seconds > 0 else 0.0
+    return {"frames": frames, "tanks": len(frames_by_tank), "tank_frames": tank_frames, "seconds": round(seconds, 4),
+            "tank_frames_per_second": round(tank_frames / seconds, 1) if seconds > 0 else 0.0,
+            "video_fps": round(video_fps, 2), "realtime": video_fps >= fps,
+            "tracks": sum(len({det['track_id'] for _, det in tracked}) for tracked in results.values())}, results
+
+def tracking_agreement(reference, candidate, max_distance=10.0):
+    """
+    Compares two trackers' per-tank results ({tank: [(frame_idx, tracked detection dict), ...]}).
+    Tracked positions of a tank and frame are paired optimally within `max_distance` px; `recall`
+    and `precision` are the paired shares of the reference's and candidate's rows, and
+    `id_agreement` the share of pairs whose candidate track is the one its reference track is
+    paired with most often (1.0 when the two split the data into the same tracks).
+    """
+    from scipy.optimize import linear_sum_assignment
+    reference_rows = candidate_rows = 0
+    distances, pairs = [], {}
+    for tank in sorted(set(reference) | set(candidate)):
+        by_frame = {}
+        for side, tracked in ((0, reference.get(tank, [])), (1, candidate.get(tank, []))):
+            for frame_idx, det in tracked: by_frame.setdefault(frame_idx, ([], []))[side].append(det)
+        for ref_dets, cand_dets in by_frame.values():
+            reference_rows += len(ref_dets); candidate_rows += len(cand_dets)
+            if not ref_dets or not cand_dets: continue
+            a = np.array([(d['cx'], d['cy']) for d in ref_dets], dtype=np.float64)
+            b = np.array([(d['cx'], d['cy']) for d in cand_dets], dtype=np.float64)
+            cost = np.hypot(a[:, None, 0] - b[None, :, 0], a[:, None, 1] - b[None, :, 1])
+            for i, j in zip(*linear_sum_assignment(cost)):
+                if cost[i, j] > max_distance: continue
+                distances.append(cost[i, j])
+                key = (tank, ref_dets[i]['track_id'], cand_dets[j]['track_id'])
+                pairs[key] = pairs.get(key, 0) + 1
+    best = {}
+    for (tank, ref_id, _), count in pairs.items(): best[(tank, ref_id)] = max(best.get((tank, ref_id), 0), count)
+    matched = len(distances)
+    return {"reference_rows": reference_rows, "candidate_rows": candidate_rows, "matched": matched,
+            "recall": round(matched / reference_rows, 4) if reference_rows else 1.0,
+            "precision": round(matched / candidate_rows, 4) if candidate_rows else 1.0,
+            "mean_distance_px": round(float(np.mean(distances)), 3) if distances else 0.0,
+            "id_agreement": round(sum(best.values()) / matched, 4) if matched else 1.0}
@@ -0,0 +1,118 @@
+# EthoGrid_App/core/centroid_tracker.py
+
+import importlib.util
+import numpy as np
+
+SCIPY_AVAILABLE = importlib.util.find_spec("scipy") is not None
+TRACKER_PARAMS = ("distance_threshold", "hit_counter_max", "initialization_delay")
+
+# Kalman filter variances (pixels², per frame), of the same size as Norfair's OptimizedKalmanFilterFactory defaults
+MEASUREMENT_VARIANCE = 4.0
+INITIAL_POSITION_VARIANCE = 10.0
+INITIAL_VELOCITY_VARIANCE = 1.0
+PROCESS_VARIANCE = 0.1
+_UNREACHABLE = 1e9   # assignment cost of track/detection pairs beyond the distance threshold
+
+
+def tracker_params(norfair_params):
+    """The Norfair settings the centroid tracker shares (it always uses the Euclidean centroid distance)."""
+    return {name: norfair_params[name] for name in TRACKER_PARAMS if name in norfair_params}
+
+
+class CentroidTracker:
+    """
+    Tracks the centroids of the few animals of one tank, as a fast stand-in for norfair.Tracker.
+
+    All tracks live in NumPy arrays: a constant-velocity Kalman filter per track (x and y share
+    one 2x2 position/velocity covariance, stored as three numbers) is predicted and updated for
+    all tracks at once, and detections are matched to the predicted positions with an optimal
+    assignment (scipy's linear_sum_assignment) gated at `distance_threshold` pixels.
+
+    The track life cycle follows Norfair: every frame a track loses one hit and a matched track
+    gains two, up to `hit_counter_max`; a new track starts with one hit and only gets an ID and is
+    reported once it has more than `initialization_delay` hits; a track whose counter drops below
+    zero is deleted. Initialized tracks are matched before the ones still initializing.
+    """
+    def __init__(self, distance_threshold=100.0, hit_counter_max=15, initialization_delay=3):
+        if not 0 <= initialization_delay < hit_counter_max:
+            raise ValueError("initialization_delay must be at least 0 and less than hit_counter_max.")
+        from scipy.optimize import linear_sum_assignment
+        self._assign = linear_sum_assignment
+        self.distance_threshold = float(distance_threshold)
+        self.hit_counter_max, self.initialization_delay = int(hit_counter_max), int(initialization_delay)
+        self.position, self.velocity = np.zeros((0, 2)), np.zeros((0, 2))
+        self.covariance = np.zeros((0, 3))         # per track: var(position), cov(position, velocity), var(velocity)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)     # 0 while a track is initializing
+        self.last_detections = []
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self.hits)
+
+    def _keep(self, mask):
+        self.position, self.velocity, self.covariance = self.position[mask], self.velocity[mask], self.covariance[mask]
+        self.hits, self.ids = self.hits[mask], self.ids[mask]
+        self.last_detections = [det for det, keep in zip(self.last_detections, mask.tolist()) if keep]
+
+    def _predict(self):
+        p00, p01, p11 = self.covariance.T
+        self.position = self.position + self.velocity
+        self.covariance = np.column_stack((p00 + 2.0 * p01 + p11 + PROCESS_VARIANCE, p01 + p11, p11 + PROCESS_VARIANCE))
+        self.hits = self.hits - 1
+
+    def _match(self, tracks, points, candidates):
+        """Optimal pairs (track indices, point indices) among `tracks` and `points[candidates]` closer than the threshold."""
+        if not len(tracks) or not len(candidates): return tracks[:0], candidates[:0]
+        offset = self.position[tracks][:, None, :] - points[candidates][None, :, :]
+        cost = np.hypot(offset[..., 0], offset[..., 1])
+        reachable = cost < self.distance_threshold
+        rows, cols = self._assign(np.where(reachable, cost, _UNREACHABLE))
+        ok = reachable[rows, cols]
+        return tracks[rows[ok]], candidates[cols[ok]]
+
+    def _hit(self, tracks, points, detections, matched):
+        p00, p01, p11 = self.covariance[tracks].T
+        s = p00 + MEASUREMENT_VARIANCE
+        k_position, k_velocity = p00 / s, p01 / s
+        innovation = points[matched] - self.position[tracks]
+        self.position[tracks] += k_position[:, None] * innovation
+        self.velocity[tracks] += k_velocity[:, None] * innovation
+        self.covariance[tracks] = np.column_stack(((1.0 - k_position) * p00, (1.0 - k_position) * p01, p11 - k_velocity * p01))
+        self.hits[tracks] = np.minimum(self.hits[tracks] + 2, self.hit_counter_max)
+        for track, i in zip(tracks.tolist(), matched.tolist()): self.last_detections[track] = detections[i]
+
+    def _start(self, points, detections, new):
+        n = len(new)
+        self.position = np.concatenate((self.position, points[new]))
+        self.velocity = np.concatenate((self.velocity, np.zeros((n, 2))))
+        self.covariance = np.concatenate((self.covariance, np.tile((INITIAL_POSITION_VARIANCE, 0.0, INITIAL_VELOCITY_VARIANCE), (n, 1))))
+        self.hits = np.concatenate((self.hits, np.ones(n, dtype=np.int64)))
+        self.ids = np.concatenate((self.ids, np.zeros(n, dtype=np.int64)))
+        self.last_detections.extend(detections[i] for i in new.tolist())
+
+    def update(self, detections):
+        """
+        Steps all tracks by one frame with `detections` (dicts with 'cx' and 'cy') and returns the
+        initialized tracks as [(track_id, cx, cy, last matched detection dict), ...], oldest first.
+        """
+        alive = self.hits >= 0
+        if not alive.all(): self._keep(alive)
+        self._predict()
+
+        points = np.array([(det['cx'], det['cy']) for det in detections], dtype=np.float64).reshape(-1, 2)
+        unmatched = np.arange(len(points))
+        initialized = self.ids > 0
+        for tracks in (np.flatnonzero(initialized), np.flatnonzero(~initialized)):
+            tracks, matched = self._match(tracks, points, unmatched)
+            if len(tracks):
+                self._hit(tracks, points, detections, matched)
+                unmatched = np.setdiff1d(unmatched, matched)
+        if len(unmatched): self._start(points, detections, unmatched)
+
+        ready = np.flatnonzero((self.ids == 0) & (self.hits > self.initialization_delay))
+        if len(ready):
+            self.ids[ready] = np.arange(self._next_id, self._next_id + len(ready)); self._next_id += len(ready)
+        active = np.flatnonzero((self.ids > 0) & (self.hits >= 0))
+        return [(track_id, cx, cy, self.last_detections[i]) for i, track_id, (cx, cy)
+                in zip(active.tolist(), self.ids[active].tolist(), self.position[active].tolist())]
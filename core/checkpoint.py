@@ -0,0 +1,261 @@
+# EthoGrid_App/core/checkpoint.py
+
+import os
+import json
+import time
+import hashlib
+import subprocess
+import cv2
+from core.app_paths import get_cache_dir
+from core.streaming_csv import StreamingCsvWriter, PARTIAL_SUFFIX
+from core.polygon_store import PolygonStoreWriter, sidecar_path, partial_exists, polygon_text
+from core.video_source import open_video, probe_video
+
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+COMPLETED_RUNS_DIR = "completed_runs"
+
+
+def _atomic_write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f: json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+        return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+    except OSError:
+        return {'path': os.path.abspath(path)}
+
+def run_signature(video_path, model_path, confidence, save_video, save_csv, frame_stride=1, tank_settings_file=None, imgsz=None,
+                  motion_threshold=None, polygon_sidecar=False):
+    """Everything that must match for a previous run's outputs to be reused or continued."""
+    signature = {'video': _file_signature(video_path), 'model': _file_signature(model_path),
+                 'confidence': round(float(confidence), 4), 'save_video': bool(save_video), 'save_csv': bool(save_csv)}
+    if frame_stride > 1: signature['frame_stride'] = int(frame_stride)
+    if tank_settings_file: signature['tank_settings'] = _file_signature(tank_settings_file)
+    if imgsz: signature['imgsz'] = int(imgsz)
+    if motion_threshold is not None: signature['motion_threshold'] = round(float(motion_threshold), 4)
+    if polygon_sidecar: signature['polygon_sidecar'] = True
+    return signature
+
+def concat_video_segments(segment_paths, out_path):
+    """
+    Joins finished video segments into one file. Uses an FFmpeg stream copy when FFmpeg is
+    on PATH, otherwise re-encodes the frames with OpenCV (no inference is repeated either way).
+    """
+    list_path = out_path + ".segments.txt"
+    try:
+        with open(list_path, 'w') as f:
+            for p in segment_paths: f.write(f"file '{os.path.abspath(p)}'\n")
+        startupinfo = None
+        if os.name == 'nt':
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", out_path],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, startupinfo=startupinfo)
+        return
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        pass
+    finally:
+        if os.path.exists(list_path): os.remove(list_path)
+
+    writer = None
+    for p in segment_paths:
+        cap = open_video(p)
+        if writer is None:
+            writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*'mp4v'), cap.fps, (cap.width, cap.height))
+        while True:
+            ret, frame = cap.read()
+            if not ret: break
+            writer.write(frame)
+        cap.release()
+    if writer is not None: writer.release()
+
+
+class ResumableOutputs:
+    """
+    Owns the CSV and annotated-video outputs of one inference run and checkpoints them.
+
+    With `open(resume=True)`, every `checkpoint_seconds` the CSV is synced to disk and the
+    current video segment is closed, and a sidecar `<base>_<suffix>.checkpoint.json` records
+    the next frame to process together with the CSV byte offset and the finished segments. A
+    crashed run can therefore be continued from the last checkpoint by seeking the video to
+    `start_frame`. A cancelled run is checkpointed whether or not resume is enabled. On
+    completion the segments are joined, the CSV renamed into place and the checkpoint deleted;
+    the finished run is recorded in the user cache instead, so `is_complete()` can skip it.
+
+    With `polygon_store`, polygons passed through `store_polygons()` are streamed into a
+    `.polygons.npz` sidecar that is checkpointed, resumed and published together with the CSV.
+    """
+    def __init__(self, output_dir, base_name, csv_suffix, video_suffix, csv_header, signature,
+                 save_csv, save_video, fps, frame_size, checkpoint_seconds=300, polygon_store=False, log=print):
+        self.csv_path = os.path.join(output_dir, f"{base_name}_{csv_suffix}.csv")
+        self.video_path = os.path.join(output_dir, f"{base_name}_{video_suffix}.mp4")
+        self.checkpoint_path = os.path.join(output_dir, f"{base_name}_{csv_suffix}{CHECKPOINT_SUFFIX}")
+        self.completion_path = os.path.join(get_cache_dir(COMPLETED_RUNS_DIR),
+                                            hashlib.sha1(os.path.abspath(self.csv_path).encode('utf-8')).hexdigest() + ".json")
+        self.csv_header = csv_header
+        self.signature = signature
+        self.save_csv, self.save_video = save_csv, save_video
+        self.fps, self.frame_size = fps, frame_size
+        self.checkpoint_seconds = checkpoint_seconds
+        self.log = log
+        self.resume = False
+        self.start_frame = 0
+        self.csv_writer = None
+        self.polygon_path = sidecar_path(self.csv_path) if polygon_store and save_csv else None
+        self.polygon_writer = None
+        self.segments = []
+        self._segment_writer, self._segment_start, self._segment_frames = None, 0, 0
+        self.video_frames = 0
+        self._last_checkpoint = time.monotonic()
+
+    def _load(self, path=None):
+        try:
+            with open(path or self.checkpoint_path, 'r') as f: state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return state if state.get('signature') == self.signature else None
+
+    def _segment_path(self, number):
+        return f"{self.video_path}.seg{number:04d}.mp4"
+
+    def is_complete(self):
+        """True if a previous run with identical settings finished and its outputs are intact."""
+        if os.path.exists(self.checkpoint_path):
+            return False   # a later run was interrupted after this record was written
+        state = self._load(self.completion_path)
+        if not state or not state.get('complete'):
+            return False
+        if self.save_csv and (not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) != state.get('csv_offset')):
+            return False
+        if self.polygon_path and state.get('polygon_entries') and not os.path.exists(self.polygon_path):
+            return False
+        if self.save_video:
+            info = probe_video(self.video_path)
+            if (info.frame_count if info else -1) != state.get('video_frames', state.get('next_frame')):
+                return False
+        return True
+
+    def open(self, resume):
+        """Prepares the outputs, continuing from the last checkpoint if `resume` is set. Returns the first frame to process."""
+        self.resume = resume
+        state = self._load() if resume else None
+        if state and not state.get('complete') and (not self.save_csv or os.path.exists(self.csv_path + PARTIAL_SUFFIX)) \
+                and (not self.polygon_path or partial_exists(self.polygon_path)):
+            self.start_frame = state['next_frame']
+            self.segments = [s for s in state.get('segments', []) if os.path.exists(s['path'])]
+            self.video_frames = state.get('video_frames', 0)
+            if self.save_csv:
+                self.csv_writer = StreamingCsvWriter(self.csv_path, self.csv_header, resume_offset=state['csv_offset'],
+                                                     resume_rows=state.get('rows_written', 0))
+            if self.polygon_path:
+                self.polygon_writer = PolygonStoreWriter(self.polygon_path, resume_entries=state.get('polygon_entries', 0),
+                                                         resume_points=state.get('polygon_points', 0))
+            self.log(f"Resuming from frame {self.start_frame} ({len(self.segments)} video segment(s) already written).")
+        else:
+            self._discard_previous()
+            if self.save_csv:
+                self.csv_writer = StreamingCsvWriter(self.csv_path, self.csv_header)
+            if self.polygon_path:
+                self.polygon_writer = PolygonStoreWriter(self.polygon_path)
+            elif self.save_csv and os.path.exists(sidecar_path(self.csv_path)):
+                os.remove(sidecar_path(self.csv_path))  # left by an earlier run with the sidecar; this CSV holds the polygons as text
+        self._segment_start = self.start_frame
+        return self.start_frame
+
+    def _discard_previous(self):
+        if os.path.exists(self.completion_path): os.remove(self.completion_path)   # these outputs are about to be rewritten
+        try:
+            with open(self.checkpoint_path, 'r') as f: old_segments = json.load(f).get('segments', [])
+        except (OSError, ValueError):
+            return
+        for s in old_segments:
+            if os.path.exists(s['path']): os.remove(s['path'])
+        os.remove(self.checkpoint_path)
+
+    def write_rows(self, rows):
+        if self.csv_writer is not None:
+            self.csv_writer.write_rows(rows)
+
+    def store_polygons(self, polygons):
+        """Returns the CSV cells for `polygons`: sidecar indices with a polygon store, 'x,y;...' text otherwise."""
+        if self.polygon_writer is not None:
+            return self.polygon_writer.add(polygons)
+        return [polygon_text(p) for p in polygons]
+
+    def write_frame(self, frame):
+        if not self.save_video: return
+        if self._segment_writer is None:
+            path = self._segment_path(len(self.segments))
+            self._segment_writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, self.frame_size)
+            self.segments.append({'path': path, 'start': self._segment_start, 'end': None})
+            self._segment_frames = 0
+        self._segment_writer.write(frame)
+        self._segment_frames += 1
+
+    def end_batch(self, next_frame):
+        """Call after every batch is fully written; checkpoints once the interval has passed if resume is enabled."""
+        if self.resume and time.monotonic() - self._last_checkpoint >= self.checkpoint_seconds:
+            self.checkpoint(next_frame)
+
+    def _close_segment(self, next_frame):
+        if self._segment_writer is not None:
+            self._segment_writer.release()
+            self._segment_writer = None
+            self.segments[-1]['end'] = next_frame
+            self.video_frames += self._segment_frames
+        self._segment_start = next_frame
+
+    def checkpoint(self, next_frame, complete=False):
+        self._close_segment(next_frame)
+        csv_offset = self.csv_writer.checkpoint() if self.csv_writer is not None else None
+        rows = self.csv_writer.rows_written if self.csv_writer is not None else 0
+        polygon_entries, polygon_points = self.polygon_writer.checkpoint() if self.polygon_writer is not None else (0, 0)
+        _atomic_write_json(self.checkpoint_path, {
+            'signature': self.signature, 'next_frame': next_frame, 'csv_offset': csv_offset, 'rows_written': rows,
+            'polygon_entries': polygon_entries, 'polygon_points': polygon_points, 'video_frames': self.video_frames,
+            'segments': [s for s in self.segments if s['end'] is not None], 'complete': complete,
+            'updated_at': time.strftime("%Y-%m-%d %H:%M:%S")})
+        self._last_checkpoint = time.monotonic()
+
+    def interrupt(self, next_frame):
+        """Checkpoints and closes everything without publishing, so the run can be resumed later."""
+        self.checkpoint(next_frame)
+        if self.csv_writer is not None: self.csv_writer.abort()
+        if self.polygon_writer is not None: self.polygon_writer.abort()
+        self.log(f"Progress saved at frame {next_frame}; enable resume to continue this video later.")
+
+    def abort(self):
+        """Closes files after an error without touching the last good checkpoint."""
+        if self._segment_writer is not None:
+            self._segment_writer.release()
+            self._segment_writer = None
+            if self.segments: os.remove(self.segments.pop()['path'])
+        if self.csv_writer is not None: self.csv_writer.abort()
+        if self.polygon_writer is not None: self.polygon_writer.abort()
+
+    def finish(self, next_frame):
+        """Publishes the final CSV and video, records the run as complete and deletes the checkpoint."""
+        self._close_segment(next_frame)
+        if self.save_video and self.segments:
+            paths = [s['path'] for s in self.segments]
+            if len(paths) == 1: os.replace(paths[0], self.video_path)
+            else: concat_video_segments(paths, self.video_path)
+            for p in paths:
+                if os.path.exists(p): os.remove(p)
+            self.segments = []
+        csv_offset = None
+        if self.csv_writer is not None:
+            csv_offset = self.csv_writer.checkpoint()
+            self.csv_writer.close()
+        polygon_entries = 0
+        if self.polygon_writer is not None:
+            polygon_entries = self.polygon_writer.entries
+            self.polygon_writer.close()
+        _atomic_write_json(self.completion_path, {
+            'signature': self.signature, 'csv_path': os.path.abspath(self.csv_path), 'next_frame': next_frame, 'csv_offset': csv_offset,
+            'polygon_entries': polygon_entries, 'rows_written': self.csv_writer.rows_written if self.csv_writer is not None else 0,
+            'video_frames': self.video_frames, 'complete': True, 'updated_at': time.strftime("%Y-%m-%d %H:%M:%S")})
+        if os.path.exists(self.checkpoint_path): os.remove(self.checkpoint_path)
@@ -0,0 +1,559 @@
+# EthoGrid_App/core/cli.py
+
+"""
+Headless entry point for the processing pipeline: `python -m ethogrid <command> ...`.
+
+Each command builds the same worker the matching dialog starts and runs it synchronously in the
+calling thread, without a QApplication: the worker's signals are connected directly to an event
+stream that prints one JSON object per line on stdout.
+
+Exit codes:
+    0          everything finished
+    1          the run failed (the worker reported an error or stopped before finishing)
+    2          invalid command line
+    3          the run finished, but some files logged an [ERROR]
+    4          bench: slower than the baseline
+    128 + N    stopped by signal N (130 for Ctrl+C/SIGINT, 143 for SIGTERM)
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import traceback
+
+EXIT_OK, EXIT_FAILED, EXIT_USAGE, EXIT_PARTIAL, EXIT_REGRESSION = 0, 1, 2, 3, 4
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+COMMANDS = ("detect", "segment", "batch", "analyze", "stats", "bench", "bench-tracking")
+
+BACKEND_CHOICES = {"pytorch": "PyTorch", "onnx": "ONNX Runtime", "openvino": "OpenVINO"}
+TRACKING_CHOICES = {"filter": "Confidence Filter", "norfair": "Norfair (Multi-Object Tracking)", "centroid": "Centroid Tracker (Built-in)"}
+MODE_CHOICES = {"side": "Side View", "top": "Top View"}
+AXIS_CHOICES = {"top-bottom": "Top-Bottom", "diagonal-down": "Left-Top to Right-Bottom", "diagonal-up": "Left-Bottom to Right-Top"}
+LEVEL_CHOICES = {"grand": "Compare Grand Averages", "sheet": "Compare Sheet Averages", "tanks": "Compare Tanks"}
+NORMALITY_CHOICES = {"shapiro": "Shapiro-Wilk", "dagostino": "D'Agostino-Pearson"}
+CENTRAL_TENDENCY_CHOICES = {"mean": "Mean", "median": "Median", "none": "None (Bar Only)"}
+DECODER_CHOICES = {"auto": "Auto", "opencv": "OpenCV", "pyav": "PyAV", "ffmpeg": "FFmpeg pipe"}
+PARAMETRIC_TEST = "T-test (2 groups) / ANOVA (>2 groups)"
+NONPARAMETRIC_TEST = "Mann-Whitney (2 groups) / Kruskal-Wallis (>2 groups)"
+
+# Worker signal -> (event name, names of the signal arguments; None for a ProgressUpdate payload)
+_SIGNAL_EVENTS = {
+    "overall_progress": ("overall_progress", ("current", "total", "name")),
+    "progress": ("overall_progress", ("current", "total", "name")),
+    "progress_updated": ("file_progress", None),
+    "plot_generated": ("plot", ("endpoint", "path")),
+}
+
+
+class EventStream:
+    """
+    Writes JSON-lines events: {"event": ..., "time": <unix time>, "elapsed": <seconds since start>, ...}.
+    Events may come from pipeline threads and from signal handlers, hence the re-entrant lock.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.started = time.monotonic()
+        self._lock = threading.RLock()
+
+    def emit(self, event, **fields):
+        record = {"event": event, "time": round(time.time(), 3), "elapsed": round(time.monotonic() - self.started, 3)}
+        record.update(fields)
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def _log_level(message):
+    text = message.lstrip()
+    if text.startswith("[ERROR]"): return "error"
+    if text.startswith("[WARNING]"): return "warning"
+    return "info"
+
+def run_worker(worker, events):
+    """
+    Runs a worker's `run()` in the calling thread with its signals streamed as events and
+    returns the exit code. SIGINT/SIGTERM ask the worker to stop; a second signal kills the process.
+    """
+    from PyQt5.QtCore import Qt
+    state = {"errors": 0, "failure": None, "finished": False, "signal": None}
+
+    def on_log(message):
+        level = _log_level(message)
+        if level == "error": state["errors"] += 1
+        events.emit("log", level=level, message=message)
+
+    def on_error(message):
+        state["failure"] = message
+        events.emit("error", message=message)
+
+    def on_finished():
+        state["finished"] = True
+
+    def forward(event, names):
+        return lambda *args: events.emit(event, **dict(zip(names, args)))
+
+    def forward_progress(event):
+        def emit(update):
+            # "elapsed" is taken by the stream's own field, so the per-file time gets its own name
+            remaining = None if update.remaining is None else round(update.remaining, 1)
+            events.emit(event, percent=update.percent, done=update.done, total=update.total,
+                        fps=round(update.fps, 2), file_elapsed=round(update.elapsed, 1), remaining=remaining)
+        return emit
+
+    # Direct connections: the slots run in whichever thread emits, no event loop is involved
+    for name in ("log_message", "log"):
+        if hasattr(worker, name): getattr(worker, name).connect(on_log, Qt.DirectConnection)
+    if hasattr(worker, "error"): worker.error.connect(on_error, Qt.DirectConnection)
+    worker.finished.connect(on_finished, Qt.DirectConnection)
+    for name, (event, names) in _SIGNAL_EVENTS.items():
+        if not hasattr(worker, name): continue
+        slot = forward_progress(event) if names is None else forward(event, names)
+        getattr(worker, name).connect(slot, Qt.DirectConnection)
+
+    def on_signal(signum, frame):
+        state["signal"] = signum
+        events.emit("interrupted", signal=signum)
+        signal.signal(signum, signal.SIG_DFL)
+        worker.stop()
+    handled = [s for s in (signal.SIGINT, getattr(signal, "SIGTERM", None)) if s is not None]
+    previous = {s: signal.signal(s, on_signal) for s in handled}
+
+    try:
+        worker.run()
+    except Exception as e:
+        state["failure"] = str(e)
+        events.emit("error", message=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    finally:
+        for s, handler in previous.items(): signal.signal(s, handler)
+
+    if state["signal"] is not None: code, status = 128 + state["signal"], "interrupted"
+    elif state["failure"] is not None or not state["finished"]: code, status = EXIT_FAILED, "failed"
+    elif state["errors"]: code, status = EXIT_PARTIAL, "completed_with_errors"
+    else: code, status = EXIT_OK, "completed"
+    events.emit("finished", status=status, exit_code=code, errors=state["errors"],
+                wall_seconds=round(time.monotonic() - events.started, 3))
+    return code
+
+
+# --- Input helpers ---
+
+def _expand_files(paths, extensions):
+    """Files are taken as given; directories are searched recursively for `extensions`, like 'Add Directory'."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.lower().endswith(extensions))
+        else:
+            files.append(path)
+    return list(dict.fromkeys(os.path.abspath(f) for f in files))
+
+def _existing_files(parser, paths, extensions, kind):
+    files = _expand_files(paths, extensions)
+    missing = [f for f in files if not os.path.isfile(f)]
+    if missing: parser.error(f"{kind} not found: {', '.join(missing)}")
+    if not files: parser.error(f"no {kind} found in {', '.join(paths)}")
+    return files
+
+def _output_dir(parser, path):
+    try: os.makedirs(path, exist_ok=True)
+    except OSError as e: parser.error(f"cannot create output directory {path}: {e}")
+    return path
+
+def _load_json(parser, path, kind):
+    try:
+        with open(path, 'r') as f: return json.load(f)
+    except (OSError, ValueError) as e:
+        parser.error(f"cannot read {kind} {path}: {e}")
+
+def tank_geometry(settings_data):
+    """
+    Tank centers and corner points in video pixels from a grid settings.json, computed exactly
+    like the Analysis dialog does. Returns ({tank: (x, y)}, {tank: [4 x (x, y)]}).
+    """
+    from PyQt5.QtCore import QPointF
+    from PyQt5.QtGui import QTransform
+    grid, tf = settings_data['grid_settings'], settings_data['grid_transform']
+    w, h = settings_data['video_dimensions']['width'], settings_data['video_dimensions']['height']
+    transform = QTransform(); transform.translate(w * tf['center_x'], h * tf['center_y']); transform.rotate(tf['angle']); transform.scale(tf['scale_x'], tf['scale_y']); transform.translate(-w / 2, -h / 2)
+    rows, cols = grid['rows'], grid['cols']
+    centers, corners = {}, {}
+    for r in range(rows):
+        for c in range(cols):
+            tank_num = r * cols + c + 1
+            p = transform.map(QPointF((c + 0.5) * w / cols, (r + 0.5) * h / rows))
+            centers[tank_num] = (p.x(), p.y())
+            points = [transform.map(QPointF(x * w / cols, y * h / rows)) for x, y in ((c, r), (c + 1, r), (c + 1, r + 1), (c, r + 1))]
+            corners[tank_num] = [(q.x(), q.y()) for q in points]
+    return centers, corners
+
+
+# --- Commands ---
+
+def _inference(args, parser, events, task):
+    videos = _existing_files(parser, args.videos, VIDEO_EXTENSIONS, "video files")
+    if not os.path.isfile(args.model): parser.error(f"model not found: {args.model}")
+    if args.tank_settings and not os.path.isfile(args.tank_settings): parser.error(f"tank settings not found: {args.tank_settings}")
+    if task == "detect": from workers.yolo_processor_batch import YoloProcessor as worker_cls
+    else: from workers.yolo_segmentation_processor import YoloSegmentationProcessor as worker_cls
+    kwargs = dict(save_video=not args.no_video, save_csv=not args.no_csv, pipeline=args.pipeline,
+                  batch_size=args.batch_size, auto_batch_size=args.auto_batch_size, memory_limit_mb=args.memory_limit_mb,
+                  resume=args.resume, num_processes=args.processes, threads_per_process=args.threads,
+                  frame_stride=args.frame_stride, tank_settings_file=args.tank_settings, imgsz=args.imgsz,
+                  motion_gate=args.motion_gate, motion_threshold=args.motion_threshold,
+                  backend=BACKEND_CHOICES[args.backend], use_model_service=args.model_service)
+    if args.motion_threshold is None: del kwargs['motion_threshold']
+    if task == "segment": kwargs['polygon_sidecar'] = args.polygon_sidecar
+    worker = worker_cls(videos, args.model, _output_dir(parser, args.output_dir), args.confidence, **kwargs)
+    events.emit("start", command=task, inputs=len(videos))
+    return run_worker(worker, events)
+
+def cmd_detect(args, parser, events):
+    return _inference(args, parser, events, "detect")
+
+def cmd_segment(args, parser, events):
+    return _inference(args, parser, events, "segment")
+
+def cmd_batch(args, parser, events):
+    videos = _existing_files(parser, args.videos, VIDEO_EXTENSIONS, "video files")
+    if not os.path.isfile(args.settings): parser.error(f"settings file not found: {args.settings}")
+    outputs = dict(save_video=not args.no_video, save_csv=not args.no_csv, save_centroid_csv=not args.no_centroid_csv,
+                   save_excel=not args.no_excel, save_trajectory_img=not args.no_trajectory_img, save_heatmap_img=not args.no_heatmap_img)
+    if not any(outputs.values()): parser.error("at least one output must be enabled")
+    from workers.batch_processor import BatchProcessor
+    norfair_params = {'distance_function': args.distance_function, 'distance_threshold': args.distance_threshold,
+                      'hit_counter_max': args.hit_counter_max, 'initialization_delay': args.initialization_delay,
+                      'past_detections_length': args.past_detections}
+    worker = BatchProcessor(videos, args.settings, _output_dir(parser, args.output_dir), csv_dir=args.csv_dir or "",
+                            tracking_method=TRACKING_CHOICES[args.tracking], nofair_params=norfair_params,
+                            max_animals_per_tank=args.max_animals, frame_sample_rate=args.frame_sample_rate,
+                            time_gap_seconds=args.time_gap, draw_overlays=not args.no_overlays,
+                            tracking_processes=args.tracking_processes, **outputs)
+    events.emit("start", command="batch", inputs=len(videos))
+    return run_worker(worker, events)
+
+def cmd_analyze(args, parser, events):
+    csv_files = _existing_files(parser, args.csv_files, ('.csv',), "CSV files")
+    settings = _load_json(parser, args.grid_settings, "grid settings")
+    try: centers, corners = tank_geometry(settings)
+    except (KeyError, TypeError) as e: parser.error(f"{args.grid_settings} is not a grid settings file (missing {e})")
+    # Saved analysis settings (from the dialog) fill in whatever is not given on the command line
+    saved = _load_json(parser, args.analysis_settings, "analysis settings") if args.analysis_settings else {}
+    def pick(value, key, default):
+        return value if value is not None else saved.get(key, default)
+    mode = MODE_CHOICES[args.mode] if args.mode else saved.get('analysis_mode', 'Side View')
+    if saved.get('adjusted_centers'): centers.update({int(k): tuple(v) for k, v in saved['adjusted_centers'].items()})
+    side_view_configs = {tank: {'zone1': 50, 'zone2': 50} for tank in centers}
+    side_view_configs.update({int(k): v for k, v in saved.get('side_view_configs', {}).items()})
+
+    endpoints = args.endpoint or saved.get('side_view_endpoints' if mode == 'Side View' else 'top_view_endpoints')
+    if not endpoints:
+        import pandas as pd
+        from core.endpoints_analyzer import SIDE_VIEW_ENDPOINTS, TOP_VIEW_ENDPOINTS, behavior_endpoint_name
+        behaviors = set()
+        for path in csv_files:
+            try: behaviors.update(pd.read_csv(path, usecols=['class_name'])['class_name'].dropna().unique())
+            except Exception as e: events.emit("log", level="warning", message=f"Could not read class names from {path}: {e}")
+        endpoints = (SIDE_VIEW_ENDPOINTS if mode == 'Side View' else TOP_VIEW_ENDPOINTS) + [behavior_endpoint_name(b) for b in sorted(behaviors)]
+
+    params = {'analysis_mode': mode,
+              'side_view_axis': AXIS_CHOICES[args.side_view_axis] if args.side_view_axis else saved.get('side_view_axis', 'Top-Bottom'),
+              'rapid_threshold': pick(args.rapid_threshold, 'rapid_threshold', 5.0),
+              'freezing_threshold': pick(args.freezing_threshold, 'freezing_threshold', 0.5),
+              'slow_angular_velocity_threshold': pick(args.angular_threshold, 'angular_threshold', 90.0),
+              'frame_rate': pick(args.frame_rate, 'frame_rate', 30.0),
+              'conversion_rate': pick(args.conversion_rate, 'conversion_rate', 100.0),
+              'adjusted_tank_centers': centers, 'tank_corners': corners, 'selected_endpoints': endpoints,
+              'side_view_configs': side_view_configs}
+    from workers.analysis_processor import AnalysisProcessor
+    worker = AnalysisProcessor(csv_files, params, _output_dir(parser, args.output_dir))
+    events.emit("start", command="analyze", inputs=len(csv_files), endpoints=endpoints)
+    return run_worker(worker, events)
+
+def cmd_stats(args, parser, events):
+    group_files = {}
+    for spec in args.group:
+        name, sep, paths = spec.partition("=")
+        if not sep or not name or not paths: parser.error(f"--group expects NAME=PATH[,PATH...], got {spec!r}")
+        group_files[name] = _existing_files(parser, paths.split(","), ('.xlsx',), f"result files of group {name}")
+    if len(group_files) < 2: parser.error("at least two --group arguments are required")
+
+    endpoints = args.endpoint
+    if not endpoints:
+        # The endpoints every file has, as the Statistics dialog offers them
+        import pandas as pd
+        common = None
+        for path in (p for paths in group_files.values() for p in paths):
+            try: columns = set(pd.read_excel(path, sheet_name='GRAND_AVERAGE_SUMMARY', nrows=0).columns) - {'File', 'Tank'}
+            except Exception as e: parser.error(f"could not read endpoints from {path}: {e}")
+            common = columns if common is None else common & columns
+        endpoints = sorted(common or [])
+        if not endpoints: parser.error("the result files have no endpoints in common")
+
+    plot_params = {'central_tendency': CENTRAL_TENDENCY_CHOICES[args.central_tendency], 'error_bar': args.error_bar,
+                   'palette': args.palette, 'width': args.width, 'height': args.height, 'dpi': args.dpi,
+                   'title_size': args.title_size, 'axes_size': args.axes_size, 'tick_size': args.tick_size,
+                   'title_weight': args.title_weight, 'axes_weight': args.axes_weight}
+    from workers.stats_processor import StatsProcessor
+    worker = StatsProcessor(group_files, LEVEL_CHOICES[args.level], endpoints, NORMALITY_CHOICES[args.normality], args.alpha,
+                            args.force_parametric, PARAMETRIC_TEST, NONPARAMETRIC_TEST, plot_params, _output_dir(parser, args.output_dir))
+    events.emit("start", command="stats", inputs=sum(len(p) for p in group_files.values()), endpoints=endpoints)
+    return run_worker(worker, events)
+
+def cmd_bench(args, parser, events):
+    import shutil
+    import tempfile
+    from core import benchmark
+    for option, value in (("--frames", args.frames), ("--tanks", args.tanks), ("--repeat", args.repeat), ("--width", args.width), ("--height", args.height)):
+        if value < 1: parser.error(f"{option} must be at least 1")
+    for option, path in (("--detect-model", args.detect_model), ("--segment-model", args.segment_model)):
+        if path and not os.path.isfile(path): parser.error(f"{option} not found: {path}")
+    baseline = None
+    if args.baseline:
+        try: baseline = benchmark.load_results(args.baseline)
+        except (OSError, ValueError) as e: parser.error(f"cannot read baseline {args.baseline}: {e}")
+
+    config = dict(width=args.width, height=args.height, fps=args.fps, frames=args.frames, tanks=args.tanks,
+                  worms_per_tank=args.worms_per_tank, seed=args.seed, imgsz=args.imgsz, batch_size=args.batch_size,
+                  confidence=args.confidence, pipeline=args.pipeline, tank_crops=args.tank_crops, save_video=not args.no_video,
+                  detect_model=os.path.basename(args.detect_model) if args.detect_model else None,
+                  segment_model=os.path.basename(args.segment_model) if args.segment_model else None,
+                  video_decoder=args.video_decoder, repeat=args.repeat)
+    events.emit("start", command="bench", tasks=args.tasks, config=config)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="ethogrid_bench_")
+    try:
+        os.makedirs(work_dir, exist_ok=True)
+        video_path = os.path.join(work_dir, f"synthetic_{args.width}x{args.height}_{args.tanks}tanks.mp4")
+        benchmark.write_synthetic_video(video_path, args.width, args.height, args.fps, args.frames, args.tanks, args.worms_per_tank, args.seed)
+        settings_file = benchmark.write_grid_settings(os.path.join(work_dir, "settings.json"), args.tanks, args.width, args.height)
+        events.emit("video", path=video_path, frames=args.frames)
+
+        results = {"version": benchmark.RESULTS_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "environment": benchmark.environment(), "config": config, "cases": {}}
+        for task in args.tasks:
+            model_path = args.detect_model if task == "detect" else args.segment_model
+            if not model_path:
+                model_path = benchmark.build_random_model(task, os.path.join(work_dir, f"random_{task}.pt"), seed=args.seed)
+            runs = []
+            for run in range(args.repeat):
+                output_dir = os.path.join(work_dir, f"{task}_{run + 1}")
+                os.makedirs(output_dir, exist_ok=True)
+                runs.append(benchmark.run_case(task, video_path, model_path, output_dir, args.confidence,
+                                               save_video=not args.no_video, save_csv=True, pipeline=args.pipeline,
+                                               batch_size=args.batch_size, imgsz=args.imgsz,
+                                               tank_settings_file=settings_file if args.tank_crops else None))
+                events.emit("run", case=task, run=run + 1, **runs[-1])
+            results["cases"][task] = benchmark.fastest(runs)
+    finally:
+        if not args.work_dir: shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        benchmark.save_results(args.output, results)
+        events.emit("saved", path=args.output)
+    code = EXIT_FAILED if any(case["exit_code"] for case in results["cases"].values()) else EXIT_OK
+    regressions = []
+    if baseline is not None:
+        differences = benchmark.config_differences(results, baseline)
+        if differences: events.emit("log", level="warning", message=f"The baseline was measured with different settings: {', '.join(differences)}")
+        regressions = benchmark.compare_results(results, baseline, args.tolerance)
+        for regression in regressions: events.emit("regression", **regression)
+        if regressions and code == EXIT_OK: code = EXIT_REGRESSION
+    status = "failed" if code == EXIT_FAILED else "regressed" if regressions else "completed"
+    events.emit("finished", status=status, exit_code=code, cases=results["cases"], regressions=len(regressions),
+                wall_seconds=round(time.monotonic() - events.started, 3))
+    return code
+
+def cmd_bench_tracking(args, parser, events):
+    from core import benchmark
+    from core.tracker import NORFAIR_AVAILABLE, TRACKER_NORFAIR, TRACKER_CENTROID
+    from core.centroid_tracker import SCIPY_AVAILABLE
+    for option, value in (("--frames", args.frames), ("--tanks", args.tanks), ("--animals-per-tank", args.animals_per_tank), ("--repeat", args.repeat)):
+        if value < 1: parser.error(f"{option} must be at least 1")
+    if not SCIPY_AVAILABLE: parser.error("the built-in centroid tracker needs scipy (pip install scipy)")
+    methods = [TRACKER_CENTROID] + ([TRACKER_NORFAIR] if NORFAIR_AVAILABLE and not args.no_norfair else [])
+    params = {'distance_function': 'euclidean', 'distance_threshold': args.distance_threshold, 'hit_counter_max': args.hit_counter_max,
+              'initialization_delay': args.initialization_delay, 'past_detections_length': args.past_detections}
+    config = dict(tanks=args.tanks, frames=args.frames, fps=args.fps, animals_per_tank=args.animals_per_tank, seed=args.seed,
+                  miss_rate=args.miss_rate, false_rate=args.false_rate, noise=args.noise, processes=args.processes, **params)
+    events.emit("start", command="bench-tracking", methods=methods, config=config)
+    if not NORFAIR_AVAILABLE and not args.no_norfair: events.emit("log", level="warning", message="norfair is not installed; only the built-in tracker is measured.")
+    frames_by_tank = benchmark.synthetic_tank_detections(args.tanks, args.frames, args.animals_per_tank, args.seed, args.miss_rate, args.false_rate, args.noise)
+
+    cases, tracked = {}, {}
+    for method in methods:
+        runs = []
+        for run in range(args.repeat):
+            measurements, tracked[method] = benchmark.run_tracking_case(method, frames_by_tank, params, args.fps, args.processes)
+            runs.append(measurements)
+            events.emit("run", case=method, run=run + 1, **measurements)
+        cases[method] = max(runs, key=lambda r: r["video_fps"])
+    agreement = None
+    if TRACKER_NORFAIR in tracked:
+        agreement = benchmark.tracking_agreement(tracked[TRACKER_NORFAIR], tracked[TRACKER_CENTROID], args.max_distance)
+        events.emit("agreement", reference=TRACKER_NORFAIR, candidate=TRACKER_CENTROID, **agreement)
+    if args.output:
+        benchmark.save_results(args.output, {"version": benchmark.RESULTS_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                             "environment": benchmark.environment(), "config": config, "cases": cases, "agreement": agreement})
+        events.emit("saved", path=args.output)
+    events.emit("finished", status="completed", exit_code=EXIT_OK, cases=cases, wall_seconds=round(time.monotonic() - events.started, 3))
+    return EXIT_OK
+
+
+# --- Argument parsing ---
+
+def _add_inference_arguments(p):
+    p.add_argument("videos", nargs="+", help="Video files or directories to search for videos.")
+    p.add_argument("--model", required=True, help="YOLO weights (.pt).")
+    p.add_argument("--output-dir", required=True)
+    p.add_argument("--confidence", type=float, default=0.4)
+    p.add_argument("--no-video", action="store_true", help="Do not save annotated videos.")
+    p.add_argument("--no-csv", action="store_true", help="Do not save the results CSV.")
+    p.add_argument("--backend", choices=BACKEND_CHOICES, default="pytorch")
+    p.add_argument("--imgsz", type=int, default=None, help="Inference image size (default: the model's).")
+    p.add_argument("--batch-size", type=int, default=12)
+    p.add_argument("--auto-batch-size", action="store_true")
+    p.add_argument("--memory-limit-mb", type=int, default=None, help="Largest extra memory (MB) an auto-tuned batch may need on top of what the process already holds.")
+    p.add_argument("--pipeline", action="store_true", help="Overlap decoding, inference and writing.")
+    p.add_argument("--processes", type=int, default=1, help="Videos processed in parallel, one process each.")
+    p.add_argument("--threads", type=int, default=None, help="CPU threads per process (default: cores / processes).")
+    p.add_argument("--frame-stride", type=int, default=1)
+    p.add_argument("--tank-settings", default=None, help="Grid settings.json for per-tank crops.")
+    p.add_argument("--motion-gate", action="store_true")
+    p.add_argument("--motion-threshold", type=float, default=None, help="Percent of changed pixels (default: the worker's).")
+    p.add_argument("--resume", action="store_true", help="Continue interrupted videos from their checkpoints.")
+    p.add_argument("--model-service", action="store_true", help="Use the warm background model service.")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ethogrid", description="Run EthoGrid processing steps without the GUI. Progress is written to stdout as JSON lines.")
+    sub = parser.add_subparsers(dest="command", metavar="COMMAND")
+    sub.required = True
+    video = argparse.ArgumentParser(add_help=False)
+    video.add_argument("--video-decoder", choices=DECODER_CHOICES, default=None, help="Video decoder (default: OpenCV; PyAV and ffmpeg are faster but ignore rotation metadata).")
+    video.add_argument("--decode-threads", type=int, default=None, help="Decoder threads per video (default: all cores).")
+
+    p = sub.add_parser("detect", parents=[video], help="YOLO detection inference (YoloProcessor).")
+    _add_inference_arguments(p); p.set_defaults(func=cmd_detect)
+    p = sub.add_parser("segment", parents=[video], help="YOLO segmentation inference (YoloSegmentationProcessor).")
+    _add_inference_arguments(p)
+    p.add_argument("--polygon-sidecar", action="store_true",
+                   help="Store the mask outlines in a binary .polygons.npz next to the CSV, whose polygon column then holds indices into it.")
+    p.set_defaults(func=cmd_segment)
+
+    p = sub.add_parser("batch", parents=[video], help="Tank assignment, tracking and exports (BatchProcessor).")
+    p.add_argument("videos", nargs="+", help="Video files or directories to search for videos.")
+    p.add_argument("--settings", required=True, help="Grid settings.json.")
+    p.add_argument("--output-dir", required=True)
+    p.add_argument("--csv-dir", default=None, help="Folder with the detection CSVs (default: next to each video).")
+    p.add_argument("--tracking", choices=TRACKING_CHOICES, default="filter")
+    p.add_argument("--max-animals", type=int, default=1, help="Animals per tank to track or keep.")
+    p.add_argument("--distance-function", choices=("euclidean", "iou"), default="euclidean")
+    p.add_argument("--distance-threshold", type=float, default=100.0)
+    p.add_argument("--hit-counter-max", type=int, default=15)
+    p.add_argument("--initialization-delay", type=int, default=3)
+    p.add_argument("--past-detections", type=int, default=4)
+    p.add_argument("--tracking-processes", type=int, default=1, help="Tanks tracked in parallel processes with --tracking norfair/centroid (0: one per CPU core).")
+    p.add_argument("--frame-sample-rate", type=int, default=30, help="Use every Nth frame for image exports.")
+    p.add_argument("--time-gap", type=float, default=1.0, help="Max time gap in seconds for trajectories.")
+    for output in ("video", "csv", "centroid-csv", "excel", "trajectory-img", "heatmap-img", "overlays"):
+        p.add_argument(f"--no-{output}", action="store_true")
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("analyze", help="Endpoint analysis of tracked CSVs (AnalysisProcessor).")
+    p.add_argument("csv_files", nargs="+", help="Tracked CSV files or directories to search for CSVs.")
+    p.add_argument("--grid-settings", required=True, help="Grid settings.json the CSVs were produced with.")
+    p.add_argument("--analysis-settings", default=None, help="Analysis settings JSON saved from the Analysis dialog.")
+    p.add_argument("--output-dir", required=True)
+    p.add_argument("--mode", choices=MODE_CHOICES, default=None)
+    p.add_argument("--side-view-axis", choices=AXIS_CHOICES, default=None)
+    p.add_argument("--rapid-threshold", type=float, default=None, help="cm/s (default 5.0).")
+    p.add_argument("--freezing-threshold", type=float, default=None, help="cm/s (default 0.5).")
+    p.add_argument("--angular-threshold", type=float, default=None, help="deg/s (default 90).")
+    p.add_argument("--frame-rate", type=float, default=None, help="Default 30.")
+    p.add_argument("--conversion-rate", type=float, default=None, help="Pixels per cm (default 100).")
+    p.add_argument("--endpoint", action="append", default=None, help="Endpoint to calculate; repeatable (default: all).")
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("stats", help="Group comparison of analysis results (StatsProcessor).")
+    p.add_argument("--group", action="append", required=True, metavar="NAME=PATH[,PATH...]", help="A group of result .xlsx files or directories; repeat per group.")
+    p.add_argument("--output-dir", required=True)
+    p.add_argument("--level", choices=LEVEL_CHOICES, default="grand")
+    p.add_argument("--endpoint", action="append", default=None, help="Endpoint to compare; repeatable (default: all shared endpoints).")
+    p.add_argument("--normality", choices=NORMALITY_CHOICES, default="shapiro")
+    p.add_argument("--alpha", type=float, default=0.05)
+    p.add_argument("--force-parametric", action="store_true")
+    p.add_argument("--central-tendency", choices=CENTRAL_TENDENCY_CHOICES, default="mean")
+    p.add_argument("--error-bar", choices=("SD", "SEM"), default="SD")
+    p.add_argument("--palette", choices=('pastel', 'muted', 'deep', 'viridis', 'plasma'), default="pastel")
+    p.add_argument("--width", type=int, default=800); p.add_argument("--height", type=int, default=600); p.add_argument("--dpi", type=int, default=300)
+    p.add_argument("--title-size", type=int, default=16); p.add_argument("--axes-size", type=int, default=12); p.add_argument("--tick-size", type=int, default=10)
+    p.add_argument("--title-weight", choices=("bold", "normal"), default="bold"); p.add_argument("--axes-weight", choices=("normal", "bold"), default="normal")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("bench", parents=[video], help="Inference throughput benchmark on synthetic videos.")
+    p.add_argument("--tasks", nargs="+", choices=("detect", "segment"), default=["detect", "segment"])
+    p.add_argument("--width", type=int, default=1280); p.add_argument("--height", type=int, default=720)
+    p.add_argument("--fps", type=float, default=30.0)
+    p.add_argument("--frames", type=int, default=300)
+    p.add_argument("--tanks", type=int, default=6)
+    p.add_argument("--worms-per-tank", type=int, default=1)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--detect-model", default=None, help="Detection weights (default: a randomly initialised YOLOv8n).")
+    p.add_argument("--segment-model", default=None, help="Segmentation weights (default: a randomly initialised YOLOv8n-seg).")
+    p.add_argument("--imgsz", type=int, default=None, help="Inference image size (default: the model's).")
+    p.add_argument("--confidence", type=float, default=0.25)
+    p.add_argument("--batch-size", type=int, default=12)
+    p.add_argument("--pipeline", action="store_true", help="Overlap decoding, inference and writing.")
+    p.add_argument("--tank-crops", action="store_true", help="Run the model on per-tank crops of the synthetic grid.")
+    p.add_argument("--no-video", action="store_true", help="Skip drawing and encoding the annotated video.")
+    p.add_argument("--repeat", type=int, default=1, help="Runs per task; the fastest one is kept.")
+    p.add_argument("--work-dir", default=None, help="Keep the synthetic video, models and outputs here (default: a temporary folder).")
+    p.add_argument("--output", default=None, help="Save the results as JSON.")
+    p.add_argument("--baseline", default=None, help="Results JSON to compare against.")
+    p.add_argument("--tolerance", type=float, default=0.15, help="Relative slowdown reported as a regression.")
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("bench-tracking", help="Tracking throughput of the built-in tracker and Norfair, and how well they agree.")
+    p.add_argument("--tanks", type=int, default=48)
+    p.add_argument("--frames", type=int, default=1800)
+    p.add_argument("--fps", type=float, default=30.0, help="Frame rate the trackers have to keep up with.")
+    p.add_argument("--animals-per-tank", type=int, default=1)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--miss-rate", type=float, default=0.05, help="Chance that an animal is not detected in a frame.")
+    p.add_argument("--false-rate", type=float, default=0.02, help="Chance of a spurious detection per tank and frame.")
+    p.add_argument("--noise", type=float, default=2.0, help="Centroid jitter of the detections in pixels.")
+    p.add_argument("--distance-threshold", type=float, default=100.0)
+    p.add_argument("--hit-counter-max", type=int, default=15)
+    p.add_argument("--initialization-delay", type=int, default=3)
+    p.add_argument("--past-detections", type=int, default=4)
+    p.add_argument("--processes", type=int, default=1, help="Tanks tracked in parallel processes.")
+    p.add_argument("--max-distance", type=float, default=10.0, help="Pixels within which the two trackers' positions count as the same animal.")
+    p.add_argument("--no-norfair", action="store_true", help="Only measure the built-in tracker.")
+    p.add_argument("--repeat", type=int, default=1, help="Runs per tracker; the fastest one is kept.")
+    p.add_argument("--output", default=None, help="Save the results as JSON.")
+    p.set_defaults(func=cmd_bench_tracking)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)  # usage errors exit with code 2
+    if getattr(args, "video_decoder", None) or getattr(args, "decode_threads", None) is not None:
+        # Set through the environment so the worker processes of a sharded run use them too
+        from core.video_source import set_default_decoder, DECODE_THREADS_ENV
+        if args.video_decoder: set_default_decoder(DECODER_CHOICES[args.video_decoder])
+        if args.decode_threads is not None: os.environ[DECODE_THREADS_ENV] = str(max(0, args.decode_threads))
+    # Only events go to stdout; stray prints of the workers and libraries are moved to stderr
+    events = EventStream(sys.stdout)
+    sys.stdout = sys.stderr
+    try:
+        return args.func(args, parser, events)
+    except KeyboardInterrupt:
+        events.emit("finished", status="interrupted", exit_code=128 + signal.SIGINT, errors=0,
+                    wall_seconds=round(time.monotonic() - events.started, 3))
+        return 128 + signal.SIGINT
+    finally:
+        sys.stdout = events.stream
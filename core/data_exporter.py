@@ -6,6 +6,8 @@ from collections import defaultdict
 import cv2
 import numpy as np
 from PyQt5.QtCore import QPointF
+from core.polygon_store import polygon_text, POLYGON_COLUMN
+from core.video_source import read_first_frame
 
 try:
     import pandas as pd
@@ -19,12 +21,9 @@ def export_heatmap_image(processed_detections, video_path, output_path, time_gap
     using only a subsample of the frames.
     """
     try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened(): return f"Could not open video file: {video_path}"
-        ret, base_image = cap.read()
-        if not ret: cap.release(); return f"Could not read the first frame of video: {video_path}"
+        base_image = read_first_frame(video_path)
+        if base_image is None: return f"Could not read the first frame of video: {video_path}"
         video_h, video_w, _ = base_image.shape
-        cap.release()
 
         # ### NEW: Filter detections based on the frame sample rate ###
         sampled_detections = {k: v for k, v in processed_detections.items() if k % frame_sample_rate == 0}
@@ -169,6 +168,7 @@ def export_to_excel_sheets(processed_detections, output_path):
                 sheet_name = f'Tank_{tank_num}'; tank_df = pd.DataFrame(tank_data[tank_num])
                 for col in ['x1', 'y1', 'x2', 'y2', 'cx', 'cy', 'conf']:
                     if col in tank_df.columns: tank_df[col] = pd.to_numeric(tank_df[col], errors='coerce')
+                if POLYGON_COLUMN in tank_df.columns: tank_df[POLYGON_COLUMN] = tank_df[POLYGON_COLUMN].map(polygon_text)
                 if 'tank_number' in tank_df.columns: tank_df = tank_df.drop(columns=['tank_number'])
                 tank_df.to_excel(writer, sheet_name=sheet_name, index=False, float_format='%.4f')
         return None
@@ -0,0 +1,182 @@
+# EthoGrid_App/core/detection_table.py
+
+import os
+import csv
+import importlib.util
+import numpy as np
+import pandas as pd
+from core.polygon_store import PolygonStore, polygon_points, sidecar_path, POLYGON_COLUMN
+from core.result_extraction import TANK_COLUMN
+from core.stride_interpolation import INTERPOLATED_COLUMN
+from core.motion_gate import CARRIED_COLUMN
+from core.tank_assignment import NO_TANK
+
+TRACK_COLUMN = "track_id"
+FLOAT_COLUMNS = ("conf", "x1", "y1", "x2", "y2", "cx", "cy")
+FLAG_COLUMNS = (INTERPOLATED_COLUMN, CARRIED_COLUMN)
+# Columns read from a detection CSV with the dtype they are parsed as; anything else is skipped
+CSV_DTYPES = {"frame_idx": "float64", "class_name": "str", **{name: "float64" for name in FLOAT_COLUMNS},
+              TANK_COLUMN: "float64", TRACK_COLUMN: "float64", **{name: "float64" for name in FLAG_COLUMNS},
+              POLYGON_COLUMN: "str"}
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+def _read_header(csv_path):
+    with open(csv_path, newline="", encoding='utf-8') as f:
+        return next(csv.reader(f), [])
+
+def _read_columns(csv_path, usecols, dtypes):
+    """Parses only `usecols`, with the multi-threaded pyarrow parser when it is installed."""
+    options = dict(usecols=usecols, dtype=dtypes, keep_default_na=False, na_values=[""], encoding='utf-8')
+    if PYARROW_AVAILABLE:
+        try: return pd.read_csv(csv_path, engine="pyarrow", **options)
+        except (ValueError, TypeError, ImportError): pass  # options this pandas/pyarrow pairing does not support
+    return pd.read_csv(csv_path, engine="c", low_memory=False, **options)
+
+def _optional_ints(values):
+    """Float column with NaN for empty cells -> list of ints and None."""
+    ints = np.nan_to_num(values, nan=0.0).astype(np.int64).tolist()
+    return [None if missing else v for v, missing in zip(ints, np.isnan(values).tolist())]
+
+
+class DetectionTable:
+    """
+    Column-oriented detections of one CSV, as written by the inference workers.
+
+    Only the known columns (CSV_DTYPES) are parsed, each straight into a NumPy array of its
+    type: `class_name` becomes a categorical and polygon cells stay unparsed until a row is
+    needed. Rows are ordered by frame (file order within a frame) and `frame_range(frame)`
+    gives the rows of a frame, so nothing has to be grouped by a dict of lists first.
+    """
+    def __init__(self, columns, headers, polygons=None):
+        self.columns = columns          # name -> array, one entry per detection
+        self.headers = headers          # names of the parsed columns, in file order
+        self.polygons = polygons        # PolygonStore of the CSV's sidecar, if any
+        frame_idx = columns["frame_idx"]
+        self.frames, starts = np.unique(frame_idx, return_index=True)
+        self.offsets = np.append(starts, len(frame_idx)).astype(np.int64)
+
+    @classmethod
+    def read_csv(cls, csv_path):
+        header = _read_header(csv_path)
+        if "frame_idx" not in header:
+            raise ValueError(f"{csv_path} has no 'frame_idx' column")
+        usecols = [name for name in header if name in CSV_DTYPES]
+        df = _read_columns(csv_path, usecols, {name: CSV_DTYPES[name] for name in usecols})
+
+        frame_idx = df["frame_idx"].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(frame_idx)
+        order = np.flatnonzero(valid)[np.argsort(frame_idx[valid], kind='stable')]
+        columns = {"frame_idx": frame_idx[order].astype(np.int64)}
+        for name in usecols:
+            if name == "frame_idx": continue
+            series = df[name]
+            if name == "class_name":
+                columns[name] = pd.Categorical(series.fillna("").to_numpy(dtype=object)[order])
+            elif name == POLYGON_COLUMN:
+                columns[name] = series.fillna("").to_numpy(dtype=object)[order]
+            else:
+                columns[name] = series.to_numpy(dtype=np.float64, na_value=np.nan)[order]
+        for name in FLAG_COLUMNS:
+            if name in columns: columns[name] = np.nan_to_num(columns[name], nan=0.0).astype(np.int64)
+        polygons = PolygonStore.load(csv_path) if POLYGON_COLUMN in columns else None
+        if POLYGON_COLUMN in columns and polygons is None:
+            cell = next((c for c in columns[POLYGON_COLUMN] if c), "")
+            if cell and ',' not in cell:
+                raise ValueError(f"{csv_path} stores its polygons in {os.path.basename(sidecar_path(csv_path))}, which is missing")
+        table = cls(columns, usecols, polygons)
+        table.fill_centroids()
+        return table
+
+    def __len__(self):
+        return len(self.columns["frame_idx"])
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def frame_range(self, frame):
+        """Rows of `frame` (an empty range if it has no detections)."""
+        i = int(np.searchsorted(self.frames, frame))
+        if i == len(self.frames) or self.frames[i] != frame: return range(0)
+        return range(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    @property
+    def class_names(self):
+        """Distinct class names, in sorted order."""
+        if "class_name" not in self.columns: return []
+        return sorted(name for name in self.columns["class_name"].categories if name)
+
+    def fill_centroids(self):
+        """Uses the box centre as centroid where the CSV has no (or an empty) cx/cy."""
+        if not all(name in self.columns for name in ("x1", "y1", "x2", "y2")): return
+        for c, lo, hi in (("cx", "x1", "x2"), ("cy", "y1", "y2")):
+            centre = (np.nan_to_num(self.columns[lo]) + np.nan_to_num(self.columns[hi])) / 2.0
+            if c not in self.columns: self.columns[c] = centre; self.headers.append(c)
+            else: self.columns[c] = np.where(np.isnan(self.columns[c]), centre, self.columns[c])
+
+    def polygon(self, row):
+        """The outline of a row as an (N, 2) int32 array, or None."""
+        if POLYGON_COLUMN not in self.columns: return None
+        return polygon_points(self.columns[POLYGON_COLUMN][row], self.polygons)
+
+    def rows(self, index=slice(None), extra_columns=None):
+        """
+        The selected rows as the detection dicts the tracking, export and drawing code works with:
+        ints for frame, tank and flags (None for an unassigned tank), floats for coordinates,
+        resolved polygon arrays. `extra_columns` ({name: full-length array}) adds or replaces
+        columns, e.g. freshly assigned tank numbers (where NO_TANK becomes None).
+        """
+        sources, names = self.columns, self.headers
+        if extra_columns:
+            sources = {**self.columns, **extra_columns}
+            names = names + [name for name in extra_columns if name not in names]
+        values = {}
+        for name in names:
+            column = sources[name][index]
+            if name == TANK_COLUMN and column.dtype.kind in "iu": column = np.where(column != NO_TANK, column, np.nan)
+            if name == "class_name": values[name] = np.asarray(column, dtype=object).tolist()
+            elif name == POLYGON_COLUMN: values[name] = [polygon_points(cell, self.polygons) for cell in column.tolist()]
+            elif name in (TANK_COLUMN, TRACK_COLUMN): values[name] = _optional_ints(column)
+            else: values[name] = column.tolist()
+        return [dict(zip(names, row)) for row in zip(*(values[name] for name in names))]
+
+    def top_per_tank(self, max_per_tank, tanks=None):
+        """
+        Row indices of the `max_per_tank` most confident detections of every (frame, tank), in
+        the order the per-frame dict-and-sort filter produced them: frames ascending, tanks in
+        order of first appearance within a frame, confidence descending with ties in file order.
+        `tanks` defaults to the CSV's tank column; rows without a tank are dropped.
+        """
+        if tanks is None:
+            if TANK_COLUMN not in self.columns: return np.zeros(0, dtype=np.int64)
+            tanks = self.columns[TANK_COLUMN]
+        tanks = np.asarray(tanks)
+        if tanks.dtype.kind == "f":
+            assigned = ~np.isnan(tanks); tanks = np.nan_to_num(tanks, nan=0.0).astype(np.int64)
+        else:
+            assigned = tanks != NO_TANK
+        rows = np.flatnonzero(assigned)
+        if not len(rows) or max_per_tank <= 0: return np.zeros(0, dtype=np.int64)
+        frame, tank = self.columns["frame_idx"][rows], tanks[rows]
+        conf = self.columns["conf"][rows] if "conf" in self.columns else np.zeros(len(rows))
+        # First row of each (frame, tank) group: rows are frame-ordered, so this orders tanks by first appearance
+        by_group = np.lexsort((rows, tank, frame))
+        starts = np.flatnonzero(np.r_[True, (np.diff(frame[by_group]) != 0) | (np.diff(tank[by_group]) != 0)])
+        first_row = np.empty(len(rows), dtype=np.int64)
+        first_row[by_group] = np.repeat(rows[by_group][starts], np.diff(np.r_[starts, len(rows)]))
+        # Group by first appearance, then confidence descending (NaN last), ties in file order; keep each group's first K
+        order = np.lexsort((rows, -conf, first_row))
+        group_start = np.flatnonzero(np.r_[True, np.diff(first_row[order]) != 0])
+        rank = np.arange(len(order)) - np.repeat(group_start, np.diff(np.r_[group_start, len(order)]))
+        return rows[order[rank < max_per_tank]]
+
+    def frame_dicts(self, index=None, extra_columns=None):
+        """{frame_idx: [detection dict, ...]} of all rows, or of the rows selected by a boolean/index array."""
+        rows = np.arange(len(self)) if index is None else np.arange(len(self))[index]
+        detections = {}
+        for frame, det in zip(self.columns["frame_idx"][rows].tolist(), self.rows(rows, extra_columns)):
+            detections.setdefault(frame, []).append(det)
+        return detections
@@ -5,9 +5,18 @@ import numpy as np
 import pandas as pd
 from collections import defaultdict
 from PyQt5.QtCore import QPointF, QLineF
+from core.stride_interpolation import INTERPOLATED_COLUMN
+from core.motion_gate import CARRIED_COLUMN
 
 EPSILON = 1e-10
 
+SIDE_VIEW_ENDPOINTS = ["Average Speed (cm/s)", "Freezing Time (%)", "Swimming Time (%)", "Rapid Time (%)", "Time in Top (%)", "Time in Middle (%)", "Time in Bottom (%)", "Entries to Top", "Fractal Dimension", "Entropy"]
+TOP_VIEW_ENDPOINTS = ["Average Speed (cm/s)", "Average Distance from Center (cm)", "Average Angular Velocity (degree/s)", "Meandering (degree/m)", "Fractal Dimension", "Entropy"]
+
+def behavior_endpoint_name(class_name):
+    """Name of the time-spent endpoint of one behavior class, e.g. 'Time_Normal_(%)'."""
+    return f"Time_{str(class_name).replace(' ', '_').capitalize()}_(%)"
+
 def calculate_turning_angle(p1, p2, p3):
     v1 = (p1[0] - p2[0], p1[1] - p2[1])
     v2 = (p3[0] - p2[0], p3[1] - p2[1])
@@ -82,6 +91,14 @@ class EndpointsAnalyzer:
         
         self.df = self.df.sort_values(by='frame_idx').reset_index(drop=True)
         cx_np, cy_np, frame_idx_np = self.df['cx'].to_numpy(), self.df['cy'].to_numpy(), self.df['frame_idx'].to_numpy()
+        # Rows filled in by stride inference lie on straight lines between keyframes, and rows carried
+        # over by the motion gate repeat the last position: they count towards time and distance, but
+        # turning-based endpoints are computed from the measured rows only.
+        measured_df = self.df
+        for flag in (INTERPOLATED_COLUMN, CARRIED_COLUMN):
+            if flag in measured_df.columns:
+                measured_df = measured_df[measured_df[flag].fillna(0) == 0]
+        measured_df = measured_df.reset_index(drop=True)
         
         total_duration_of_tracking = (frame_idx_np[-1] - frame_idx_np[0]) / self.params['frame_rate'] if len(frame_idx_np) > 1 else 0.0
         total_tracked_frames = len(self.df)
@@ -104,17 +121,14 @@ class EndpointsAnalyzer:
             behavior_counts = self.df['class_name'].value_counts()
             for behavior, count in behavior_counts.items():
                 if pd.isna(behavior): continue
-                # Sanitize the name for the column header
-                clean_behavior_name = str(behavior).replace(' ', '_').capitalize()
-                endpoint_name = f"Time_{clean_behavior_name}_(%)"
-                self.results[endpoint_name] = (count / total_tracked_frames) * 100
+                self.results[behavior_endpoint_name(behavior)] = (count / total_tracked_frames) * 100
 
         if analysis_mode == 'Side View':
             self._analyze_side_view(speeds, time_intervals, total_duration_of_tracking)
         
-        self._analyze_top_view(cx_np, cy_np)
+        self._analyze_top_view(cx_np, cy_np, measured_df)
 
-        fd, entropy = calculate_fractal_dimension_and_entropy(self.df)
+        fd, entropy = calculate_fractal_dimension_and_entropy(measured_df)
         self.results['Fractal Dimension'] = fd
         self.results['Entropy'] = entropy
 
@@ -177,15 +191,22 @@ class EndpointsAnalyzer:
         self.results['Time in Bottom (%)'] = (time_in_bottom / total_duration) * 100 if total_duration > 0 else 0.0
         self.results['Entries to Top'] = (top_mask[:-1] < top_mask[1:]).sum()
 
-    def _analyze_top_view(self, cx_np, cy_np):
+    def _analyze_top_view(self, cx_np, cy_np, measured_df):
         tank_center = self.params['tank_center']
         distances_to_center = np.sqrt((cx_np - tank_center[0])**2 + (cy_np - tank_center[1])**2)
         self.results['Average Distance from Center (cm)'] = (np.mean(distances_to_center) / self.params['conversion_rate']) if len(distances_to_center) > 0 else 0.0
-        if len(cx_np) > 2:
-            coords = np.column_stack((cx_np, cy_np))
+        if len(measured_df) > 2:
+            coords = measured_df[['cx', 'cy']].to_numpy()
             angles = [calculate_turning_angle(coords[i], coords[i+1], coords[i+2]) for i in range(len(coords) - 2)]
             self.results['Total Absolute Turn Angle (degree)'] = np.sum(np.abs(angles))
-            angular_velocities = np.abs(angles) / (1 / self.params['frame_rate']) if self.params['frame_rate'] > 0 else np.zeros(len(angles))
+            if self.params['frame_rate'] <= 0:
+                angular_velocities = np.zeros(len(angles))
+            elif INTERPOLATED_COLUMN in measured_df.columns or CARRIED_COLUMN in measured_df.columns:
+                # Measured rows of a stride or motion-gated run can be several frames apart; each turn is timed over the step leading into it
+                turn_intervals = np.diff(measured_df['frame_idx'].to_numpy())[:-1] / self.params['frame_rate']
+                angular_velocities = np.divide(np.abs(angles), turn_intervals, out=np.zeros(len(angles)), where=turn_intervals > 0)
+            else:
+                angular_velocities = np.abs(angles) / (1 / self.params['frame_rate'])
             self.results['Average Angular Velocity (degree/s)'] = np.mean(angular_velocities) if len(angular_velocities) > 0 else 0.0
         else:
             self.results['Total Absolute Turn Angle (degree)'] = 0.0
@@ -0,0 +1,48 @@
+# EthoGrid_App/core/frame_ring.py
+
+from collections import deque
+import numpy as np
+
+
+class FrameRing:
+    """
+    Recycled frame buffers that video frames are decoded into in place.
+
+    `read(source)` decodes the next frame straight into a free buffer with `source.read(image=...)`,
+    so once the ring is warm no frame is allocated per read. Buffers are handed back with
+    `release()` after the frame has been drawn on and written. The ring only grows when every
+    buffer is still in flight (e.g. batches queued in the pipeline), so it settles at the real
+    high-water mark instead of a worst-case size. `read` and `release` may be called from
+    different threads.
+    """
+    def __init__(self, frame_shape, preallocate=0, dtype=np.uint8):
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self._free = deque(np.empty(self.frame_shape, self.dtype) for _ in range(preallocate))
+        self.allocated = preallocate
+
+    def _acquire(self):
+        try:
+            return self._free.pop()
+        except IndexError:
+            self.allocated += 1
+            return np.empty(self.frame_shape, self.dtype)
+
+    def read(self, source):
+        """Decodes the next frame of a VideoSource (or cv2.VideoCapture) into a ring buffer. Returns the frame, or None at the end of the video."""
+        buffer = self._acquire()
+        ret, frame = source.read(image=buffer)
+        if not ret:
+            self._free.append(buffer)
+            return None
+        if frame.shape != self.frame_shape or not np.shares_memory(frame, buffer):
+            # The decoder produced another size (e.g. rotated video) and allocated the frame itself
+            self._free.append(buffer)
+        return frame
+
+    def release(self, frames):
+        """Returns frames to the ring once nothing reads them anymore. Frames of another shape are dropped."""
+        for frame in frames:
+            if frame is not None and frame.shape == self.frame_shape and frame.dtype == self.dtype \
+                    and frame.flags.c_contiguous and frame.flags.writeable:
+                self._free.append(frame)
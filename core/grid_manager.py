@@ -3,6 +3,7 @@
 import numpy as np
 from PyQt5.QtCore import QObject, pyqtSignal, QPointF
 from PyQt5.QtGui import QTransform
+from core.tank_assignment import grid_matrix
 
 class GridManager(QObject):
     """
@@ -63,6 +64,10 @@ class GridManager(QObject):
         self._update_transform_matrix()
         self.transform_updated.emit()
 
+    def matrix(self):
+        """The current transform as a NumPy 3x3 matrix (see core.tank_assignment.grid_matrix)."""
+        return grid_matrix(self.center.x(), self.center.y(), self.angle, self.scale_x, self.scale_y, *self.video_size)
+
     def _update_transform_matrix(self):
         self.transform.reset()
         if self.video_size[0] > 0:
@@ -0,0 +1,103 @@
+# EthoGrid_App/core/inference_pipeline.py
+
+import queue
+import threading
+
+_END_OF_STREAM = object()
+
+
+class InferencePipeline:
+    """
+    Overlaps frame decoding, model inference and drawing/encoding.
+
+    Decoding and inference each run on their own thread and hand batches
+    downstream through bounded queues, so a slow stage blocks the one in
+    front of it instead of buffering the whole video in memory. The write
+    stage runs on the calling thread, which keeps Qt signal emission where
+    it was and guarantees batches are written in the order they were read.
+    """
+    def __init__(self, read_batch, infer_batch, write_batch, is_running, queue_size=4):
+        """
+        Args:
+            read_batch (callable): Returns (frames, indices) or None at end of video.
+            infer_batch (callable): Takes (frames, indices), returns the model results.
+            write_batch (callable): Takes (frames, indices, results) and consumes them.
+            is_running (callable): Returns False once the user has cancelled.
+            queue_size (int): Max number of batches waiting between two stages.
+        """
+        self.read_batch = read_batch
+        self.infer_batch = infer_batch
+        self.write_batch = write_batch
+        self.is_running = is_running
+        self.decoded = queue.Queue(maxsize=queue_size)
+        self.inferred = queue.Queue(maxsize=queue_size)
+        self.errors = []
+        self._abort = threading.Event()
+
+    def _should_stop(self):
+        return self._abort.is_set() or not self.is_running()
+
+    def _put(self, q, item):
+        """Blocks while the queue is full, but gives up as soon as the run is cancelled."""
+        while True:
+            if self._should_stop() and item is not _END_OF_STREAM:
+                return False
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if item is _END_OF_STREAM and self._should_stop():
+                    # Downstream may have stopped consuming; drop a slot to let the marker through.
+                    try: q.get_nowait()
+                    except queue.Empty: pass
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._abort.is_set():
+                    return _END_OF_STREAM
+
+    def _decode_loop(self):
+        try:
+            while not self._should_stop():
+                batch = self.read_batch()
+                if batch is None: break
+                if not self._put(self.decoded, batch): break
+        except Exception as e:
+            self.errors.append(e); self._abort.set()
+        finally:
+            self._put(self.decoded, _END_OF_STREAM)
+
+    def _infer_loop(self):
+        try:
+            while True:
+                batch = self._get(self.decoded)
+                if batch is _END_OF_STREAM or self._should_stop(): break
+                frames, indices = batch
+                results = self.infer_batch(frames, indices)
+                if not self._put(self.inferred, (frames, indices, results)): break
+        except Exception as e:
+            self.errors.append(e); self._abort.set()
+        finally:
+            self._put(self.inferred, _END_OF_STREAM)
+
+    def run(self):
+        """Runs the pipeline to completion (or cancellation) and re-raises the first stage error."""
+        decoder = threading.Thread(target=self._decode_loop, name="ethogrid-decode", daemon=True)
+        inferencer = threading.Thread(target=self._infer_loop, name="ethogrid-infer", daemon=True)
+        decoder.start(); inferencer.start()
+        try:
+            while True:
+                item = self._get(self.inferred)
+                if item is _END_OF_STREAM: break
+                if self._should_stop(): continue  # drain so upstream threads can exit
+                self.write_batch(*item)
+        except Exception as e:
+            self.errors.append(e)
+        finally:
+            self._abort.set()
+            decoder.join(); inferencer.join()
+        if self.errors:
+            raise self.errors[0]
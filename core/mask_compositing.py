@@ -0,0 +1,68 @@
+# EthoGrid_App/core/mask_compositing.py
+
+import cv2
+import numpy as np
+
+MASK_ALPHA = 0.4  # opacity of the mask colour over the video
+
+
+def _bounds(points):
+    x0, y0 = points.min(axis=0)
+    x1, y1 = points.max(axis=0) + 1
+    return int(x0), int(y0), int(x1), int(y1)
+
+def composite_masks(frame, polygons, colors, clips=None, alpha=MASK_ALPHA, clip_labels=None, label_map=None):
+    """
+    Fills `polygons` ((N, 2) int32 pixel outlines) in `colors` (BGR) at `alpha` opacity onto
+    `frame`, in place, with later polygons on top.
+
+    Every instance is rasterized into one label map that only spans the instances' bounding
+    boxes; a label -> colour lookup table then colours it and each covered pixel is blended
+    exactly once, instead of painting a full-frame overlay per instance and blending the whole
+    frame. `clips` optionally gives one polygon per instance (or None) that its mask is clipped
+    to, e.g. the outline of its tank. Alternatively `clip_labels` gives one label per instance
+    (or None) of `label_map`, a frame-sized label image such as ArenaLayout.labels, and each
+    mask keeps only the pixels carrying its label. Returns True if any pixel was drawn.
+    """
+    h, w = frame.shape[:2]
+    items = []
+    for i, points in enumerate(polygons):
+        if points is None or not len(points): continue
+        x0, y0, x1, y1 = _bounds(points)
+        clip = clips[i] if clips is not None else None
+        if clip is not None:
+            cx0, cy0, cx1, cy1 = _bounds(clip)
+            x0, y0, x1, y1 = max(x0, cx0), max(y0, cy0), min(x1, cx1), min(y1, cy1)
+        clip_label = clip_labels[i] if clip_labels is not None else None
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, w), min(y1, h)
+        if x1 > x0 and y1 > y0:
+            items.append((points, clip, clip_label, colors[i], (x0, y0, x1, y1)))
+    if not items: return False
+
+    ux0, uy0 = min(b[3][0] for b in items), min(b[3][1] for b in items)
+    ux1, uy1 = max(b[3][2] for b in items), max(b[3][3] for b in items)
+    labels = np.zeros((uy1 - uy0, ux1 - ux0), dtype=np.uint8 if len(items) < 255 else np.uint16)
+    lut = np.zeros((len(items) + 1, 3), dtype=np.float32)
+    for label, (points, clip, clip_label, color, (x0, y0, x1, y1)) in enumerate(items, 1):
+        lut[label] = color
+        if clip is None and clip_label is None:
+            cv2.fillPoly(labels, [points], label, offset=(-ux0, -uy0))
+            continue
+        # Clipped instances are rasterized within their own box and merged into the label map
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.fillPoly(mask, [points], 1, offset=(-x0, -y0))
+        keep = mask.astype(bool)
+        if clip is not None:
+            clip_mask = np.zeros_like(mask)
+            cv2.fillPoly(clip_mask, [clip], 1, offset=(-x0, -y0))
+            keep &= clip_mask.astype(bool)
+        if clip_label is not None:
+            keep &= label_map[y0:y1, x0:x1] == clip_label
+        labels[y0 - uy0:y1 - uy0, x0 - ux0:x1 - ux0][keep] = label
+
+    covered = labels > 0
+    if not covered.any(): return False
+    region = frame[uy0:uy1, ux0:ux1]
+    blended = region[covered].astype(np.float32) * (1.0 - alpha) + lut[labels[covered]] * alpha
+    region[covered] = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+    return True
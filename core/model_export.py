@@ -0,0 +1,85 @@
+# EthoGrid_App/core/model_export.py
+
+import os
+import shutil
+import hashlib
+import threading
+import importlib.util
+from core.app_paths import get_cache_dir
+
+BACKEND_PYTORCH = "PyTorch"
+BACKEND_ONNX = "ONNX Runtime"
+BACKEND_OPENVINO = "OpenVINO"
+BACKENDS = (BACKEND_PYTORCH, BACKEND_ONNX, BACKEND_OPENVINO)
+DEFAULT_EXPORT_IMGSZ = 640
+
+# Ultralytics export format, packages needed to export and run it, suffix Ultralytics recognises on load
+_FORMATS = {
+    BACKEND_ONNX: ("onnx", ("onnx", "onnxruntime"), ".onnx"),
+    BACKEND_OPENVINO: ("openvino", ("openvino",), "_openvino_model"),
+}
+_export_lock = threading.Lock()
+
+
+def backend_available(backend):
+    """True if the packages needed to export and run `backend` are installed."""
+    if backend == BACKEND_PYTORCH: return True
+    return all(importlib.util.find_spec(pkg) is not None for pkg in _FORMATS[backend][1])
+
+def available_backends():
+    return [b for b in BACKENDS if backend_available(b)]
+
+def weights_hash(model_path, chunk_size=1 << 20):
+    """SHA-256 of the weights file, so a cached export follows the content rather than the file name."""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''): digest.update(chunk)
+    return digest.hexdigest()
+
+def cached_export_path(model_path, backend, imgsz):
+    fmt, _, suffix = _FORMATS[backend]
+    name = f"{os.path.splitext(os.path.basename(model_path))[0]}_{weights_hash(model_path)[:16]}_{int(imgsz)}"
+    return os.path.join(get_cache_dir("exported_models", fmt), name + suffix)
+
+def ensure_exported(model_path, backend, imgsz=None, log=print):
+    """
+    Returns the path of `model_path` exported for `backend` at `imgsz`, exporting it on a cache miss.
+    Exports are stored under the EthoGrid cache, keyed by the weights' content hash and imgsz.
+    """
+    imgsz = int(imgsz or DEFAULT_EXPORT_IMGSZ)
+    target = cached_export_path(model_path, backend, imgsz)
+    with _export_lock:
+        if os.path.exists(target):
+            log(f"Using cached {backend} export: {os.path.basename(target)}")
+            return target
+        from ultralytics import YOLO
+        fmt = _FORMATS[backend][0]
+        log(f"Exporting {os.path.basename(model_path)} to {backend} at imgsz {imgsz} (one-time, cached afterwards)...")
+        # Ultralytics writes the export next to the weights; it is moved into the cache atomically
+        exported = YOLO(model_path).export(format=fmt, imgsz=imgsz, dynamic=True, verbose=False)
+        tmp_target = target + ".tmp"
+        if os.path.exists(tmp_target):
+            shutil.rmtree(tmp_target) if os.path.isdir(tmp_target) else os.remove(tmp_target)
+        shutil.move(str(exported), tmp_target)
+        os.replace(tmp_target, target)
+        log(f"Export cached at: {target}")
+        return target
+
+def load_model(model_path, backend, task, imgsz=None, log=print):
+    """
+    Loads a YOLO model for `backend`. Exported backends are exported on first use and then loaded
+    from the cache; they run at a fixed `imgsz`, so predictions must pass the returned imgsz.
+    Falls back to PyTorch if the export fails. Returns (model, weights_path, imgsz).
+    """
+    from ultralytics import YOLO
+    if backend != BACKEND_PYTORCH:
+        if not backend_available(backend):
+            log(f"[WARNING] {backend} is not installed (needs: {', '.join(_FORMATS[backend][1])}). Falling back to PyTorch.")
+        else:
+            try:
+                imgsz = int(imgsz or DEFAULT_EXPORT_IMGSZ)
+                path = ensure_exported(model_path, backend, imgsz, log=log)
+                return YOLO(path, task=task), path, imgsz
+            except Exception as e:
+                log(f"[WARNING] {backend} export failed ({e}). Falling back to PyTorch.")
+    return YOLO(model_path), model_path, imgsz
@@ -0,0 +1,299 @@
+# EthoGrid_App/core/model_service.py
+
+import os
+import sys
+import json
+import time
+import weakref
+import secrets
+import threading
+import subprocess
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from core.app_paths import get_cache_dir
+from core.result_extraction import mask_centroids
+
+STATE_FILENAME = "model_service.json"
+LOG_FILENAME = "model_service.log"
+DEFAULT_MAX_MODELS = 2          # enough for a detection and a segmentation model together
+DEFAULT_MAX_MEMORY_MB = 2048    # combined size of the weight files kept loaded
+DEFAULT_IDLE_TIMEOUT = 30 * 60  # the service exits after this many seconds without clients
+SERVICE_FLAG = "--model-service"
+
+
+def _state_path():
+    return os.path.join(get_cache_dir(), STATE_FILENAME)
+
+def _read_state():
+    try:
+        with open(_state_path(), 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _connect(state, timeout=2.0):
+    """Opens an authenticated connection to the service described by `state`, or returns None."""
+    if not state: return None
+    try:
+        conn = Client(tuple(state['address']), authkey=bytes.fromhex(state['authkey']))
+        conn.send({'op': 'ping'})
+        if not conn.poll(timeout): conn.close(); return None
+        conn.recv()
+        return conn
+    except (OSError, EOFError, KeyError, ValueError):
+        return None
+
+def _attach_shared_memory(name):
+    """Attaches to a client's block without letting this process's resource tracker unlink it on exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# --- Service process ---
+
+class ModelCache:
+    """
+    Least-recently-used set of loaded models, bounded by count and by the combined size of
+    their weight files. Each entry has its own lock, since a model is not safe to run from
+    two connections at once; different models run concurrently.
+    """
+    def __init__(self, max_models=DEFAULT_MAX_MODELS, max_memory_mb=DEFAULT_MAX_MEMORY_MB, log=print):
+        self.max_models, self.max_memory_mb, self.log = max_models, max_memory_mb, log
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_path, backend, task, imgsz):
+        stat = os.stat(model_path)
+        key = (os.path.abspath(model_path), stat.st_size, int(stat.st_mtime), backend, task, imgsz)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            entry = self._load(model_path, backend, task, imgsz)
+            self._entries[key] = entry
+            while len(self._entries) > 1 and (len(self._entries) > self.max_models or
+                                               sum(e['size_mb'] for e in self._entries.values()) > self.max_memory_mb):
+                old_key, _ = self._entries.popitem(last=False)
+                self.log(f"Evicted {os.path.basename(old_key[0])} ({old_key[3]}) from the warm model cache.")
+            return entry
+
+    def _load(self, model_path, backend, task, imgsz):
+        from core.model_export import load_model
+        started = time.monotonic()
+        model, weights_path, imgsz = load_model(model_path, backend, task, imgsz, log=self.log)
+        if weights_path == model_path:
+            try:
+                import torch
+                if torch.cuda.is_available(): model.to("cuda")
+            except Exception:
+                pass
+        # The first prediction pays for lazy initialisation; do it now rather than in a client's first batch
+        model.predict([np.zeros((imgsz or 640, imgsz or 640, 3), dtype=np.uint8)], verbose=False, **({'imgsz': imgsz} if imgsz else {}))
+        self.log(f"Loaded {os.path.basename(model_path)} ({backend}, {task}) in {time.monotonic() - started:.1f}s.")
+        size_mb = os.path.getsize(weights_path) / (1024 * 1024) if os.path.isfile(weights_path) else 0.0
+        return {'model': model, 'lock': threading.Lock(), 'weights_path': weights_path, 'imgsz': imgsz, 'size_mb': size_mb}
+
+    def describe(self):
+        with self._lock:
+            return [{'model': os.path.basename(k[0]), 'backend': k[3], 'task': k[4], 'imgsz': k[5]} for k in self._entries]
+
+def _compact_result(result):
+    """Reduces an Ultralytics result to what the workers read: (N, 6) boxes, the mask outlines and their centroids."""
+    boxes = result.boxes.data.cpu().numpy() if result.boxes is not None else np.zeros((0, 6), dtype=np.float32)
+    if result.masks is None: return boxes, None, None
+    return boxes, [np.asarray(xy, dtype=np.float32) for xy in result.masks.xy], mask_centroids(result.masks)
+
+def _serve_connection(conn, cache, activity):
+    shm = None
+    activity['clients'] += 1
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            activity['last'] = time.monotonic()
+            try:
+                op = request['op']
+                if op == 'ping':
+                    conn.send({'pid': os.getpid(), 'models': cache.describe()})
+                elif op == 'load':
+                    entry = cache.get(request['model_path'], request['backend'], request['task'], request['imgsz'])
+                    conn.send({'names': dict(entry['model'].names), 'weights_path': entry['weights_path'], 'imgsz': entry['imgsz']})
+                elif op == 'predict':
+                    entry = cache.get(request['model_path'], request['backend'], request['task'], request['imgsz'])
+                    if shm is None or shm.name != request['shm']:
+                        if shm is not None: shm.close()
+                        shm = _attach_shared_memory(request['shm'])
+                    # Frames are copied out so no view into the client's block outlives this request
+                    frames = [np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset).copy()
+                              for offset, shape, dtype in request['frames']]
+                    with entry['lock']:
+                        results = entry['model'].predict(frames, **request['kwargs'])
+                    conn.send({'results': [_compact_result(r) for r in results]})
+                else:
+                    conn.send({'error': f"unknown request '{op}'"})
+            except Exception as e:
+                conn.send({'error': f"{type(e).__name__}: {e}"})
+            activity['last'] = time.monotonic()
+    finally:
+        activity['clients'] -= 1
+        if shm is not None: shm.close()
+        conn.close()
+
+def serve_forever(max_models=DEFAULT_MAX_MODELS, max_memory_mb=DEFAULT_MAX_MEMORY_MB, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Runs the warm model service until it has been idle for `idle_timeout` seconds."""
+    existing = _connect(_read_state())
+    if existing is not None:
+        existing.close()
+        print("A model service is already running.")
+        return 0
+    authkey = secrets.token_bytes(32)
+    listener = Listener(('127.0.0.1', 0), authkey=authkey)
+    state = {'address': list(listener.address), 'authkey': authkey.hex(), 'pid': os.getpid(),
+             'started_at': time.strftime("%Y-%m-%d %H:%M:%S")}
+    tmp_path = _state_path() + ".tmp"
+    with open(tmp_path, 'w') as f: json.dump(state, f, indent=4)
+    if os.name == 'posix': os.chmod(tmp_path, 0o600)
+    os.replace(tmp_path, _state_path())
+
+    def log(message): print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+    log(f"Model service listening on {listener.address[0]}:{listener.address[1]} (pid {os.getpid()}).")
+    cache = ModelCache(max_models, max_memory_mb, log=log)
+    activity = {'last': time.monotonic(), 'clients': 0}
+
+    def watch_idle():
+        while True:
+            time.sleep(5)
+            if activity['clients'] == 0 and time.monotonic() - activity['last'] > idle_timeout:
+                log("Idle timeout reached; shutting down.")
+                if (_read_state() or {}).get('pid') == os.getpid(): os.remove(_state_path())
+                os._exit(0)
+    threading.Thread(target=watch_idle, daemon=True).start()
+
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:  # e.g. a client with the wrong key
+            log(f"Rejected connection: {e}")
+            continue
+        threading.Thread(target=_serve_connection, args=(conn, cache, activity), daemon=True).start()
+
+
+# --- Client side ---
+
+def _service_command():
+    if getattr(sys, 'frozen', False):
+        return [sys.executable, SERVICE_FLAG]  # handled by main.py
+    return [sys.executable, "-m", "core.model_service"]
+
+def ensure_service(log=print, timeout=30.0):
+    """Returns the state of a running service, starting a detached one if none answers."""
+    conn = _connect(_read_state())
+    if conn is not None:
+        conn.close()
+        return _read_state()
+    log("Starting the warm model service...")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    kwargs = {'cwd': root, 'stdin': subprocess.DEVNULL}
+    if os.name == 'nt':
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    with open(os.path.join(get_cache_dir(), LOG_FILENAME), 'a') as log_file:
+        subprocess.Popen(_service_command(), stdout=log_file, stderr=subprocess.STDOUT, **kwargs)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.2)
+        conn = _connect(_read_state())
+        if conn is not None:
+            conn.close()
+            return _read_state()
+    raise RuntimeError(f"The model service did not start within {timeout:.0f}s; see {os.path.join(get_cache_dir(), LOG_FILENAME)}.")
+
+
+class _Boxes:
+    def __init__(self, data): self.data = data
+    def __len__(self): return len(self.data)
+
+class _Masks:
+    def __init__(self, xy, centroids): self.xy, self.centroids = xy, centroids
+    def __len__(self): return len(self.xy)
+
+class ServiceResult:
+    """The parts of an Ultralytics result the workers read, as NumPy arrays."""
+    def __init__(self, boxes, outlines, centroids=None):
+        self.boxes = _Boxes(boxes)
+        self.masks = _Masks(outlines, centroids) if outlines is not None else None
+
+def _release(conn, shm):
+    try: conn.close()
+    except OSError: pass
+    if shm is not None:
+        shm.close()
+        try: shm.unlink()
+        except FileNotFoundError: pass
+
+
+class ServiceModel:
+    """
+    Stands in for an Ultralytics YOLO object whose predictions run in the warm model service.
+
+    Frames are copied into a shared-memory block owned by this client (grown on demand and
+    reused across batches); only their layout and the predict arguments go over the socket.
+    Results come back as ServiceResult objects with NumPy boxes, mask outlines and mask centroids.
+    """
+    def __init__(self, model_path, backend, task, imgsz=None, log=print):
+        state = ensure_service(log=log)
+        self._conn = Client(tuple(state['address']), authkey=bytes.fromhex(state['authkey']))
+        self._shm = None
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, _release, self._conn, None)
+        self._model_args = {'model_path': os.path.abspath(model_path), 'backend': backend, 'task': task, 'imgsz': imgsz}
+        reply = self._request({'op': 'load', **self._model_args})
+        self.names = {int(k): v for k, v in reply['names'].items()}
+        self.weights_path, self.imgsz = reply['weights_path'], reply['imgsz']
+
+    def _request(self, request):
+        with self._lock:
+            self._conn.send(request)
+            reply = self._conn.recv()
+        if 'error' in reply:
+            raise RuntimeError(f"Model service: {reply['error']}")
+        return reply
+
+    def _buffer(self, size):
+        if self._shm is None or self._shm.size < size:
+            self._finalizer.detach()
+            if self._shm is not None:
+                self._shm.close(); self._shm.unlink()
+            self._shm = shared_memory.SharedMemory(create=True, size=max(size, 2 * (self._shm.size if self._shm else 0)))
+            self._finalizer = weakref.finalize(self, _release, self._conn, self._shm)
+        return self._shm
+
+    def predict(self, source, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        layout, offset = [], 0
+        for frame in frames:
+            layout.append((offset, frame.shape, frame.dtype.str))
+            offset += frame.nbytes
+        with self._lock:  # the block is shared by every request of this client
+            shm = self._buffer(max(1, offset))
+            for frame, (start, shape, dtype) in zip(frames, layout):
+                np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=start)[...] = frame
+            self._conn.send({'op': 'predict', **self._model_args, 'shm': shm.name, 'frames': layout, 'kwargs': kwargs})
+            reply = self._conn.recv()
+        if 'error' in reply:
+            raise RuntimeError(f"Model service: {reply['error']}")
+        return [ServiceResult(*result) for result in reply['results']]
+
+
+if __name__ == "__main__":
+    sys.exit(serve_forever())
@@ -0,0 +1,77 @@
+# EthoGrid_App/core/motion_gate.py
+
+import cv2
+import numpy as np
+
+CARRIED_COLUMN = "carried"
+DEFAULT_THRESHOLD_PERCENT = 0.05  # Share of a region's pixels that must change before the model runs again
+
+
+class GatedResults(list):
+    """Model results, one per input image, with a `carried` flag (1 = copied from the region's previous inference)."""
+    def __init__(self, results, carried):
+        super().__init__(results)
+        self.carried = np.asarray(carried, dtype=np.int64)
+
+
+class MotionGate:
+    """
+    Skips inference for frames, or tank regions of a frame, in which nothing moved.
+
+    Each frame is downscaled to `scale_width` pixels wide and converted to grayscale. A region
+    counts as moving when more than `threshold_percent` of its pixels differ by more than
+    `pixel_delta` grey levels from the image the model last saw for that region; comparing
+    against the last inferred image (not the previous frame) keeps slow drift from going
+    unnoticed. Static regions reuse the region's last results, but never for more than
+    `max_carry` frames in a row so detections are refreshed periodically.
+    """
+    def __init__(self, frame_size, regions=None, threshold_percent=DEFAULT_THRESHOLD_PERCENT,
+                 pixel_delta=12, scale_width=320, max_carry=30):
+        w, h = frame_size
+        scale = min(1.0, scale_width / float(w)) if w else 1.0
+        self.scaled_size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        if regions is None: regions = [(0, 0, w, h)]
+        # Region boxes (x0, y0, x1, y1) in full-frame pixels, mapped onto the downscaled image
+        self.regions = [(int(x0 * scale), int(y0 * scale), max(int(x0 * scale) + 1, int(np.ceil(x1 * scale))),
+                         max(int(y0 * scale) + 1, int(np.ceil(y1 * scale)))) for x0, y0, x1, y1 in regions]
+        self.threshold = threshold_percent / 100.0
+        self.pixel_delta = pixel_delta
+        self.max_carry = max_carry
+        self._reference = [None] * len(self.regions)
+        self._carried_for = np.zeros(len(self.regions), dtype=np.int64)
+        self._last_results = [None] * len(self.regions)
+        self.inferred, self.skipped = 0, 0
+
+    def active_regions(self, frame):
+        """Returns one bool per region: True if the model has to run on it for this frame."""
+        small = cv2.cvtColor(cv2.resize(frame, self.scaled_size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        active = np.ones(len(self.regions), dtype=bool)
+        for r, (x0, y0, x1, y1) in enumerate(self.regions):
+            patch = small[y0:y1, x0:x1]
+            reference = self._reference[r]
+            if reference is not None and self._carried_for[r] < self.max_carry:
+                changed = np.count_nonzero(cv2.absdiff(patch, reference) > self.pixel_delta)
+                active[r] = changed > self.threshold * patch.size
+            if active[r]:
+                self._reference[r] = patch.copy()
+                self._carried_for[r] = 0
+            else:
+                self._carried_for[r] += 1
+        return active
+
+    def predict(self, frames, inputs, predict):
+        """
+        Runs `predict` (list of images -> list of results) only on the moving entries of `inputs`,
+        which hold one image per region of every frame in `frames`, frame by frame. Static entries
+        get their region's previous results. Returns a GatedResults aligned with `inputs`.
+        """
+        active = np.concatenate([self.active_regions(frame) for frame in frames])
+        run = np.flatnonzero(active)
+        predicted = iter(predict([inputs[i] for i in run]) if len(run) else [])
+        results = []
+        for i, is_active in enumerate(active.tolist()):
+            r = i % len(self.regions)
+            if is_active: self._last_results[r] = next(predicted)
+            results.append(self._last_results[r])
+        self.inferred += len(run); self.skipped += len(active) - len(run)
+        return GatedResults(results, ~active)
@@ -0,0 +1,115 @@
+# EthoGrid_App/core/multiprocess_inference.py
+
+import os
+import queue
+import threading
+import importlib
+import multiprocessing
+from core.stopwatch import Stopwatch
+from core.progress_reporter import merge_updates
+
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS", "ETHOGRID_DECODE_THREADS")
+_FORWARDED_SIGNALS = ("log_message", "overall_progress", "progress_updated", "error")
+
+
+def default_threads_per_process(num_processes):
+    return max(1, (os.cpu_count() or 1) // max(1, num_processes))
+
+def shard_videos(video_files, num_shards):
+    """Splits videos into `num_shards` lists of similar total size (largest file first onto the lightest shard)."""
+    def size(path):
+        try: return os.path.getsize(path)
+        except OSError: return 0
+    shards, loads = [[] for _ in range(num_shards)], [0] * num_shards
+    for path in sorted(video_files, key=size, reverse=True):
+        lightest = loads.index(min(loads))
+        shards[lightest].append(path); loads[lightest] += size(path)
+    return [s for s in shards if s]
+
+def apply_thread_budget(threads):
+    """Limits torch, OpenCV, BLAS and video decoder threads. In a child process this runs before torch is imported, so the env vars take effect too."""
+    for var in _THREAD_ENV_VARS: os.environ[var] = str(threads)
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+
+def _shard_main(shard_id, worker_module, worker_class, video_files, worker_kwargs, threads, events, stop_event):
+    """Entry point of a child process: runs an ordinary single-process worker on its shard and forwards its signals."""
+    apply_thread_budget(threads)
+    worker_cls = getattr(importlib.import_module(worker_module), worker_class)
+    worker = worker_cls(video_files, **worker_kwargs)
+    for name in _FORWARDED_SIGNALS:
+        getattr(worker, name).connect(lambda *args, name=name: events.put((shard_id, name, args)))
+
+    def watch_stop():
+        stop_event.wait()
+        worker.is_running = False
+    threading.Thread(target=watch_stop, daemon=True).start()
+    try:
+        worker.run()
+    except Exception as e:
+        events.put((shard_id, "error", (f"Worker process {shard_id + 1} crashed: {e}",)))
+    finally:
+        events.put((shard_id, "finished", ()))
+
+
+def run_sharded(worker, worker_kwargs, num_processes, threads_per_process=None):
+    """
+    Runs `worker`'s videos across `num_processes` child processes and merges their progress.
+
+    Each child builds its own instance of the worker's class (and so its own model) with
+    `worker_kwargs`, limited to `threads_per_process` torch/OpenCV threads. Signals from
+    the children are re-emitted on `worker`: log lines are prefixed with the process
+    number, and `progress_updated` reports the combined frames and summed throughput of
+    the videos in flight with the longest remaining time. Blocks until every child has exited.
+    """
+    threads = threads_per_process or default_threads_per_process(num_processes)
+    shards = shard_videos(worker.video_files, num_processes)
+    total_videos = len(worker.video_files)
+    worker.log_message.emit(f"Running {len(shards)} worker processes with {threads} CPU thread(s) each.")
+
+    ctx = multiprocessing.get_context("spawn")
+    events, stop_event = ctx.Queue(), ctx.Event()
+    worker_cls = type(worker)
+    processes = [ctx.Process(target=_shard_main, daemon=True, name=f"ethogrid-infer-{i + 1}",
+                             args=(i, worker_cls.__module__, worker_cls.__name__, shard, worker_kwargs, threads, events, stop_event))
+                 for i, shard in enumerate(shards)]
+    for p in processes: p.start()
+
+    stopwatch = Stopwatch(); stopwatch.start()
+    started_videos = 0
+    progress = {}
+    running = set(range(len(processes)))
+    while running:
+        if not worker.is_running: stop_event.set()
+        try:
+            shard_id, name, args = events.get(timeout=0.2)
+        except queue.Empty:
+            for i in list(running):
+                if processes[i].exitcode not in (None, 0):
+                    worker.log_message.emit(f"[ERROR] Worker process {i + 1} exited unexpectedly (code {processes[i].exitcode}).")
+                    running.discard(i)
+            continue
+
+        if name == "finished":
+            running.discard(shard_id); progress.pop(shard_id, None)
+        elif name == "log_message":
+            worker.log_message.emit("\n".join(f"[P{shard_id + 1}] {line}" if line else line for line in args[0].split("\n")))
+        elif name == "error":
+            worker.log_message.emit(f"[ERROR] [P{shard_id + 1}] {args[0]}")
+        elif name == "overall_progress":
+            started_videos += 1
+            worker.overall_progress.emit(started_videos, total_videos, args[2])
+        elif name == "progress_updated":
+            progress[shard_id] = args[0]
+            worker.progress_updated.emit(merge_updates(progress.values(), stopwatch.get_elapsed_time(as_float=True)))
+
+    for p in processes: p.join()
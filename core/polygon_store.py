@@ -0,0 +1,180 @@
+# EthoGrid_App/core/polygon_store.py
+
+import os
+import numpy as np
+
+POLYGON_COLUMN = "polygon"
+SIDECAR_SUFFIX = ".polygons.npz"
+_COUNTS_SUFFIX = ".counts.partial"
+_POINTS_SUFFIX = ".points.partial"
+
+
+def sidecar_path(csv_path):
+    """`video_segmentations.csv` -> `video_segmentations.polygons.npz`"""
+    return os.path.splitext(csv_path)[0] + SIDECAR_SUFFIX
+
+def parse_polygon_text(text):
+    """Parses the legacy 'x,y;x,y;...' CSV form into an (N, 2) int32 array (None if empty)."""
+    if not text: return None
+    return np.array(text.replace(';', ',').split(','), dtype=np.float64).reshape(-1, 2).astype(np.int32)
+
+def polygon_text(value):
+    """Formats a polygon (array or legacy string) as 'x,y;x,y;...' for spreadsheets and other text exports."""
+    if value is None or isinstance(value, str): return value or ""
+    if isinstance(value, float): return ""  # an empty cell read back as NaN
+    return ";".join(f"{x},{y}" for x, y in np.asarray(value).reshape(-1, 2).tolist())
+
+def _stored_polygon(index, store):
+    if store is None:
+        raise ValueError(f"Polygon cell refers to entry {index} of a {SIDECAR_SUFFIX} sidecar, but the CSV has none next to it.")
+    if not 0 <= index < len(store):
+        raise ValueError(f"Polygon cell refers to entry {index}, but the {SIDECAR_SUFFIX} sidecar only has {len(store)}.")
+    return store[index]
+
+def polygon_points(value, store=None):
+    """
+    Resolves a CSV polygon cell to an (N, 2) int32 array, or None for an empty cell. The cell can
+    be an index into the `store` sidecar (as text or as a number, since some readers convert every
+    cell to float), an 'x,y;...' string, or an already resolved array. An index that the sidecar
+    cannot resolve (missing sidecar, or one from another run) raises ValueError.
+    """
+    if value is None: return None
+    if isinstance(value, np.ndarray): return value if len(value) else None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        if value != value: return None  # NaN: empty cell
+        return _stored_polygon(int(value), store)
+    value = value.strip()
+    if not value: return None
+    if ',' not in value:
+        return _stored_polygon(int(float(value)), store)
+    return parse_polygon_text(value)
+
+def partial_exists(path):
+    """True if a streamed sidecar was left unfinished at `path` (see PolygonStoreWriter)."""
+    return os.path.exists(path + _COUNTS_SUFFIX) and os.path.exists(path + _POINTS_SUFFIX)
+
+def _save_npz(path, counts, points):
+    """Writes the sidecar atomically, with int16 coordinates whenever they fit."""
+    offsets = np.concatenate(([0], np.cumsum(counts, dtype=np.int64)))
+    points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+    if not len(points) or (points.min() >= np.iinfo(np.int16).min and points.max() <= np.iinfo(np.int16).max):
+        points = points.astype(np.int16)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, offsets=offsets, points=points)
+    os.replace(tmp_path, path)
+
+def _as_points(polygon):
+    return np.asarray(polygon, dtype=np.int32).reshape(-1, 2)
+
+def write_polygon_sidecar(csv_path, polygons):
+    """
+    Stores the polygons of a CSV that is written in one go in its sidecar. Returns one CSV cell
+    per polygon: its index in the sidecar, or '' for missing/empty polygons. A stale sidecar is
+    removed when there is nothing to store.
+    """
+    path = sidecar_path(csv_path)
+    cells, counts, chunks = [], [], []
+    for polygon in polygons:
+        points = polygon_points(polygon)
+        if points is None:
+            cells.append("")
+            continue
+        cells.append(str(len(counts)))
+        counts.append(len(points)); chunks.append(_as_points(points))
+    if counts:
+        _save_npz(path, np.array(counts, dtype=np.int64), np.concatenate(chunks))
+    elif os.path.exists(path):
+        os.remove(path)
+    return cells
+
+def polygon_cells(csv_path, polygons, sidecar=False):
+    """
+    The CSV cells of `polygons` for a CSV written in one go: 'x,y;...' text, or with `sidecar`
+    indices into its `.polygons.npz` (see write_polygon_sidecar). Writing text removes a stale
+    sidecar left next to `csv_path` by an earlier run.
+    """
+    if sidecar: return write_polygon_sidecar(csv_path, polygons)
+    path = sidecar_path(csv_path)
+    if os.path.exists(path): os.remove(path)
+    return [polygon_text(p) for p in polygons]
+
+
+class PolygonStore:
+    """
+    Read side of a polygon sidecar: all outlines of a CSV as one coordinate array with per-entry
+    offsets, so a polygon is a slice instead of a string to parse on every frame.
+    """
+    def __init__(self, offsets, points):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.points = np.asarray(points, dtype=np.int32).reshape(-1, 2)  # cv2 drawing wants int32
+
+    @classmethod
+    def load(cls, csv_path):
+        """Returns the store next to `csv_path`, or None if the CSV has no sidecar."""
+        path = sidecar_path(csv_path)
+        if not os.path.exists(path): return None
+        with np.load(path) as data:
+            return cls(data['offsets'], data['points'])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.points[self.offsets[index]:self.offsets[index + 1]]
+
+
+class PolygonStoreWriter:
+    """
+    Streams polygons into a sidecar while the CSV referencing them is being written.
+
+    Point counts and coordinates are appended to two raw partial files; `checkpoint()` syncs
+    them and returns their lengths so a resumed run can truncate back to the same state, and
+    `close()` packs them into the final `.polygons.npz`.
+    """
+    def __init__(self, path, resume_entries=None, resume_points=0):
+        self.path = path
+        self.counts_path, self.points_path = path + _COUNTS_SUFFIX, path + _POINTS_SUFFIX
+        if resume_entries is not None:
+            self._counts, self._points = open(self.counts_path, 'r+b'), open(self.points_path, 'r+b')
+            self._counts.truncate(resume_entries * 4); self._counts.seek(resume_entries * 4)
+            self._points.truncate(resume_points * 8); self._points.seek(resume_points * 8)
+            self.entries, self.point_count = resume_entries, resume_points
+        else:
+            self._counts, self._points = open(self.counts_path, 'wb'), open(self.points_path, 'wb')
+            self.entries, self.point_count = 0, 0
+
+    def add(self, polygons):
+        """Appends polygons (arrays or None) and returns the CSV cell of each, as `write_polygon_sidecar` does."""
+        cells, counts, chunks = [], [], []
+        for polygon in polygons:
+            if polygon is None or not len(polygon):
+                cells.append("")
+                continue
+            cells.append(str(self.entries + len(counts)))
+            counts.append(len(polygon)); chunks.append(_as_points(polygon))
+        if counts:
+            self._counts.write(np.asarray(counts, dtype=np.int32).tobytes())
+            points = np.concatenate(chunks)
+            self._points.write(points.tobytes())
+            self.entries += len(counts); self.point_count += len(points)
+        return cells
+
+    def checkpoint(self):
+        """Forces everything written so far onto disk and returns (entries, points)."""
+        for f in (self._counts, self._points):
+            f.flush(); os.fsync(f.fileno())
+        return self.entries, self.point_count
+
+    def close(self):
+        """Packs the partial files into the final sidecar and removes them."""
+        if self._counts.closed: return
+        self._counts.close(); self._points.close()
+        counts = np.fromfile(self.counts_path, dtype=np.int32)
+        points = np.fromfile(self.points_path, dtype=np.int32)
+        _save_npz(self.path, counts, points)
+        os.remove(self.counts_path); os.remove(self.points_path)
+
+    def abort(self):
+        """Closes the partial files without publishing them, so a later run can resume."""
+        if self._counts.closed: return
+        self._counts.close(); self._points.close()
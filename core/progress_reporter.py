@@ -0,0 +1,98 @@
+# EthoGrid_App/core/progress_reporter.py
+
+import math
+import time
+from collections import namedtuple
+from core.stopwatch import Stopwatch
+
+DEFAULT_RATE_HZ = 4.0        # progress updates per second that reach the GUI
+DEFAULT_SMOOTHING_S = 3.0    # time constant of the throughput average
+
+_ProgressFields = namedtuple("ProgressUpdate", "done total percent fps elapsed remaining")
+
+
+class ProgressUpdate(_ProgressFields):
+    """
+    One immutable progress snapshot of the current file: frames `done` of `total`, `percent`,
+    smoothed throughput `fps`, `elapsed` seconds and estimated `remaining` seconds (None while
+    there is no estimate yet). Being a tuple it can be queued to the GUI thread safely.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def empty(cls):
+        return cls(0, 0, 0, 0.0, 0.0, None)
+
+    @property
+    def elapsed_text(self):
+        return Stopwatch.format_time(self.elapsed)
+
+    @property
+    def remaining_text(self):
+        return "--:--:--" if self.remaining is None else Stopwatch.format_time(self.remaining)
+
+
+def merge_updates(updates, elapsed):
+    """Combines the updates of files processed side by side (e.g. by worker processes) into one."""
+    updates = list(updates)
+    if not updates: return ProgressUpdate(0, 0, 0, 0.0, elapsed, None)
+    done, total = sum(u.done for u in updates), sum(u.total for u in updates)
+    remaining = None if any(u.remaining is None for u in updates) else max(u.remaining for u in updates)
+    return ProgressUpdate(done, total, int(done * 100 / total) if total else 0, sum(u.fps for u in updates), elapsed, remaining)
+
+
+class ProgressReporter:
+    """
+    Coalesces per-frame progress into at most `rate_hz` ProgressUpdate payloads per second.
+
+    `update(done)` may be called for every frame or batch: between emissions it only compares
+    the clock. The throughput is an exponentially weighted moving average with a time constant
+    of `smoothing_s` seconds, so the speed and ETA stay steady across bursty batches. `emit` is
+    typically a worker signal's `emit`; across threads Qt queues it, so the worker never waits
+    for the GUI, and the rate limit keeps the GUI's event queue short.
+    """
+    def __init__(self, emit, rate_hz=DEFAULT_RATE_HZ, smoothing_s=DEFAULT_SMOOTHING_S, clock=time.monotonic):
+        self._emit = emit
+        self.interval = 1.0 / rate_hz if rate_hz > 0 else 0.0
+        self.smoothing_s = smoothing_s
+        self._clock = clock
+        self.reset()
+
+    def reset(self):
+        """Clears the state and shows an empty progress, e.g. while the next file is opened."""
+        self.total, self.rate = 0, None
+        self._started = self._last_time = self._clock()
+        self._last_done = self._done = 0
+        self._next_emit = 0.0
+        self._emit(ProgressUpdate.empty())
+
+    def start(self, total, done=0):
+        """Starts timing a file of `total` frames, `done` of which are already processed (e.g. resumed)."""
+        self.total, self.rate = max(0, int(total)), None
+        self._started = self._last_time = self._clock()
+        self._last_done = self._done = done
+        self._next_emit = 0.0
+        self.update(done, force=True)
+
+    def update(self, done, force=False):
+        """Records progress; emits an update only if the interval has passed (or `force`). Returns True if it emitted."""
+        self._done = done
+        now = self._clock()
+        if not force and now < self._next_emit: return False
+        dt = now - self._last_time
+        if dt > 0:
+            instant = (done - self._last_done) / dt
+            weight = 1.0 - math.exp(-dt / self.smoothing_s) if self.smoothing_s > 0 else 1.0
+            self.rate = instant if self.rate is None else self.rate + weight * (instant - self.rate)
+            self._last_time, self._last_done = now, done
+        remaining = None
+        if self.rate and self.total:
+            remaining = max(0, self.total - done) / self.rate
+        percent = min(100, int(done * 100 / self.total)) if self.total else 0
+        self._emit(ProgressUpdate(done, self.total, percent, self.rate or 0.0, now - self._started, remaining))
+        self._next_emit = now + self.interval
+        return True
+
+    def finish(self):
+        """Emits the final state of the file regardless of the rate limit."""
+        self.update(self._done, force=True)
@@ -0,0 +1,136 @@
+# EthoGrid_App/core/result_extraction.py
+
+import numpy as np
+
+BOX_INSET_RATIO = 0.05  # Boxes are shrunk by 5% on each side before centroids are computed
+DETECTION_CSV_HEADER = ["frame_idx", "class_name", "conf", "x1", "y1", "x2", "y2", "cx", "cy"]
+TANK_COLUMN = "tank_number"
+_CSV_VALUE_COLUMNS = ("class_name", "conf", "x1", "y1", "x2", "y2", "cx", "cy")
+
+
+def _stack_box_data(results_list):
+    """Concatenates every result's (N, 6) box tensor and converts to NumPy in a single transfer."""
+    tensors = [res.boxes.data for res in results_list if res.boxes is not None and len(res.boxes)]
+    if not tensors:
+        return np.zeros((0, 6), dtype=np.float32)
+    if hasattr(tensors[0], 'cpu'):
+        import torch
+        return torch.cat(tensors).cpu().numpy()
+    return np.concatenate([np.asarray(t) for t in tensors])
+
+def mask_centroids(masks):
+    """
+    Area-weighted centroids of instance masks, computed from the mask rasters for all masks at
+    once and mapped to original image pixels. `masks` is an Ultralytics Masks object, or any
+    object carrying precomputed `centroids`. Returns (cx, cy, area); area is 0 (and the centroid
+    undefined) for empty masks.
+
+    Every mask pixel counts once, so a mask in several parts gets the area-weighted mean of its
+    parts' centroids. The shoelace formula cannot be used on `masks.xy` for this: Ultralytics
+    joins the parts of such a mask into one outline, and the joins (and parts it reverses) would
+    add or subtract area.
+    """
+    if getattr(masks, 'centroids', None) is not None: return masks.centroids
+    data = masks.data
+    n, h, w = data.shape
+    if hasattr(data, 'cpu'):
+        import torch
+        data = data.float()
+        sums = torch.stack((data.sum(dim=(1, 2)), data.sum(dim=1) @ torch.arange(w, dtype=data.dtype, device=data.device),
+                            data.sum(dim=2) @ torch.arange(h, dtype=data.dtype, device=data.device)))
+        area, sum_x, sum_y = sums.cpu().numpy().astype(np.float64)
+    else:
+        data = np.asarray(data, dtype=np.float64)
+        area, sum_x, sum_y = data.sum(axis=(1, 2)), data.sum(axis=1) @ np.arange(w), data.sum(axis=2) @ np.arange(h)
+    has_area = area > 0
+    safe_area = np.where(has_area, area, 1.0)
+    # Undo the letterbox like Ultralytics' scale_coords does for masks.xy
+    oh, ow = masks.orig_shape[:2]
+    gain = min(h / oh, w / ow)
+    pad_x, pad_y = round((w - ow * gain) / 2 - 0.1), round((h - oh * gain) / 2 - 0.1)
+    cx = np.where(has_area, np.clip((sum_x / safe_area - pad_x) / gain, 0, ow), 0.0)
+    cy = np.where(has_area, np.clip((sum_y / safe_area - pad_y) / gain, 0, oh), 0.0)
+    return cx, cy, area / gain ** 2
+
+def outline_pixels(points, dx=0, dy=0):
+    """Rounds an outline, shifted by (dx, dy), to the (N, 2) int32 pixel polygon stored for a detection."""
+    return np.rint(np.asarray(points, dtype=np.float64).reshape(-1, 2) + (dx, dy)).astype(np.int32)
+
+def _class_name_lookup(class_names, class_ids):
+    """Builds an object array indexed by class id, with 'Unknown' for ids missing from the model."""
+    size = max([int(k) for k in class_names.keys()] + [int(class_ids.max()) if class_ids.size else 0]) + 1
+    lookup = np.full(size, "Unknown", dtype=object)
+    for class_id, name in class_names.items(): lookup[int(class_id)] = name
+    return lookup[class_ids]
+
+def format_csv_rows(frame_idx, columns, extra_columns=()):
+    """
+    Formats detection columns (see `DetectionArrays.columns`) as CSV rows of strings in one
+    pass, with the 4-decimal layout of DETECTION_CSV_HEADER. Extra columns are appended as-is.
+    """
+    if not len(frame_idx): return []
+    formatted = [np.asarray(frame_idx).astype(str), np.asarray(columns["class_name"]).astype(str)]
+    formatted += [np.char.mod("%.4f", columns[name]) for name in _CSV_VALUE_COLUMNS[1:]]
+    formatted += [np.asarray(values, dtype=object) for values in extra_columns]
+    return np.column_stack(formatted).astype(object).tolist()
+
+
+class DetectionArrays:
+    """
+    Column-oriented view of all detections in a batch of YOLO results.
+
+    Every attribute is a NumPy array with one entry per detection, ordered by frame
+    and then by the model's own ordering, so `frame_range(k)` gives the detections
+    of the k-th frame in the batch, in the same order as that frame's `results.masks`.
+    """
+    def __init__(self, results_list, frame_indices, class_names):
+        data = _stack_box_data(results_list)
+        counts = [len(res.boxes) if res.boxes is not None else 0 for res in results_list]
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.frame_idx = np.repeat(np.asarray(frame_indices, dtype=np.int64), counts)
+
+        xyxy = data[:, :4].astype(np.float64)
+        inset = (xyxy[:, 2:4] - xyxy[:, 0:2]) * BOX_INSET_RATIO
+        self.x1, self.y1 = xyxy[:, 0] + inset[:, 0], xyxy[:, 1] + inset[:, 1]
+        self.x2, self.y2 = xyxy[:, 2] - inset[:, 0], xyxy[:, 3] - inset[:, 1]
+        self.cx, self.cy = (self.x1 + self.x2) / 2.0, (self.y1 + self.y2) / 2.0
+        self.conf = data[:, -2].astype(np.float64)
+        self.class_id = data[:, -1].astype(np.int64)
+        self.class_name = _class_name_lookup(class_names, self.class_id)
+
+    def __len__(self):
+        return len(self.frame_idx)
+
+    def frame_range(self, k):
+        return range(int(self.offsets[k]), int(self.offsets[k + 1]))
+
+    def translate(self, dx, dy):
+        """Shifts all coordinates by per-result offsets (one dx/dy per entry of the results list, e.g. crop origins)."""
+        counts = np.diff(self.offsets)
+        dx, dy = np.repeat(np.asarray(dx, dtype=np.float64), counts), np.repeat(np.asarray(dy, dtype=np.float64), counts)
+        self.x1, self.x2, self.cx = self.x1 + dx, self.x2 + dx, self.cx + dx
+        self.y1, self.y2, self.cy = self.y1 + dy, self.y2 + dy, self.cy + dy
+
+    def add_result_column(self, name, values):
+        """Attaches a per-detection attribute from one value per entry of the results list (e.g. the tank of each crop)."""
+        setattr(self, name, np.repeat(np.asarray(values), np.diff(self.offsets)))
+
+    def filtered(self, keep, results_per_frame=1):
+        """
+        Returns a copy with only the detections where `keep` is True. Every `results_per_frame`
+        consecutive results are merged into one entry, so `frame_range(k)` then covers frame k.
+        """
+        out = object.__new__(DetectionArrays)
+        for name, values in vars(self).items():
+            if name != "offsets": setattr(out, name, values[keep])
+        kept_before = np.concatenate(([0], np.cumsum(keep))).astype(np.int64)
+        out.offsets = kept_before[self.offsets[::results_per_frame]]
+        return out
+
+    def columns(self, index=slice(None)):
+        """Returns the per-detection columns (as used by `format_csv_rows`) for a subset of detections."""
+        return {name: getattr(self, name)[index] for name in _CSV_VALUE_COLUMNS}
+
+    def csv_rows(self, extra_columns=()):
+        """Formats all detections as CSV rows; see `format_csv_rows`."""
+        return format_csv_rows(self.frame_idx, self.columns(), extra_columns)
@@ -0,0 +1,97 @@
+# EthoGrid_App/core/stage_timer.py
+
+import time
+import threading
+
+STAGE_DECODE, STAGE_PREDICT, STAGE_POSTPROCESS, STAGE_DRAW, STAGE_ENCODE = "decode", "predict", "postprocess", "draw", "encode"
+STAGES = (STAGE_DECODE, STAGE_PREDICT, STAGE_POSTPROCESS, STAGE_DRAW, STAGE_ENCODE)
+
+
+class _Measurement:
+    __slots__ = ("timer", "stage", "start")
+
+    def __init__(self, timer, stage):
+        self.timer, self.stage = timer, stage
+
+    def __enter__(self):
+        self.timer._stack().append(0.0)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.timer._stack()
+        nested = stack.pop()
+        if stack: stack[-1] += elapsed
+        self.timer.add(self.stage, elapsed - nested)
+        return False
+
+
+class StageTimer:
+    """
+    Accumulates the wall time a worker spends per processing stage, e.g. `with timer.measure("draw"):`.
+
+    Times are exclusive: a stage measured inside another (like encoding a frame inside the drawing
+    loop) is subtracted from the outer one, so the stages add up to the time actually spent. Stages
+    may run on different threads (see InferencePipeline); each thread keeps its own nesting.
+    """
+    def __init__(self):
+        self.totals, self.calls = {}, {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None: stack = self._local.stack = []
+        return stack
+
+    def measure(self, stage):
+        return _Measurement(self, stage)
+
+    def timed(self, stage, func):
+        """Wraps `func` so that every call is measured as `stage`."""
+        def wrapper(*args, **kwargs):
+            with _Measurement(self, stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def add(self, stage, seconds, calls=1):
+        with self._lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear(); self.calls.clear()
+
+    def summary(self, frames=None):
+        """{stage: {"seconds", "calls"[, "ms_per_frame"]}} in STAGES order, then any other stage."""
+        with self._lock: totals, calls = dict(self.totals), dict(self.calls)
+        result = {}
+        for stage in [s for s in STAGES if s in totals] + sorted(s for s in totals if s not in STAGES):
+            entry = {"seconds": round(totals[stage], 6), "calls": calls[stage]}
+            if frames: entry["ms_per_frame"] = round(1000.0 * totals[stage] / frames, 4)
+            result[stage] = entry
+        return result
+
+
+class _NullMeasurement:
+    __slots__ = ()
+    def __enter__(self): pass
+    def __exit__(self, *exc): return False
+
+
+class NullStageTimer:
+    """Stand-in used when nobody asked for timings; measuring costs one method call."""
+    _measurement = _NullMeasurement()
+
+    def measure(self, stage):
+        return self._measurement
+
+    def timed(self, stage, func):
+        return func
+
+    def add(self, stage, seconds, calls=1):
+        pass
+
+
+NULL_STAGE_TIMER = NullStageTimer()
@@ -0,0 +1,82 @@
+# EthoGrid_App/core/streaming_csv.py
+
+import os
+import csv
+import time
+
+PARTIAL_SUFFIX = ".partial"
+
+
+class StreamingCsvWriter:
+    """
+    Writes CSV rows to disk as they are produced instead of collecting them in memory.
+
+    Rows go to `<path>.partial` and are flushed to the OS every `flush_rows` rows or
+    `flush_seconds` seconds, whichever comes first, so memory stays flat and a crash
+    only loses the last unflushed chunk. `close()` renames the file to its final name
+    in one atomic step; `abort()` leaves the partial file in place for inspection.
+
+    Passing `resume_offset` reopens an existing partial file, truncates it to that byte
+    offset (as returned by `checkpoint()`) and appends after it instead of starting over.
+    """
+    def __init__(self, path, header, flush_rows=50000, flush_seconds=5.0, resume_offset=None, resume_rows=0):
+        self.path = path
+        self.partial_path = path + PARTIAL_SUFFIX
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.rows_written = resume_rows if resume_offset is not None else 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        if resume_offset is not None:
+            self._file = open(self.partial_path, 'r+', newline='', buffering=1 << 20)
+            self._file.truncate(resume_offset)
+            self._file.seek(resume_offset)
+            self._writer = csv.writer(self._file)
+        else:
+            self._file = open(self.partial_path, 'w', newline='', buffering=1 << 20)
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(header)
+
+    def write_rows(self, rows):
+        """Writes an iterable of rows; nothing is retained after the call returns."""
+        count = 0
+        for row in rows:
+            self._writer.writerow(row)
+            count += 1
+        self.rows_written += count
+        self._pending += count
+        if self._pending >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def checkpoint(self):
+        """Forces everything written so far onto disk and returns the byte offset it ends at."""
+        self.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        """Flushes everything to disk and atomically moves the partial file to its final name."""
+        if self._file.closed: return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.partial_path, self.path)
+
+    def abort(self):
+        """Closes the file without publishing it; rows written so far stay in `partial_path`."""
+        if self._file.closed: return
+        self._file.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None: self.close()
+        else: self.abort()
+        return False
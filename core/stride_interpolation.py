@@ -0,0 +1,121 @@
+# EthoGrid_App/core/stride_interpolation.py
+
+import numpy as np
+from core.result_extraction import format_csv_rows
+from core.polygon_store import polygon_text
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+INTERPOLATED_COLUMN = "interpolated"
+_COORD_COLUMNS = ("conf", "x1", "y1", "x2", "y2", "cx", "cy")
+
+
+def match_detections(a, b):
+    """
+    Pairs detections of two keyframes by centroid distance (optimal assignment when SciPy is
+    available, greedy otherwise). A pair is only kept if the centroid moved less than the
+    diagonal of its box in the first keyframe, so unrelated animals are never blended.
+    Returns two index arrays (into `a` and into `b`).
+    """
+    if not len(a["cx"]) or not len(b["cx"]):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    dist = np.hypot(a["cx"][:, None] - b["cx"][None, :], a["cy"][:, None] - b["cy"][None, :])
+    gate = np.hypot(a["x2"] - a["x1"], a["y2"] - a["y1"])[:, None]
+    cost = np.where(dist <= gate, dist, 1e9)
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(cost)
+    else:
+        rows, cols, used_a, used_b = [], [], set(), set()
+        for flat in np.argsort(cost, axis=None):
+            i, j = divmod(int(flat), cost.shape[1])
+            if i in used_a or j in used_b: continue
+            rows.append(i); cols.append(j); used_a.add(i); used_b.add(j)
+        rows, cols = np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+    keep = cost[rows, cols] < 1e9
+    return np.asarray(rows)[keep], np.asarray(cols)[keep]
+
+def _shift_polygon(polygon, dx, dy):
+    if polygon is None or not len(polygon): return polygon
+    return np.rint(polygon + (dx, dy)).astype(np.int32)
+
+def _polygon_text_cells(polygons):
+    return [polygon_text(p) for p in polygons]
+
+
+class StrideInterpolator:
+    """
+    Fills the frames skipped by stride inference with interpolated detections.
+
+    Keyframes are pushed in order as dicts of detection columns. Each keyframe is held
+    back until the next one arrives; then its own rows (flag 0) and the linearly
+    interpolated rows of every frame in between (flag 1) are released together, so
+    the CSV stays in frame order and everything released is final. Interpolated
+    polygons are the nearer keyframe's polygon translated to the interpolated centroid.
+    Label columns (e.g. the tank number) are written between the detection columns and the
+    polygon and, like the class name, taken from the nearer keyframe.
+
+    Polygons are (N, 2) point arrays; `polygon_cells` turns the polygons of released rows into
+    CSV cells (e.g. `ResumableOutputs.store_polygons`) and defaults to 'x,y;...' text.
+    """
+    def __init__(self, label_columns=(), polygon_cells=_polygon_text_cells):
+        self.label_columns = tuple(label_columns)
+        self.polygon_cells = polygon_cells
+        self._pending = None  # (frame_idx, columns, polygons, payload)
+
+    @property
+    def pending_frame(self):
+        """Index of the keyframe that has been processed but not released yet (None if there is none)."""
+        return self._pending[0] if self._pending else None
+
+    def _keyframe_rows(self):
+        frame_idx, columns, polygons, _ = self._pending
+        count = len(columns["cx"])
+        extra = [np.asarray(columns[name]).astype(str) for name in self.label_columns]
+        extra += ([self.polygon_cells(polygons)] if polygons is not None else []) + [np.zeros(count, dtype=np.int64).astype(str)]
+        return format_csv_rows(np.full(count, frame_idx, dtype=np.int64), columns, extra)
+
+    def _interpolated_rows(self, frame_b, b, polygons_b):
+        frame_a, a, polygons_a, _ = self._pending
+        ia, ib = match_detections(a, b)
+        gap = frame_b - frame_a
+        if gap < 2 or not len(ia): return []
+        steps = np.arange(1, gap)
+        t = np.repeat(steps / gap, len(ia))
+        ia_rep, ib_rep = np.tile(ia, len(steps)), np.tile(ib, len(steps))
+        columns = {}
+        for name in _COORD_COLUMNS:
+            columns[name] = a[name][ia_rep] + (b[name][ib_rep] - a[name][ia_rep]) * t
+        use_b = t >= 0.5
+        columns["class_name"] = np.where(use_b, b["class_name"][ib_rep], a["class_name"][ia_rep])
+        extra = [np.where(use_b, b[name][ib_rep], a[name][ia_rep]).astype(str) for name in self.label_columns]
+        if polygons_a is not None:
+            shifted = []
+            for k in range(len(t)):
+                src, src_idx = (b, ib_rep[k]) if use_b[k] else (a, ia_rep[k])
+                polygon = (polygons_b if use_b[k] else polygons_a)[src_idx]
+                shifted.append(_shift_polygon(polygon, columns["cx"][k] - src["cx"][src_idx], columns["cy"][k] - src["cy"][src_idx]))
+            extra.append(self.polygon_cells(shifted))
+        extra.append(np.ones(len(t), dtype=np.int64).astype(str))
+        return format_csv_rows(frame_a + np.repeat(steps, len(ia)), columns, extra)
+
+    def push(self, frame_idx, columns, polygons=None, payload=None):
+        """
+        Adds a keyframe. Returns (rows, payload) for the previous keyframe and the frames up to
+        this one, or ([], None) for the very first keyframe.
+        """
+        released = ([], None)
+        if self._pending is not None:
+            rows = self._keyframe_rows() + self._interpolated_rows(frame_idx, columns, polygons)
+            released = (rows, self._pending[3])
+        self._pending = (frame_idx, columns, polygons, payload)
+        return released
+
+    def flush(self):
+        """Releases the last keyframe at the end of the video. Returns (rows, payload)."""
+        if self._pending is None: return [], None
+        released = (self._keyframe_rows(), self._pending[3])
+        self._pending = None
+        return released
@@ -0,0 +1,93 @@
+# EthoGrid_App/core/tank_assignment.py
+
+import math
+import numpy as np
+
+NO_TANK = 0  # tank number of points outside the grid (tanks are numbered from 1)
+
+
+def _rotation(angle):
+    """cos/sin of `angle` degrees; quarter turns are exact, as in QTransform.rotate."""
+    quarter = {0: (1.0, 0.0), 90: (0.0, 1.0), 180: (-1.0, 0.0), 270: (0.0, -1.0)}
+    if float(angle).is_integer() and int(angle) % 90 == 0: return quarter[int(angle) % 360]
+    a = math.radians(angle)
+    return math.cos(a), math.sin(a)
+
+def grid_matrix(center_x, center_y, angle, scale_x, scale_y, video_w, video_h):
+    """
+    3x3 matrix (for column vectors) of the grid transform, composed like
+    GridManager._update_transform_matrix: translate to the centre, rotate, scale, and move the
+    grid's own centre to the origin. Maps untransformed grid coordinates to video pixels.
+    """
+    cos, sin = _rotation(angle)
+    to_origin = np.array([[1.0, 0.0, -video_w / 2.0], [0.0, 1.0, -video_h / 2.0], [0.0, 0.0, 1.0]])
+    scale = np.diag([scale_x, scale_y, 1.0])
+    rotate = np.array([[cos, -sin, 0.0], [sin, cos, 0.0], [0.0, 0.0, 1.0]])
+    to_center = np.array([[1.0, 0.0, center_x * video_w], [0.0, 1.0, center_y * video_h], [0.0, 0.0, 1.0]])
+    return to_center @ rotate @ scale @ to_origin
+
+def transform_matrix(transform):
+    """The NumPy 3x3 matrix (for column vectors) of a QTransform."""
+    return np.array([[transform.m11(), transform.m21(), transform.m31()],
+                     [transform.m12(), transform.m22(), transform.m32()],
+                     [transform.m13(), transform.m23(), transform.m33()]], dtype=np.float64)
+
+def settings_matrix(transform_settings, video_w, video_h):
+    """grid_matrix of the 'grid_transform' block of a settings JSON."""
+    return grid_matrix(transform_settings['center_x'], transform_settings['center_y'], transform_settings['angle'],
+                       transform_settings['scale_x'], transform_settings['scale_y'], video_w, video_h)
+
+
+class TankGrid:
+    """
+    Assigns points to the tanks of a rows x cols grid placed on the video by a grid matrix.
+
+    The inverse matrix is computed once; `assign` maps all centroids back into the
+    untransformed grid in one matrix product and bins them into columns and rows, so
+    reassigning every detection after a grid change is a handful of array operations.
+    """
+    def __init__(self, matrix, video_size, cols, rows):
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        if abs(np.linalg.det(self.matrix)) < 1e-12:
+            raise ValueError("Grid transform is not invertible.")
+        self.inverse = np.linalg.inv(self.matrix)
+        self.video_size = (float(video_size[0]), float(video_size[1]))
+        self.cols, self.rows = int(cols), int(rows)
+
+    @classmethod
+    def from_settings(cls, grid_settings, transform_settings, video_size):
+        return cls(settings_matrix(transform_settings, *video_size), video_size, grid_settings['cols'], grid_settings['rows'])
+
+    def __len__(self):
+        return self.cols * self.rows
+
+    def cell_outlines(self):
+        """{tank: (4, 2) corners of its cell in video pixels}, in grid order."""
+        w, h = self.video_size
+        outlines = {}
+        for r in range(self.rows):
+            for c in range(self.cols):
+                corners = np.array([(c, r, 1.0), (c + 1, r, 1.0), (c + 1, r + 1, 1.0), (c, r + 1, 1.0)]) * (w / self.cols, h / self.rows, 1.0)
+                outlines[r * self.cols + c + 1] = (corners @ self.matrix.T)[:, :2]
+        return outlines
+
+    def to_grid(self, x, y):
+        """Maps video pixel coordinates back into untransformed grid coordinates."""
+        m = self.inverse
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        return m[0, 0] * x + m[0, 1] * y + m[0, 2], m[1, 0] * x + m[1, 1] * y + m[1, 2]
+
+    def assign(self, x, y):
+        """Tank numbers (int64) of the points (x, y); NO_TANK for points outside the grid or NaN."""
+        w, h = self.video_size
+        tx, ty = self.to_grid(x, y)
+        inside = (tx >= 0) & (tx < w) & (ty >= 0) & (ty < h)
+        with np.errstate(invalid='ignore'):
+            col = np.clip(np.floor(np.where(inside, tx, 0.0) / (w / self.cols)), 0, self.cols - 1).astype(np.int64)
+            row = np.clip(np.floor(np.where(inside, ty, 0.0) / (h / self.rows)), 0, self.rows - 1).astype(np.int64)
+        return np.where(inside, row * self.cols + col + 1, NO_TANK)
+
+    def tank_for_point(self, x, y):
+        """Tank number of a single point, or None outside the grid."""
+        tank = int(self.assign(x, y))
+        return tank if tank != NO_TANK else None
@@ -0,0 +1,92 @@
+# EthoGrid_App/core/tank_crops.py
+
+import json
+import numpy as np
+from PyQt5.QtCore import QPointF
+from PyQt5.QtGui import QTransform
+from core.result_extraction import DetectionArrays, TANK_COLUMN
+from core.tank_assignment import TankGrid, settings_matrix
+
+
+def grid_transform_from_settings(transform_settings, video_w, video_h):
+    """Builds the grid QTransform described by the 'grid_transform' block of a settings JSON."""
+    transform = QTransform()
+    transform.translate(video_w * transform_settings['center_x'], video_h * transform_settings['center_y'])
+    transform.rotate(transform_settings['angle'])
+    transform.scale(transform_settings['scale_x'], transform_settings['scale_y'])
+    transform.translate(-video_w / 2, -video_h / 2)
+    return transform
+
+
+class TankCropLayout:
+    """
+    Cuts every tank of a grid settings file out of a frame so each one reaches the model at
+    (close to) native resolution instead of as a few pixels of a letterboxed full frame.
+
+    A crop is the axis-aligned bounding box of the tank's (possibly rotated) grid cell, padded
+    by `padding_ratio` and clipped to the frame. Detections are mapped back to full-frame
+    coordinates and kept only if their centroid falls inside the crop's own tank, so an animal
+    visible in a neighbour's padding is not reported twice.
+    """
+    def __init__(self, grid_settings, transform_settings, video_size, padding_ratio=0.05):
+        w, h = video_size
+        self.cols, self.rows = int(grid_settings['cols']), int(grid_settings['rows'])
+        self.video_size = (w, h)
+        transform = grid_transform_from_settings(transform_settings, w, h)
+        self.grid = TankGrid(settings_matrix(transform_settings, w, h), (w, h), self.cols, self.rows)
+
+        self.boxes = []  # (tank_number, x0, y0, x1, y1)
+        for r in range(self.rows):
+            for c in range(self.cols):
+                corners = [transform.map(QPointF(x * w / self.cols, y * h / self.rows)) for x, y in ((c, r), (c + 1, r), (c + 1, r + 1), (c, r + 1))]
+                xs, ys = [p.x() for p in corners], [p.y() for p in corners]
+                pad_x, pad_y = (max(xs) - min(xs)) * padding_ratio, (max(ys) - min(ys)) * padding_ratio
+                x0, y0 = max(0, int(np.floor(min(xs) - pad_x))), max(0, int(np.floor(min(ys) - pad_y)))
+                x1, y1 = min(w, int(np.ceil(max(xs) + pad_x))), min(h, int(np.ceil(max(ys) + pad_y)))
+                if x1 - x0 >= 2 and y1 - y0 >= 2:  # tanks moved entirely off-frame are skipped
+                    self.boxes.append((r * self.cols + c + 1, x0, y0, x1, y1))
+        self.tank_numbers = np.array([b[0] for b in self.boxes], dtype=np.int64)
+        self.x0 = np.array([b[1] for b in self.boxes], dtype=np.float64)
+        self.y0 = np.array([b[2] for b in self.boxes], dtype=np.float64)
+
+    @classmethod
+    def from_settings_file(cls, settings_file, video_size, padding_ratio=0.05):
+        with open(settings_file, 'r') as f: settings_data = json.load(f)
+        return cls(settings_data['grid_settings'], settings_data['grid_transform'], video_size, padding_ratio)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @property
+    def crop_size(self):
+        """Largest crop (width, height); used as the resolution key for batch-size tuning."""
+        return (max((b[3] - b[1] for b in self.boxes), default=0), max((b[4] - b[2] for b in self.boxes), default=0))
+
+    def crops(self, frames):
+        """All tank crops of `frames`, frame by frame in tank order (views, no copies)."""
+        return [frame[y0:y1, x0:x1] for frame in frames for _, x0, y0, x1, y1 in self.boxes]
+
+    def tank_for_point(self, x, y):
+        return self.grid.tank_for_point(x, y)
+
+    def crop_detections(self, results_list, frame_indices, class_names, result_columns=None):
+        """
+        Builds DetectionArrays for the crop results of a batch (as produced from `crops`), shifted
+        to full-frame coordinates and with a `tank_number` attribute. Entries are still one per crop.
+        `result_columns` maps further attribute names to one value per crop result.
+        """
+        num_frames = len(frame_indices)
+        dets = DetectionArrays(results_list, np.repeat(np.asarray(frame_indices, dtype=np.int64), len(self)), class_names)
+        dets.translate(np.tile(self.x0, num_frames), np.tile(self.y0, num_frames))
+        dets.add_result_column(TANK_COLUMN, np.tile(self.tank_numbers, num_frames))
+        for name, values in (result_columns or {}).items(): dets.add_result_column(name, values)
+        return dets
+
+    def own_tank_mask(self, dets):
+        """True for detections whose centroid lies inside the tank they were cropped from."""
+        return self.grid.assign(dets.cx, dets.cy) == dets.tank_number
+
+    def frame_detections(self, results_list, frame_indices, class_names, result_columns=None):
+        """Crop results mapped back to one DetectionArrays entry per frame, duplicates from neighbouring tanks removed."""
+        dets = self.crop_detections(results_list, frame_indices, class_names, result_columns)
+        return dets.filtered(self.own_tank_mask(dets), results_per_frame=len(self))
@@ -1,9 +1,14 @@
 # EthoGrid_App/core/tracker.py
 
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
+from core.centroid_tracker import CentroidTracker, tracker_params
+
+TRACKER_NORFAIR, TRACKER_CENTROID = "norfair", "centroid"
 
 try:
-    from norfair import Detection
+    from norfair import Detection, Tracker
     NORFAIR_AVAILABLE = True
 except ImportError:
     NORFAIR_AVAILABLE = False
@@ -14,20 +19,84 @@ except ImportError:
 def to_norfair(detections):
     """
     Converts a list of detection dicts to a list of Norfair Detections.
-    The 'frame' argument is no longer needed.
+    Each Detection carries its dict as `data`, so the tracked output is built from the dict.
     """
     if not NORFAIR_AVAILABLE:
         return []
-    
-    norfair_detections = []
-    for det in detections:
-        centroid = np.array([det['cx'], det['cy']])
-        
-        data = {
-            "class_name": det.get('class_name', ''),
-            "conf": det.get('conf', 0.0),
-            "box": [det.get('x1',0), det.get('y1',0), det.get('x2',0), det.get('y2',0)],
-            "polygon": det.get('polygon', '')
-        }
-        norfair_detections.append(Detection(points=centroid, data=data))
-    return norfair_detections
\ No newline at end of file
+    return [Detection(points=np.array([det['cx'], det['cy']]), data=det) for det in detections]
+
+def _tracked_det(frame_idx, tank_num, track_id, cx, cy, det, flag_columns):
+    """Output row of a track: the estimated centroid with the class, box and outline of its last matched detection."""
+    tracked_det = {'frame_idx': frame_idx, 'tank_number': tank_num, 'track_id': track_id, 'class_name': det.get('class_name', ''), 'conf': det.get('conf', 0.0),
+                   'x1': det.get('x1', 0), 'y1': det.get('y1', 0), 'x2': det.get('x2', 0), 'y2': det.get('y2', 0), 'polygon': det.get('polygon', ''),
+                   'cx': cx, 'cy': cy}
+    for flag in flag_columns: tracked_det[flag] = int(det.get(flag, 0))
+    return tracked_det
+
+def track_tank(tank_num, frames, params, flag_columns=(), should_stop=None, method=TRACKER_NORFAIR):
+    """
+    Runs one tracker (`method`: TRACKER_NORFAIR or TRACKER_CENTROID) over the detections of one
+    tank: `frames` is [(frame_idx, dets), ...] in frame order, holding only the frames where the
+    tank has detections (the tracker is not stepped on the others). `params` are the Norfair
+    settings. Returns [(frame_idx, tracked detection dict), ...] with the tracker's own track
+    IDs, which start at 1 for every tank.
+    """
+    tracked = []
+    if method == TRACKER_CENTROID:
+        tracker = CentroidTracker(**tracker_params(params))
+        for frame_idx, dets in frames:
+            if should_stop is not None and should_stop(): break
+            for track_id, cx, cy, det in tracker.update(dets):
+                tracked.append((frame_idx, _tracked_det(frame_idx, tank_num, track_id, cx, cy, det, flag_columns)))
+        return tracked
+    tracker = Tracker(**params)
+    for frame_idx, dets in frames:
+        if should_stop is not None and should_stop(): break
+        for obj in tracker.update(detections=to_norfair(dets)):
+            est_points = obj.estimate.flatten()
+            tracked.append((frame_idx, _tracked_det(frame_idx, tank_num, obj.id, est_points[0], est_points[1], obj.last_detection.data, flag_columns)))
+    return tracked
+
+def track_tanks(frames_by_tank, params, flag_columns=(), num_processes=1, should_stop=None, method=TRACKER_NORFAIR):
+    """
+    {tank: track_tank output} for {tank: frames}, tracked with `method`. The tanks are
+    independent, so with `num_processes` > 1 they are tracked in a pool of worker processes
+    (largest tank first); otherwise one after the other in this process. Stopping skips the
+    tanks not started yet.
+    """
+    tanks = sorted(frames_by_tank, key=lambda t: sum(len(dets) for _, dets in frames_by_tank[t]), reverse=True)
+    if num_processes <= 1 or len(tanks) <= 1:
+        results = {}
+        for tank in tanks:
+            if should_stop is not None and should_stop(): break
+            results[tank] = track_tank(tank, frames_by_tank[tank], params, flag_columns, should_stop, method)
+        return results
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=min(num_processes, len(tanks)), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(track_tank, tank, frames_by_tank[tank], params, tuple(flag_columns), None, method): tank for tank in tanks}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if should_stop is not None and should_stop():
+                for pending in futures: pending.cancel()
+                break
+    return results
+
+def merge_tracks(results, tank_order):
+    """
+    Merges per-tank tracking results into {frame_idx: [tracked detection dict, ...]}, frames
+    ascending and, within a frame, tanks in `tank_order[frame_idx]`. Track IDs are renumbered to be
+    unique across tanks: each tank's IDs are offset by the highest ID of the tanks numbered below it.
+    """
+    offset, by_tank_frame = 0, {}
+    for tank in sorted(results):
+        highest = 0
+        for frame_idx, det in results[tank]:
+            highest = max(highest, det['track_id']); det['track_id'] += offset
+            by_tank_frame.setdefault((tank, frame_idx), []).append(det)
+        offset += highest
+    merged = {}
+    for frame_idx in sorted(tank_order):
+        dets = [det for tank in tank_order[frame_idx] for det in by_tank_frame.get((tank, frame_idx), [])]
+        if dets: merged[frame_idx] = dets
+    return merged
@@ -0,0 +1,385 @@
+# EthoGrid_App/core/video_source.py
+
+import os
+import json
+import shutil
+import subprocess
+import importlib.util
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from functools import lru_cache
+import cv2
+import numpy as np
+
+DECODER_AUTO = "Auto"
+DECODER_OPENCV = "OpenCV"
+DECODER_PYAV = "PyAV"
+DECODER_FFMPEG = "FFmpeg pipe"
+DECODERS = (DECODER_OPENCV, DECODER_PYAV, DECODER_FFMPEG)
+
+DECODER_ENV = "ETHOGRID_VIDEO_DECODER"          # process-wide decoder choice, inherited by worker processes
+DECODE_THREADS_ENV = "ETHOGRID_DECODE_THREADS"  # 0 lets the decoder use every core
+FORWARD_DECODE_LIMIT = 48  # seeks at most this many frames ahead decode forward instead of seeking
+
+VideoInfo = namedtuple("VideoInfo", "width height fps frame_count")
+
+
+def _startupinfo():
+    if os.name != 'nt': return None
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+def decoder_available(decoder):
+    """True if the package or executable `decoder` needs is installed."""
+    if decoder == DECODER_OPENCV: return True
+    if decoder == DECODER_PYAV: return importlib.util.find_spec("av") is not None
+    if decoder == DECODER_FFMPEG: return shutil.which("ffmpeg") is not None
+    return False
+
+def default_decoder():
+    """
+    The decoder named in ETHOGRID_VIDEO_DECODER if it is installed, otherwise OpenCV. PyAV and the
+    FFmpeg pipe are opt-in: they are faster on large recordings but ignore rotation metadata, which
+    OpenCV applies, so phone videos would otherwise come out oriented differently per machine.
+    """
+    chosen = os.environ.get(DECODER_ENV, DECODER_AUTO)
+    if chosen in DECODERS and decoder_available(chosen): return chosen
+    return DECODER_OPENCV
+
+def set_default_decoder(decoder):
+    """Selects the decoder for this process and the worker processes it starts (DECODER_AUTO resets the choice)."""
+    os.environ[DECODER_ENV] = decoder
+
+def _default_threads():
+    try: return max(0, int(os.environ.get(DECODE_THREADS_ENV, 0)))
+    except ValueError: return 0
+
+
+# --- Metadata ---
+
+def _exact_frame_count(path):
+    """
+    Frame count from the container index (mp4/mov/avi), or by counting packets without decoding
+    when the container has none (e.g. mkv). None if neither PyAV nor ffprobe is available.
+    """
+    if decoder_available(DECODER_PYAV):
+        try:
+            import av
+            with av.open(path) as container:
+                stream = container.streams.video[0]
+                if stream.frames: return int(stream.frames)
+                return sum(1 for packet in container.demux(stream) if packet.size)
+        except Exception:
+            pass
+    if shutil.which("ffprobe"):
+        for entries in (["-show_entries", "stream=nb_frames"], ["-count_packets", "-show_entries", "stream=nb_read_packets"]):
+            try:
+                out = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", *entries, "-of", "json", path],
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, startupinfo=_startupinfo()).stdout
+                stream = json.loads(out)['streams'][0]
+                count = int(stream.get('nb_frames') or stream.get('nb_read_packets') or 0)
+                if count > 0: return count
+            except (subprocess.CalledProcessError, FileNotFoundError, ValueError, KeyError, IndexError):
+                pass
+    return None
+
+@lru_cache(maxsize=128)
+def _probe(path, mtime_ns, size):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        cap.release()
+        return None
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps, estimate = cap.get(cv2.CAP_PROP_FPS) or 30.0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    count = _exact_frame_count(path)
+    return VideoInfo(width, height, fps, count if count is not None else max(estimate, 0))
+
+def probe_video(path):
+    """
+    Size, frame rate and frame count of a video, or None if it cannot be opened. OpenCV's frame
+    count is estimated from the duration and can be off by several frames; the exact count is
+    used whenever PyAV or ffprobe can provide it. Results are cached per file version (path, size,
+    modification time), so every stage that opens the same video probes it only once.
+    """
+    try: stat = os.stat(path)
+    except OSError: return None
+    return _probe(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+# --- Sources ---
+
+class VideoSource(ABC):
+    """
+    Sequential frame reader shared by every worker that decodes video.
+
+    `read(image=None)` returns (ret, frame) like cv2.VideoCapture, decoding into `image` when the
+    backend can; `grab()` advances one frame without converting it; `seek(index)` makes the next
+    `read()` return frame `index`, or returns False if the backend cannot get there exactly.
+    `position` is the index of that next frame. Frames are BGR uint8 of `width` x `height`,
+    scaled on the fly when the source was opened with a `size`.
+
+    Backends implement `is_opened`, `_read(image)` and `_seek(index)`; `_grab` defaults to a read.
+    """
+    decoder = None
+
+    def __init__(self, path, size=None, threads=None):
+        self.path = path
+        self.size = tuple(size) if size else None
+        self.threads = _default_threads() if threads is None else threads
+        self.width, self.height, self.fps = 0, 0, 30.0
+        self.position = 0
+
+    @property
+    def frame_count(self):
+        info = probe_video(self.path)
+        return info.frame_count if info else 0
+
+    @abstractmethod
+    def is_opened(self):
+        """True if the video could be opened."""
+
+    def read(self, image=None):
+        ret, frame = self._read(image)
+        if ret: self.position += 1
+        return ret, frame
+
+    def grab(self):
+        if not self._grab(): return False
+        self.position += 1
+        return True
+
+    def seek(self, index):
+        index = max(0, int(index))
+        if index == self.position: return True
+        if self.position < index <= self.position + FORWARD_DECODE_LIMIT:
+            while self.position < index:
+                if not self.grab(): return False
+            return True
+        if not self._seek(index): return False
+        self.position = index
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @abstractmethod
+    def _read(self, image):
+        """Decodes the next frame: (ret, frame)."""
+
+    def _grab(self):
+        return self._read(None)[0]
+
+    @abstractmethod
+    def _seek(self, index):
+        """Positions the backend so that the next frame read is `index`; False if it cannot."""
+
+
+class OpenCVSource(VideoSource):
+    """cv2.VideoCapture, with FFmpeg's frame threads where the OpenCV build exposes them."""
+    decoder = DECODER_OPENCV
+
+    def __init__(self, path, size=None, threads=None):
+        super().__init__(path, size, threads)
+        if self.threads and hasattr(cv2, "CAP_PROP_N_THREADS"):
+            self._cap = cv2.VideoCapture(path, cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, self.threads])
+        else:
+            self._cap = cv2.VideoCapture(path)
+        self.width, self.height = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self._native = (self.width, self.height)
+        if self.size: self.width, self.height = self.size
+
+    def is_opened(self):
+        return self._cap.isOpened()
+
+    def _read(self, image):
+        if self.size is None or self.size == self._native:
+            return self._cap.read(image=image) if image is not None else self._cap.read()
+        ret, frame = self._cap.read()
+        if not ret: return False, None
+        dst = image if image is not None and image.shape == (self.height, self.width, 3) else None
+        return True, cv2.resize(frame, self.size, dst=dst, interpolation=cv2.INTER_AREA)
+
+    def _grab(self):
+        return self._cap.grab()
+
+    def _seek(self, index):
+        # CAP_PROP_POS_FRAMES snaps to keyframes or drifts on some codecs; when the position read
+        # back is not the target, rewind and decode forward, which is exact but linear in `index`
+        if self._cap.set(cv2.CAP_PROP_POS_FRAMES, index) and int(round(self._cap.get(cv2.CAP_PROP_POS_FRAMES))) == index:
+            return True
+        if not self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0): return False
+        for _ in range(index):
+            if not self._cap.grab(): return False
+        return True
+
+    def release(self):
+        self._cap.release()
+
+
+class PyAVSource(VideoSource):
+    """
+    PyAV (libav* bindings) with frame and slice threading, which scales H.264/HEVC decoding of
+    large frames across cores. Scaling and the BGR conversion happen in one swscale pass.
+    Rotation metadata is not applied.
+    """
+    decoder = DECODER_PYAV
+
+    def __init__(self, path, size=None, threads=None):
+        super().__init__(path, size, threads)
+        import av
+        self._container = av.open(path)
+        try:
+            self._stream = self._container.streams.video[0]
+            self._stream.thread_type = "AUTO"
+            self._stream.codec_context.thread_count = self.threads
+            codec = self._stream.codec_context
+            self.width, self.height = self.size or (codec.width, codec.height)
+            rate = self._stream.average_rate or self._stream.guessed_rate
+            self.fps = float(rate) if rate else 30.0
+        except Exception:
+            self._container.close()
+            raise
+        self._frames = self._container.decode(self._stream)
+        self._pending = None  # frame decoded while seeking, returned by the next read
+
+    def is_opened(self):
+        return self._container is not None
+
+    def _next_frame(self):
+        if self._pending is not None:
+            frame, self._pending = self._pending, None
+            return frame
+        try:
+            return next(self._frames)
+        except StopIteration:
+            return None
+        except Exception:
+            return None  # like cv2, a broken stream ends the video
+
+    def _read(self, image):
+        frame = self._next_frame()
+        if frame is None: return False, None
+        return True, frame.to_ndarray(width=self.width, height=self.height, format='bgr24')
+
+    def _grab(self):
+        return self._next_frame() is not None
+
+    def _seek(self, index):
+        # Jump to the keyframe before the target, then decode forward to the exact frame
+        time_base, start = self._stream.time_base, self._stream.start_time or 0
+        target = start + int(round(index / self.fps / time_base))
+        tolerance = int(0.5 / self.fps / time_base)
+        self._container.seek(target, stream=self._stream, backward=True, any_frame=False)
+        self._frames, self._pending = self._container.decode(self._stream), None
+        while True:
+            frame = self._next_frame()
+            if frame is None: return False
+            if frame.pts is None or frame.pts >= target - tolerance:
+                self._pending = frame
+                return True
+
+    def release(self):
+        if self._container is not None:
+            self._container.close()
+            self._container = None
+
+
+class FFmpegPipeSource(VideoSource):
+    """
+    Raw BGR frames piped from an `ffmpeg` process: decoding, scaling and conversion run
+    multi-threaded in another process, and each frame is read straight into the caller's
+    buffer. Seeking restarts ffmpeg at the target time with accurate (decode-forward) seeking.
+    """
+    decoder = DECODER_FFMPEG
+
+    def __init__(self, path, size=None, threads=None):
+        super().__init__(path, size, threads)
+        self._process = None
+        info = probe_video(path)
+        if info is None: return
+        self.width, self.height = self.size or (info.width, info.height)
+        self.fps = info.fps
+        self._frame_bytes = self.width * self.height * 3
+        self._scratch = None
+        self._start(0)
+
+    def _start(self, index):
+        self._stop()
+        cmd = ["ffmpeg", "-v", "error", "-nostdin", "-threads", str(self.threads)]
+        if index > 0: cmd += ["-ss", f"{(index - 0.5) / self.fps:.6f}"]  # the first frame at or after `index`
+        cmd += ["-i", self.path, "-map", "0:v:0", "-an", "-sn"]
+        if self.size: cmd += ["-vf", f"scale={self.width}:{self.height}:flags=area"]
+        cmd += ["-vsync", "0", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                         bufsize=self._frame_bytes, startupinfo=_startupinfo())
+
+    def _stop(self):
+        if self._process is None: return
+        self._process.stdout.close()
+        self._process.kill()
+        self._process.wait()
+        self._process = None
+
+    def is_opened(self):
+        return self._process is not None
+
+    def _read_into(self, buffer):
+        view, got = memoryview(buffer).cast('B'), 0
+        while got < self._frame_bytes:
+            n = self._process.stdout.readinto(view[got:])
+            if not n: return False
+            got += n
+        return True
+
+    def _read(self, image):
+        if self._process is None: return False, None
+        shape = (self.height, self.width, 3)
+        if image is None or image.shape != shape or image.dtype != np.uint8 or not image.flags.c_contiguous:
+            image = np.empty(shape, np.uint8)
+        return (True, image) if self._read_into(image) else (False, None)
+
+    def _grab(self):
+        if self._process is None: return False
+        if self._scratch is None: self._scratch = np.empty(self._frame_bytes, np.uint8)
+        return self._read_into(self._scratch)
+
+    def _seek(self, index):
+        self._start(index)
+        return True
+
+    def release(self):
+        self._stop()
+
+
+_SOURCES = {DECODER_OPENCV: OpenCVSource, DECODER_PYAV: PyAVSource, DECODER_FFMPEG: FFmpegPipeSource}
+
+def open_video(path, decoder=None, size=None, threads=None):
+    """
+    Opens `path` with `decoder` (default: `default_decoder()`), falling back to OpenCV when that
+    decoder cannot open the file. Check `is_opened()` on the result, as with cv2.VideoCapture.
+    `size` = (width, height) scales frames while decoding; `threads` = 0 lets the decoder use
+    every core (default: ETHOGRID_DECODE_THREADS, which the thread budget of worker processes sets).
+    """
+    decoder = decoder or default_decoder()
+    if decoder != DECODER_OPENCV and decoder_available(decoder):
+        try:
+            source = _SOURCES[decoder](path, size, threads)
+            if source.is_opened(): return source
+        except Exception:
+            pass
+    return OpenCVSource(path, size, threads)
+
+def read_first_frame(path):
+    """The first frame of a video, or None."""
+    with open_video(path) as source:
+        ret, frame = source.read() if source.is_opened() else (False, None)
+    return frame if ret else None
@@ -0,0 +1,2 @@
+# EthoGrid_App/ethogrid/__init__.py
+# Headless entry point: `python -m ethogrid --help` (see core/cli.py)
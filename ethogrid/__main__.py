@@ -0,0 +1,14 @@
+# EthoGrid_App/ethogrid/__main__.py
+
+import os
+import sys
+import multiprocessing
+
+# Make 'core' and 'workers' importable no matter where the command is run from
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.cli import main
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # worker processes of the parallel inference mode
+    sys.exit(main())
@@ -41,6 +41,7 @@ def main():
         "pyqt=5 "
         "pyqt5-sip "
         "scipy "
+        "psutil "
         "pandas "
         "matplotlib "
         "seaborn "
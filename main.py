@@ -3,6 +3,7 @@
 import sys
 import os
 import time
+import multiprocessing
 from PyQt5 import QtWidgets, QtCore, QtGui
 
 # This is crucial: it adds the application's folder to the Python path
@@ -55,6 +56,13 @@ class GlobalScrollFilter(QtCore.QObject):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # worker processes of the parallel inference mode
+    if "--model-service" in sys.argv:  # the warm model service, started by core.model_service in frozen builds
+        from core.model_service import serve_forever
+        sys.exit(serve_forever())
+    if len(sys.argv) > 1 and sys.argv[1] in ("detect", "segment", "batch", "analyze", "stats", "bench", "bench-tracking"):  # headless runs of frozen builds
+        from core.cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
     os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
     
     if hasattr(QtCore.Qt, 'AA_EnableHighDpiScaling'):
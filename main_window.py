@@ -20,6 +20,9 @@ from widgets.batch_dialog import BatchProcessDialog
 from widgets.yolo_inference_dialog import YoloInferenceDialog
 from widgets.yolo_segmentation_dialog import YoloSegmentationDialog
 from core.data_exporter import export_centroid_csv, export_to_excel_sheets, PANDAS_AVAILABLE
+from core.polygon_store import polygon_cells, POLYGON_COLUMN
+from core.detection_table import DetectionTable
+from core.mask_compositing import composite_masks
 from widgets.analysis_dialog import AnalysisDialog
 from widgets.video_splitter_dialog import VideoSplitterDialog
 from widgets.frame_extractor_dialog import FrameExtractorDialog # Import the new dialog
@@ -44,7 +47,7 @@ class VideoPlayer(QtWidgets.QWidget):
         if os.path.exists(logo_path): self.setWindowIcon(QtGui.QIcon(logo_path))
         else: print(f"Warning: Logo not found at '{logo_path}'.")
 
-        self.raw_detections, self.processed_detections, self.csv_headers = {}, {}, []
+        self.detection_table, self.processed_detections, self.csv_headers = None, {}, []
         self.current_frame, self.current_frame_idx, self.total_frames = None, 0, 0
         self.video_size = (0, 0); self.behavior_colors = {}
         self.predefined_colors = [(31,119,180),(255,127,14),(44,160,44),(214,39,40),(148,103,189),(140,86,75),(227,119,194),(127,127,127),(188,189,34),(23,190,207)]
@@ -162,21 +165,11 @@ class VideoPlayer(QtWidgets.QWidget):
         file_path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Select Detection CSV", "", "CSV Files (*.csv)");
         if file_path:
             try:
-                detections = {};
-                with open(file_path, newline="", encoding='utf-8') as f:
-                    reader = csv.DictReader(f); self.csv_headers = reader.fieldnames[:]
-                    coord_cols = ['x1', 'y1', 'x2', 'y2', 'cx', 'cy', 'conf']
-                    for row in reader:
-                        idx = int(float(row["frame_idx"]))
-                        for col in coord_cols:
-                            if col in row and row[col]:
-                                try: row[col] = float(row[col])
-                                except (ValueError, TypeError): row[col] = None
-                        detections.setdefault(idx, []).append(row)
-                self.raw_detections = detections; self.processed_detections = {}; self.behavior_colors.clear()
-                all_behaviors = sorted(list(set(det['class_name'] for dets in self.raw_detections.values() for det in dets)))
-                for behavior in all_behaviors: self.get_color_for_behavior(behavior)
-                self.update_legend_widget(); self.start_detection_processing(); QtWidgets.QMessageBox.information(self, "Success", f"Loaded {len(detections)} frames of detections.")
+                # Parsed once into columns; tank assignment and filtering rerun on it after every grid change
+                table = DetectionTable.read_csv(file_path); self.csv_headers = list(table.headers)
+                self.detection_table = table; self.processed_detections = {}; self.behavior_colors.clear()
+                for behavior in table.class_names: self.get_color_for_behavior(behavior)
+                self.update_legend_widget(); self.start_detection_processing(); QtWidgets.QMessageBox.information(self, "Success", f"Loaded {len(table.frames)} frames of detections.")
             except Exception as e: self.show_error(f"Error loading detections: {str(e)}")
 
     def save_detections_with_tanks(self):
@@ -188,10 +181,13 @@ class VideoPlayer(QtWidgets.QWidget):
             new_headers = self.csv_headers[:] if self.csv_headers and all_detections else list(all_detections[0].keys())
             for key in ['tank_number', 'cx', 'cy']:
                 if key not in new_headers: new_headers.append(key)
+            has_sidecar = self.detection_table is not None and self.detection_table.polygons is not None
+            polygon_column = polygon_cells(file_path, [det.get(POLYGON_COLUMN) for det in all_detections], sidecar=has_sidecar) if POLYGON_COLUMN in new_headers else None
             with open(file_path, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.DictWriter(f, fieldnames=new_headers, extrasaction='ignore'); writer.writeheader()
-                for det in all_detections:
+                for i, det in enumerate(all_detections):
                     row_to_write = det.copy()
+                    if polygon_column is not None: row_to_write[POLYGON_COLUMN] = polygon_column[i]
                     for key in ['x1', 'y1', 'x2', 'y2', 'cx', 'cy']:
                         if key in row_to_write and isinstance(row_to_write[key], float):
                             row_to_write[key] = f"{row_to_write[key]:.4f}"
@@ -271,29 +267,23 @@ class VideoPlayer(QtWidgets.QWidget):
     def update_display(self):
         if self.current_frame is None: return
         try:
-            frame = self.current_frame.copy(); overlay = frame.copy(); h, w, _ = frame.shape; current_transform = self.grid_manager.transform
+            frame = self.current_frame.copy(); h, w, _ = frame.shape; current_transform = self.grid_manager.transform
             def transform_point(x, y): p = current_transform.map(QPointF(x, y)); return int(p.x()), int(p.y())
             for i in range(self.grid_settings['cols'] + 1): cv2.line(frame, transform_point(w*i/self.grid_settings['cols'],0), transform_point(w*i/self.grid_settings['cols'],h), (0,255,0), self.line_thickness)
             for i in range(self.grid_settings['rows'] + 1): cv2.line(frame, transform_point(0,h*i/self.grid_settings['rows']), transform_point(w,h*i/self.grid_settings['rows']), (0,255,0), self.line_thickness)
             center_px = self.grid_manager.center.x() * w, self.grid_manager.center.y() * h; cv2.circle(frame, (int(center_px[0]), int(center_px[1])), 8, (0, 0, 255), -1)
-            has_drawn_mask = False
-            if self.current_frame_idx in self.processed_detections:
-                for det in self.processed_detections[self.current_frame_idx]:
-                    if det.get('tank_number') is not None and (not self.selected_cells or str(det['tank_number']) in self.selected_cells):
-                        color_bgr = self.behavior_colors.get(det["class_name"], (128,128,128))[::-1]; x1, y1 = float(det["x1"]), float(det["y1"])
-                        if 'polygon' in det and det['polygon']:
-                            try:
-                                poly_points = np.array([list(map(int, p.split(','))) for p in det['polygon'].split(';')], dtype=np.int32)
-                                cv2.fillPoly(overlay, [poly_points], color_bgr); has_drawn_mask = True
-                            except: 
-                                x2, y2 = float(det["x2"]), float(det["y2"]); cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color_bgr, 2)
-                        else:
-                            x2, y2 = float(det["x2"]), float(det["y2"]); cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color_bgr, 2)
-                        if det.get('cx') is not None and det.get('cy') is not None:
-                            cx_float, cy_float = float(det['cx']), float(det['cy']); cv2.circle(frame, (int(round(cx_float)), int(round(cy_float))), 8, (0, 0, 255), -1)
-                        label = f"{det['tank_number']}"; font_face, f_scale, f_thick = cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2; (t_w, t_h), _ = cv2.getTextSize(label, font_face, f_scale, f_thick)
-                        cv2.rectangle(frame, (int(x1), int(y1) - t_h - 12), (int(x1) + t_w, int(y1)), color_bgr, -1); cv2.putText(frame, label, (int(x1), int(y1) - 7), font_face, f_scale, (0,0,0), f_thick, cv2.LINE_AA)
-            if has_drawn_mask: frame = cv2.addWeighted(overlay, 0.4, frame, 0.6, 0)
+            visible = [(det, self.behavior_colors.get(det["class_name"], (128,128,128))[::-1]) for det in self.processed_detections.get(self.current_frame_idx, [])
+                       if det.get('tank_number') is not None and (not self.selected_cells or str(det['tank_number']) in self.selected_cells)]
+            # All masks are blended in one pass, then boxes, centroids and labels are drawn on top
+            composite_masks(frame, [det.get(POLYGON_COLUMN) for det, _ in visible], [color_bgr for _, color_bgr in visible])
+            for det, color_bgr in visible:
+                x1, y1 = float(det["x1"]), float(det["y1"])
+                if det.get(POLYGON_COLUMN) is None:
+                    x2, y2 = float(det["x2"]), float(det["y2"]); cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color_bgr, 2)
+                if det.get('cx') is not None and det.get('cy') is not None:
+                    cx_float, cy_float = float(det['cx']), float(det['cy']); cv2.circle(frame, (int(round(cx_float)), int(round(cy_float))), 8, (0, 0, 255), -1)
+                label = f"{det['tank_number']}"; font_face, f_scale, f_thick = cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2; (t_w, t_h), _ = cv2.getTextSize(label, font_face, f_scale, f_thick)
+                cv2.rectangle(frame, (int(x1), int(y1) - t_h - 12), (int(x1) + t_w, int(y1)), color_bgr, -1); cv2.putText(frame, label, (int(x1), int(y1) - 7), font_face, f_scale, (0,0,0), f_thick, cv2.LINE_AA)
             rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB); qimg = QImage(rgb.data, w, h, w * 3, QImage.Format_RGB888); pixmap = QPixmap.fromImage(qimg).scaled(self.video_label.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation); self.video_label.setPixmap(pixmap)
         except Exception as e: print(f"Error updating display: {e}")
 
@@ -320,7 +310,7 @@ class VideoPlayer(QtWidgets.QWidget):
         if self.video_loader: self.video_loader.set_playing(False); self.video_loader.seek(pos)
     def reset_playback(self):
         if self.video_loader: self.video_loader.stop()
-        self.current_frame, self.current_frame_idx, self.total_frames = None, 0, 0; self.frame_slider.setValue(0); self.frame_slider.setEnabled(False); self.frame_label.setText("Frame: 0/0"); self.progress_bar.setValue(0); self.video_label.clear(); self.behavior_colors.clear(); self.raw_detections.clear(); self.processed_detections.clear()
+        self.current_frame, self.current_frame_idx, self.total_frames = None, 0, 0; self.frame_slider.setValue(0); self.frame_slider.setEnabled(False); self.frame_label.setText("Frame: 0/0"); self.progress_bar.setValue(0); self.video_label.clear(); self.behavior_colors.clear(); self.detection_table = None; self.processed_detections.clear()
         self.update_legend_widget();
         if self.timeline_widget: self.timeline_widget.setData({}, {}, 0, 0)
         self._update_button_states()
@@ -334,17 +324,17 @@ class VideoPlayer(QtWidgets.QWidget):
         self.video_size = (width, height); self.total_frames = self.video_loader.total_frames; self.frame_slider.setRange(0, self.total_frames - 1); self.frame_slider.setEnabled(True)
         self.frame_label.setText(f"Frame: 0/{self.total_frames - 1}"); self.progress_bar.setRange(0, 100); self.grid_manager.set_video_size(width, height); self._update_button_states()
         self.video_loader.seek(0)
-        if self.raw_detections: self.start_detection_processing()
+        if self.detection_table is not None: self.start_detection_processing()
     def on_frame_loaded(self, frame_idx, frame):
         self.current_frame_idx, self.current_frame = frame_idx, frame; self.update_display(); self.frame_slider.blockSignals(True); self.frame_slider.setValue(frame_idx); self.frame_slider.blockSignals(False)
         self.frame_label.setText(f"Frame: {frame_idx}/{self.total_frames - 1}")
         if self.total_frames > 0 and self.progress_bar.value() != int((frame_idx + 1) * 100 / self.total_frames): self.progress_bar.setValue(int((frame_idx + 1) * 100 / self.total_frames))
         if self.timeline_widget: self.timeline_widget.setCurrentFrame(frame_idx)
     def start_detection_processing(self):
-        if not self.raw_detections or self.video_size[0] == 0: return
+        if self.detection_table is None or self.video_size[0] == 0: return
         if self.detection_processor and self.detection_processor.isRunning(): self.detection_processor.stop(); self.detection_processor.wait()
         self.status_label.setText("Processing detections...")
-        self.detection_processor = DetectionProcessor(self.raw_detections, self.grid_manager.transform, self.grid_settings, self.video_size, self.max_animals_spinbox.value())
+        self.detection_processor = DetectionProcessor(self.detection_table, self.grid_manager.matrix(), self.grid_settings, self.video_size, self.max_animals_spinbox.value())
         self.detection_processor.processing_finished.connect(self.on_processing_complete); self.detection_processor.error_occurred.connect(self.on_processing_error); self.detection_processor.finished.connect(self.detection_processor.deleteLater); self.detection_processor.finished.connect(self.on_processor_thread_finished)
         self.detection_processor.start(); self._update_button_states()
     def on_processor_thread_finished(self):
@@ -0,0 +1,7 @@
+# EthoGrid_App/tests/conftest.py
+
+import os
+import sys
+
+# The app is run from its folder rather than installed, so the tests import `core` from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,126 @@
+# EthoGrid_App/tests/test_centroid_tracker.py
+
+"""
+The built-in centroid tracker: track ID continuity across missed frames, deletion after long
+gaps, the distance threshold, merge_tracks' per-tank ID offsets, and agreement with Norfair
+(when it is installed) on the same input.
+"""
+
+import math
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+from core.centroid_tracker import CentroidTracker
+from core.tracker import track_tanks, merge_tracks, TRACKER_NORFAIR, TRACKER_CENTROID
+
+PARAMS = {'distance_function': 'euclidean', 'distance_threshold': 100.0, 'hit_counter_max': 15,
+          'initialization_delay': 3, 'past_detections_length': 4}
+FRAMES = 200
+SHORT_GAP = range(60, 65)      # animal 2 of tank 1 is missed; its track survives
+LONG_GAP = range(100, 140)     # animal 3 of tank 1 is gone; its track is deleted
+TANK_2_GAP = range(50, 80)     # tank 2 has no detections at all, so its tracker is not stepped
+# Track IDs per (tank, animal, segment); segment 1 is animal 3's return after LONG_GAP
+EXPECTED_IDS = {(1, "animal1", 0): 1, (1, "animal2", 0): 2, (1, "animal3", 0): 3, (1, "animal3", 1): 4, (2, "animal1", 0): 1}
+
+
+def detection(animal, x, y):
+    """A detection whose class name tags the animal it belongs to (tracked rows keep the class name)."""
+    return {'class_name': animal, 'conf': 0.9, 'x1': x - 10, 'y1': y - 10, 'x2': x + 10, 'y2': y + 10, 'cx': x, 'cy': y, 'polygon': ''}
+
+def fixed_tank_detections():
+    """Three animals on lanes 150 px apart in tank 1, one circling animal in tank 2, nothing in tank 3."""
+    tank_1, tank_2 = [], []
+    for frame_idx in range(FRAMES):
+        dets = [detection("animal1", 20 + 2 * frame_idx, 50)]
+        if frame_idx not in SHORT_GAP: dets.append(detection("animal2", 20 + 2 * frame_idx, 200))
+        if frame_idx not in LONG_GAP: dets.append(detection("animal3", 400 - 1.5 * frame_idx, 350))
+        tank_1.append((frame_idx, dets))
+        if frame_idx not in TANK_2_GAP:
+            angle = frame_idx / 30.0
+            tank_2.append((frame_idx, [detection("animal1", 150 + 50 * math.cos(angle), 150 + 50 * math.sin(angle))]))
+    return {1: tank_1, 2: tank_2, 3: []}
+
+def segment(tank, animal, frame_idx):
+    return 1 if tank == 1 and animal == "animal3" and frame_idx >= LONG_GAP.stop else 0
+
+def ids_by_segment(results):
+    """{(tank, animal, segment): {track IDs it was reported under}}."""
+    ids = {}
+    for tank, tracked in results.items():
+        for frame_idx, det in tracked:
+            ids.setdefault((tank, det['class_name'], segment(tank, det['class_name'], frame_idx)), set()).add(det['track_id'])
+    return ids
+
+def tracked_rows(results):
+    return {(tank, frame_idx, det['class_name'], det['track_id']) for tank, tracked in results.items() for frame_idx, det in tracked}
+
+@pytest.fixture(scope="module")
+def centroid_results():
+    return track_tanks(fixed_tank_detections(), PARAMS, method=TRACKER_CENTROID)
+
+
+def test_each_animal_keeps_one_id(centroid_results):
+    ids = ids_by_segment(centroid_results)
+    assert {key: sorted(value) for key, value in ids.items()} == {key: [track_id] for key, track_id in EXPECTED_IDS.items()}
+    assert centroid_results[3] == []
+
+def test_tracks_are_reported_once_initialized(centroid_results):
+    first_frames = {}
+    for frame_idx, det in centroid_results[1]:
+        first_frames.setdefault(det['track_id'], frame_idx)
+    # A new track has 1 hit and gains 1 per matched frame; it is reported once it has more than initialization_delay
+    assert first_frames == {1: 3, 2: 3, 3: 3, 4: LONG_GAP.stop + 3}
+
+def test_missed_track_is_reported_through_a_short_gap(centroid_results):
+    frames = {frame_idx for frame_idx, det in centroid_results[1] if det['track_id'] == 2}
+    assert set(SHORT_GAP) <= frames
+
+def test_track_is_deleted_after_its_hit_counter_runs_out(centroid_results):
+    frames = sorted(frame_idx for frame_idx, det in centroid_results[1] if det['track_id'] == 3)
+    assert frames[-1] < LONG_GAP.stop
+    assert LONG_GAP.start + PARAMS['hit_counter_max'] - 1 <= frames[-1]
+
+def test_detections_beyond_the_distance_threshold_start_a_new_track():
+    tracker = CentroidTracker(distance_threshold=50.0, hit_counter_max=5, initialization_delay=0)
+    assert [t[0] for t in tracker.update([detection("a", 0.0, 0.0)])] == [1]
+    assert [t[0] for t in tracker.update([detection("a", 30.0, 0.0)])] == [1]     # within the threshold
+    reported = tracker.update([detection("a", 200.0, 0.0)])                         # beyond it
+    assert sorted(t[0] for t in reported) == [1, 2]
+    assert next(t for t in reported if t[0] == 2)[1:3] == (200.0, 0.0)
+    for _ in range(10): reported = tracker.update([detection("a", 200.0, 0.0)])
+    assert [t[0] for t in reported] == [2]                                           # the abandoned track is gone
+
+def test_invalid_initialization_delay_is_rejected():
+    with pytest.raises(ValueError):
+        CentroidTracker(hit_counter_max=3, initialization_delay=3)
+
+def test_worker_processes_do_not_change_the_tracks(centroid_results):
+    pooled = track_tanks(fixed_tank_detections(), PARAMS, num_processes=2, method=TRACKER_CENTROID)
+    assert tracked_rows(pooled) == tracked_rows(centroid_results)
+
+def test_merge_tracks_offsets_ids_per_tank():
+    def row(tank, track_id, frame_idx):
+        return frame_idx, {'tank_number': tank, 'track_id': track_id, 'frame_idx': frame_idx}
+    results = {2: [row(2, 1, 0), row(2, 2, 1)], 1: [row(1, 1, 0), row(1, 3, 0)], 3: [], 4: [row(4, 1, 1)]}
+    merged = merge_tracks(results, {0: [2, 1], 1: [4, 2], 2: [1]})
+    # Tank 1 keeps its IDs (highest 3), tank 2 is offset by 3, tank 3 adds nothing, tank 4 by 3 + 2
+    assert {frame_idx: [(det['tank_number'], det['track_id']) for det in dets] for frame_idx, dets in merged.items()} == \
+        {0: [(2, 4), (1, 1), (1, 3)], 1: [(4, 6), (2, 5)]}
+
+def test_merged_ids_are_unique_across_tanks(centroid_results):
+    frames_by_tank = fixed_tank_detections()
+    tank_order = {}
+    for tank in sorted(frames_by_tank):
+        for frame_idx, _ in frames_by_tank[tank]: tank_order.setdefault(frame_idx, []).append(tank)
+    owners = {}
+    for dets in merge_tracks({tank: [(f, dict(det)) for f, det in tracked] for tank, tracked in centroid_results.items()}, tank_order).values():
+        for det in dets:
+            owners.setdefault(det['track_id'], set()).add((det['tank_number'], det['class_name'], segment(det['tank_number'], det['class_name'], det['frame_idx'])))
+    assert sorted(owners) == [1, 2, 3, 4, 5]
+    assert all(len(animals) == 1 for animals in owners.values())
+
+def test_matches_norfair_on_the_fixed_input(centroid_results):
+    pytest.importorskip("norfair")
+    norfair = track_tanks(fixed_tank_detections(), PARAMS, method=TRACKER_NORFAIR)
+    assert tracked_rows(norfair) == tracked_rows(centroid_results)
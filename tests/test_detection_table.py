@@ -0,0 +1,118 @@
+# EthoGrid_App/tests/test_detection_table.py
+
+"""
+DetectionTable: top_per_tank against the per-frame dict-and-sort filter it replaced, and the
+read_csv round trip, including how its row dicts differ from the csv.DictReader rows used before.
+"""
+
+from collections import defaultdict
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("cv2")
+from core.detection_table import DetectionTable
+from core.result_extraction import TANK_COLUMN
+from core.tank_assignment import NO_TANK
+
+ROW_COLUMN = "row"   # extra column that carries each detection's row index through the old filter
+
+
+def old_top_per_tank(table, max_per_tank, tanks):
+    """The filter of BatchProcessor/DetectionProcessor before top_per_tank, returning row indices."""
+    filtered = defaultdict(list)
+    for frame_idx, dets_in_frame in table.frame_dicts(extra_columns={TANK_COLUMN: tanks, ROW_COLUMN: np.arange(len(table))}).items():
+        dets_by_tank = defaultdict(list)
+        for det in dets_in_frame:
+            if det.get('tank_number') is not None: dets_by_tank[det['tank_number']].append(det)
+        for tank_num, dets_in_tank in dets_by_tank.items():
+            dets_in_tank.sort(key=lambda d: d.get('conf', 0.0), reverse=True)
+            filtered[frame_idx].extend(dets_in_tank[:max_per_tank])
+    return [det[ROW_COLUMN] for frame_idx in sorted(filtered) for det in filtered[frame_idx]]
+
+def make_table(frames, confs, tanks):
+    columns = {"frame_idx": np.asarray(frames, dtype=np.int64), "conf": np.asarray(confs, dtype=np.float64)}
+    columns["cx"] = columns["cy"] = np.zeros(len(frames))
+    return DetectionTable(columns, ["frame_idx", "conf", "cx", "cy"]), np.asarray(tanks, dtype=np.float64)
+
+def random_table(seed=0, rows=5000, frames=400, tanks=6):
+    rng = np.random.default_rng(seed)
+    tank = rng.integers(0, tanks + 1, rows).astype(np.float64)
+    tank[tank == 0] = np.nan
+    return make_table(np.sort(rng.integers(0, frames, rows)), np.round(rng.random(rows), 1), tank)   # one decimal: many ties
+
+nan = np.nan
+CASES = {
+    "ties within a tank": ([0, 0, 0, 0, 0], [0.5, 0.9, 0.5, 0.5, 0.9], [1, 1, 1, 1, 1]),
+    "tanks in order of first appearance": ([0, 0, 0, 0, 0, 0], [0.2, 0.8, 0.8, 0.4, 0.2, 0.9], [3, 1, 3, 2, 1, 2]),
+    "frames without detections": ([0, 0, 4, 4, 9], [0.7, 0.6, 0.5, 0.5, 0.1], [1, 2, 2, 2, 1]),
+    "frames whose detections have no tank": ([0, 1, 1, 2, 2, 3], [0.9, 0.8, 0.7, 0.6, 0.6, 0.5], [1, nan, nan, 2, nan, nan]),
+    "no tank at all": ([0, 1, 2], [0.9, 0.8, 0.7], [nan, nan, nan]),
+    "empty table": ([], [], []),
+}
+
+
+@pytest.mark.parametrize("max_per_tank", [1, 2, 3])
+@pytest.mark.parametrize("case", sorted(CASES) + ["random"])
+def test_top_per_tank_matches_old_filter(case, max_per_tank):
+    table, tanks = random_table() if case == "random" else make_table(*CASES[case])
+    expected = old_top_per_tank(table, max_per_tank, tanks)
+    assert table.top_per_tank(max_per_tank, tanks).tolist() == expected
+    # DetectionProcessor passes freshly assigned int tanks, with NO_TANK outside the grid
+    assert table.top_per_tank(max_per_tank, np.nan_to_num(tanks, nan=NO_TANK).astype(np.int64)).tolist() == expected
+
+def test_top_per_tank_ties_keep_file_order():
+    table, tanks = make_table(*CASES["ties within a tank"])
+    assert table.top_per_tank(3, tanks).tolist() == [1, 4, 0]
+
+def test_top_per_tank_without_tanks_or_limit_is_empty():
+    table, tanks = make_table(*CASES["frames without detections"])
+    assert table.top_per_tank(2).tolist() == []          # no tank column in the table
+    assert table.top_per_tank(0, tanks).tolist() == []
+
+
+CSV_TEXT = """frame_idx,class_name,conf,x1,y1,x2,y2,cx,cy,tank_number,notes,polygon
+12,worm,0.9,10,20,30,40,,,2,first,"1,2;3,4;5,6"
+3,worm,0.5,0,0,10,10,4.5,5.5,,second,
+12.0,fish,0.75,0,0,2,2,1,1,1,third,
+,worm,0.1,0,0,1,1,,,1,no frame,
+"""
+
+@pytest.fixture
+def table(tmp_path):
+    path = tmp_path / "detections.csv"
+    path.write_text(CSV_TEXT, encoding="utf-8")
+    return DetectionTable.read_csv(str(path))
+
+def test_read_csv_orders_rows_by_frame_and_drops_rows_without_one(table):
+    assert table["frame_idx"].tolist() == [3, 12, 12]
+    assert table["conf"].tolist() == [0.5, 0.9, 0.75]
+    assert list(table.frame_range(12)) == [1, 2] and list(table.frame_range(5)) == []
+    assert table.class_names == ["fish", "worm"]
+
+def test_read_csv_fills_missing_centroids_from_the_box(table):
+    assert table["cx"].tolist() == [4.5, 20.0, 1.0]
+    assert table["cy"].tolist() == [5.5, 30.0, 1.0]
+
+def test_read_csv_drops_unknown_columns(table):
+    assert "notes" not in table and "notes" not in table.headers
+    assert all("notes" not in det for det in table.rows())
+
+def test_rows_keep_frame_idx_an_int(table):
+    det = table.rows()[1]
+    assert det["frame_idx"] == 12 and isinstance(det["frame_idx"], int)
+    # BatchProcessor writes floats as f"{val:.4f}"; frame numbers used to come back as "12.0000"
+    cells = {key: f"{val:.4f}" if isinstance(val, float) else val for key, val in det.items()}
+    assert cells["frame_idx"] == 12 and cells["conf"] == "0.9000"
+
+def test_rows_resolve_tanks_and_polygons(table):
+    rows = table.rows()
+    assert [det[TANK_COLUMN] for det in rows] == [None, 2, 1]
+    assert rows[1]["polygon"].tolist() == [[1, 2], [3, 4], [5, 6]]
+    assert rows[0]["polygon"] is None
+
+def test_assigned_no_tank_becomes_none(table):
+    tanks = np.array([NO_TANK, 4, NO_TANK], dtype=np.int64)
+    rows = table.rows(extra_columns={TANK_COLUMN: tanks})
+    assert [det[TANK_COLUMN] for det in rows] == [None, 4, None]
+    assert sorted(table.frame_dicts(tanks > 0, extra_columns={TANK_COLUMN: tanks})) == [12]
@@ -0,0 +1,158 @@
+# EthoGrid_App/tests/test_tank_assignment.py
+
+"""
+Tank assignment: TankGrid.assign against the per-point QTransform lookup it replaced, and
+ArenaLayout.assign, which BatchProcessor uses, for grid, wells and polygon layouts.
+"""
+
+import math
+import importlib.util
+import pytest
+
+np = pytest.importorskip("numpy")
+from core.tank_assignment import TankGrid, grid_matrix, NO_TANK
+
+QT_AVAILABLE = importlib.util.find_spec("PyQt5") is not None
+VIDEO_SIZE = (1280, 720)
+# (center_x, center_y, angle, scale_x, scale_y, cols, rows)
+GRIDS = [(0.5, 0.5, 0.0, 1.0, 1.0, 4, 3),
+         (0.5, 0.5, 90.0, 0.5, 1.0, 4, 2),
+         (0.25, 0.75, 180.0, 0.5, 0.5, 2, 2),
+         (0.5, 0.5, 270.0, 1.0, 0.5, 5, 1),
+         (0.45, 0.55, 33.5, 0.8, 0.9, 4, 3),
+         (0.6, 0.4, -12.25, 1.1, 0.7, 6, 4),
+         (0.5, 0.5, 0.0, 1.0, 1.0, 1, 1)]
+# Quarter turns, power-of-two scales and cells of whole pixels: edge points map back exactly
+EXACT_GRIDS = [g for g in GRIDS if g[2] % 90 == 0]
+
+
+class _AffineTransform:
+    """The affine part of QTransform (translate/rotate/scale post-multiply like Qt), for when PyQt5 is missing."""
+    def __init__(self, m11=1.0, m12=0.0, m21=0.0, m22=1.0, dx=0.0, dy=0.0):
+        self.m11, self.m12, self.m21, self.m22, self.dx, self.dy = m11, m12, m21, m22, dx, dy
+
+    def translate(self, x, y):
+        self.dx += x * self.m11 + y * self.m21; self.dy += x * self.m12 + y * self.m22
+
+    def rotate(self, angle):
+        if angle == 90.0: sina, cosa = 1.0, 0.0
+        elif angle == 270.0: sina, cosa = -1.0, 0.0
+        elif angle == 180.0: sina, cosa = 0.0, -1.0
+        else: a = math.radians(angle); sina, cosa = math.sin(a), math.cos(a)
+        self.m11, self.m12, self.m21, self.m22 = (cosa * self.m11 + sina * self.m21, cosa * self.m12 + sina * self.m22,
+                                                  -sina * self.m11 + cosa * self.m21, -sina * self.m12 + cosa * self.m22)
+
+    def scale(self, sx, sy):
+        self.m11 *= sx; self.m12 *= sx; self.m21 *= sy; self.m22 *= sy
+
+    def inverted(self):
+        det = self.m11 * self.m22 - self.m12 * self.m21
+        return _AffineTransform(self.m22 / det, -self.m12 / det, -self.m21 / det, self.m11 / det,
+                                (self.m21 * self.dy - self.m22 * self.dx) / det, (self.m12 * self.dx - self.m11 * self.dy) / det), det != 0
+
+    def map(self, x, y):
+        return self.m11 * x + self.m21 * y + self.dx, self.m12 * x + self.m22 * y + self.dy
+
+
+def old_assign(grid_params, x, y):
+    """The per-point _get_tank_for_point of BatchProcessor/DetectionProcessor before TankGrid, with NO_TANK for None."""
+    center_x, center_y, angle, scale_x, scale_y, cols, rows = grid_params
+    w, h = VIDEO_SIZE
+    if QT_AVAILABLE:
+        from PyQt5.QtCore import QPointF
+        from PyQt5.QtGui import QTransform
+        transform = QTransform()
+    else:
+        transform = _AffineTransform()
+    transform.translate(center_x * w, center_y * h); transform.rotate(angle)
+    transform.scale(scale_x, scale_y); transform.translate(-w / 2, -h / 2)
+    inverse, _ = transform.inverted()
+    tanks = []
+    for px, py in zip(np.asarray(x).tolist(), np.asarray(y).tolist()):
+        if QT_AVAILABLE:
+            point = inverse.map(QPointF(px, py)); tx, ty = point.x(), point.y()
+        else:
+            tx, ty = inverse.map(px, py)
+        if not (0 <= tx < w and 0 <= ty < h): tanks.append(NO_TANK); continue
+        col = min(cols - 1, max(0, int(tx / (w / cols)))); row = min(rows - 1, max(0, int(ty / (h / rows))))
+        tanks.append(row * cols + col + 1)
+    return np.array(tanks, dtype=np.int64)
+
+def make_grid(grid_params):
+    center_x, center_y, angle, scale_x, scale_y, cols, rows = grid_params
+    return TankGrid(grid_matrix(center_x, center_y, angle, scale_x, scale_y, *VIDEO_SIZE), VIDEO_SIZE, cols, rows)
+
+def grid_settings(grid_params):
+    center_x, center_y, angle, scale_x, scale_y, cols, rows = grid_params
+    return {'grid_settings': {'cols': cols, 'rows': rows},
+            'grid_transform': {'center_x': center_x, 'center_y': center_y, 'angle': angle, 'scale_x': scale_x, 'scale_y': scale_y}}
+
+def random_points(seed=0, n=20000):
+    """Points spread well beyond the video, so many fall outside the grid; the first 100 have a NaN coordinate."""
+    w, h = VIDEO_SIZE
+    rng = np.random.default_rng(seed)
+    x, y = rng.uniform(-0.5 * w, 1.5 * w, n), rng.uniform(-0.5 * h, 1.5 * h, n)
+    x[:50] = np.nan; y[50:100] = np.nan
+    return x, y
+
+def edge_points(grid):
+    """Cell corners and edges, and points just inside and outside the outer border, in video pixels."""
+    w, h = VIDEO_SIZE
+    gx = np.concatenate((np.arange(grid.cols + 1) * (w / grid.cols), (0.5, w - 0.5, -0.5, w + 0.5)))
+    gy = np.concatenate((np.arange(grid.rows + 1) * (h / grid.rows), (0.5, h - 0.5, -0.5, h + 0.5)))
+    tx, ty = (a.ravel() for a in np.meshgrid(gx, gy))
+    video = np.column_stack((tx, ty, np.ones(len(tx)))) @ grid.matrix.T
+    return video[:, 0], video[:, 1]
+
+
+@pytest.mark.parametrize("grid_params", GRIDS)
+def test_tank_grid_matches_old_lookup(grid_params):
+    x, y = random_points()
+    tanks = make_grid(grid_params).assign(x, y)
+    np.testing.assert_array_equal(tanks, old_assign(grid_params, x, y))
+    assert np.count_nonzero(tanks == NO_TANK) > 100   # out-of-grid points were exercised
+    assert (tanks[:100] == NO_TANK).all()
+
+@pytest.mark.parametrize("grid_params", EXACT_GRIDS)
+def test_tank_grid_matches_old_lookup_on_cell_edges(grid_params):
+    grid = make_grid(grid_params)
+    x, y = edge_points(grid)
+    np.testing.assert_array_equal(grid.assign(x, y), old_assign(grid_params, x, y))
+
+def test_tank_for_point_is_none_outside_the_grid():
+    grid = make_grid(GRIDS[0])
+    assert grid.tank_for_point(1.0, 1.0) == 1
+    assert grid.tank_for_point(1279.0, 719.0) == 12
+    assert grid.tank_for_point(-1.0, 10.0) is None
+    assert grid.tank_for_point(float('nan'), 10.0) is None
+
+@pytest.mark.parametrize("grid_params", GRIDS)
+def test_arena_grid_assigns_like_the_old_lookup(grid_params):
+    pytest.importorskip("cv2")
+    from core.arena_layout import ArenaLayout
+    arena = ArenaLayout.from_settings(grid_settings(grid_params), VIDEO_SIZE)
+    x, y = random_points(seed=1)
+    if grid_params in EXACT_GRIDS:
+        ex, ey = edge_points(make_grid(grid_params))
+        x, y = np.concatenate((x, ex)), np.concatenate((y, ey))
+    np.testing.assert_array_equal(arena.assign(x, y), old_assign(grid_params, x, y))
+
+def test_arena_wells_assign_through_the_label_raster():
+    pytest.importorskip("cv2")
+    from core.arena_layout import ArenaLayout
+    arena = ArenaLayout.wells({1: (100.0, 100.0, 50.0), 2: (300.0, 100.0, 50.0)}, (400, 200))
+    x = np.array([100.0, 300.0, 140.0, 200.0, 100.0, -5.0, 500.0, np.nan])
+    y = np.array([100.0, 100.0, 100.0, 100.0, 170.0, 100.0, 100.0, 100.0])
+    np.testing.assert_array_equal(arena.assign(x, y), [1, 2, 1, NO_TANK, NO_TANK, NO_TANK, NO_TANK, NO_TANK])
+    assert arena.tank_for_point(200.0, 100.0) is None
+
+def test_arena_polygons_scale_with_the_video():
+    pytest.importorskip("cv2")
+    from core.arena_layout import ArenaLayout
+    settings = {'video_dimensions': {'width': 200, 'height': 100},
+                'arena': {'type': 'polygons', 'polygons': [{'tank': 3, 'points': [[10, 10], [90, 10], [90, 90], [10, 90]]},
+                                                             {'tank': 7, 'points': [[110, 10], [190, 10], [150, 90]]}]}}
+    arena = ArenaLayout.from_settings(settings, (400, 200))   # twice the size of the settings' video
+    x, y = np.array([100.0, 300.0, 200.0, 300.0]), np.array([100.0, 60.0, 100.0, 195.0])
+    np.testing.assert_array_equal(arena.assign(x, y), [3, 7, NO_TANK, NO_TANK])
+    assert arena.tank_numbers == [3, 7] and arena.max_tank == 7
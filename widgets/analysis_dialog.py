@@ -8,8 +8,9 @@ import pandas as pd
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtCore import QThread, QPointF
 from PyQt5.QtGui import QPixmap, QImage, QPainter, QPen, QColor, QTransform
-import cv2
 from workers.analysis_processor import AnalysisProcessor
+from core.video_source import read_first_frame
+from core.endpoints_analyzer import SIDE_VIEW_ENDPOINTS, TOP_VIEW_ENDPOINTS, behavior_endpoint_name
 from widgets.range_slider import RangeSlider
 from widgets.base_dialog import BaseDialog 
 
@@ -198,8 +199,8 @@ class AnalysisDialog(BaseDialog):
         video_path = self.video_line_edit.text()
         if not video_path or not os.path.exists(video_path) or not self.grid_transform:
             self.video_display.setText("Load a sample video and settings file to see the grid"); return
-        cap = cv2.VideoCapture(video_path); ret, frame = cap.read(); cap.release()
-        if not ret: return
+        frame = read_first_frame(video_path)
+        if frame is None: return
         pixmap = QPixmap.fromImage(QImage(frame.data, frame.shape[1], frame.shape[0], QImage.Format_BGR888)); painter = QPainter(pixmap)
         rows, cols = self.grid_settings['rows'], self.grid_settings['cols']; w, h = self.video_size
         painter.setPen(QPen(QColor(0, 255, 0, 150), 2))
@@ -245,8 +246,6 @@ class AnalysisDialog(BaseDialog):
                 item = layout.takeAt(0)
                 if item.widget(): item.widget().deleteLater()
         
-        side_static = ["Average Speed (cm/s)", "Freezing Time (%)", "Swimming Time (%)", "Rapid Time (%)", "Time in Top (%)", "Time in Middle (%)", "Time in Bottom (%)", "Entries to Top", "Fractal Dimension", "Entropy"]
-        top_static = ["Average Speed (cm/s)", "Average Distance from Center (cm)", "Average Angular Velocity (degree/s)", "Meandering (degree/m)", "Fractal Dimension", "Entropy"]
         unique_behaviors = set()
         if self.csv_files:
             QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
@@ -257,14 +256,14 @@ class AnalysisDialog(BaseDialog):
                 except Exception as e: print(f"Could not read class names from {file_path}: {e}")
             QtWidgets.QApplication.restoreOverrideCursor()
         
-        behavior_endpoints = [f"Time_{str(b).replace(' ', '_').capitalize()}_(%)" for b in sorted(list(unique_behaviors))]
+        behavior_endpoints = [behavior_endpoint_name(b) for b in sorted(list(unique_behaviors))]
         
         self.side_view_endpoints_checkboxes = {}
-        for name in side_static + behavior_endpoints:
+        for name in SIDE_VIEW_ENDPOINTS + behavior_endpoints:
             cb = QtWidgets.QCheckBox(name, checked=True); self.side_view_endpoints_checkboxes[name] = cb; self.side_view_endpoints_layout.addRow(cb)
         
         self.top_view_endpoints_checkboxes = {}
-        for name in top_static + behavior_endpoints:
+        for name in TOP_VIEW_ENDPOINTS + behavior_endpoints:
             cb = QtWidgets.QCheckBox(name, checked=True); self.top_view_endpoints_checkboxes[name] = cb; self.top_view_endpoints_layout.addRow(cb)
     def browse_output(self):
         directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Select Output Directory");
@@ -27,11 +27,11 @@ class BatchProcessDialog(BaseDialog):
         self.output_dir_line_edit = QtWidgets.QLineEdit(); self.output_dir_line_edit.setPlaceholderText("Click 'Browse' to select an output folder")
         self.browse_settings_btn = QtWidgets.QPushButton("Browse..."); self.browse_output_btn = QtWidgets.QPushButton("Browse..."); self.browse_csv_dir_btn = QtWidgets.QPushButton("Browse...")
         
-        self.tracking_method_combo = QtWidgets.QComboBox(); self.tracking_method_combo.addItems(["Confidence Filter", "Norfair (Multi-Object Tracking)"])
+        self.tracking_method_combo = QtWidgets.QComboBox(); self.tracking_method_combo.addItems(["Confidence Filter", "Norfair (Multi-Object Tracking)", "Centroid Tracker (Built-in)"])
         self.max_animals_spinbox = CustomSpinBox(toolTip="Max animals to track (Norfair) or keep by confidence (Filter).", value=1, minimum=1, maximum=1000)
         
         # ### THE FIX IS HERE: All widgets are now assigned to `self` ###
-        self.norfair_group = QtWidgets.QGroupBox("Norfair Settings"); norfair_layout = QtWidgets.QFormLayout(self.norfair_group)
+        self.norfair_group = QtWidgets.QGroupBox("Tracker Settings"); norfair_layout = QtWidgets.QFormLayout(self.norfair_group)
         self.distance_fn_combo = QtWidgets.QComboBox(); self.distance_fn_combo.addItems(["euclidean", "iou"])
         self.distance_threshold_spinbox = CustomDoubleSpinBox(value=100.0, maximum=1000.0, singleStep=5.0, decimals=1, toolTip="Max distance (pixels) an object can move between frames.")
         self.hit_counter_max_spinbox = CustomSpinBox(value=15, minimum=1, maximum=100, toolTip="Frames an object can be missed before its track is deleted.")
@@ -41,7 +41,8 @@ class BatchProcessDialog(BaseDialog):
         dist_layout = QtWidgets.QHBoxLayout(); dist_layout.addWidget(self.distance_threshold_spinbox); dist_layout.addWidget(self.calculate_dist_btn)
         norfair_layout.addRow("Distance Function:", self.distance_fn_combo); norfair_layout.addRow("Distance Threshold:", dist_layout)
         norfair_layout.addRow("Hit Counter Max:", self.hit_counter_max_spinbox); norfair_layout.addRow("Initialization Delay:", self.initialization_delay_spinbox)
-        norfair_layout.addRow("Past Detections Length:", self.past_detections_spinbox)
+        self.tracking_processes_spinbox = QtWidgets.QSpinBox(); self.tracking_processes_spinbox.setRange(1, max(1, os.cpu_count() or 1)); self.tracking_processes_spinbox.setToolTip("Number of tanks tracked at the same time, each in its own process. The tanks are independent, so the results do not change.")
+        norfair_layout.addRow("Past Detections Length:", self.past_detections_spinbox); norfair_layout.addRow("Parallel Processes:", self.tracking_processes_spinbox)
         
         self.frame_sample_rate_spinbox = CustomSpinBox(toolTip="Use data from every Nth frame for image exports.", value=30, minimum=1, maximum=10000)
         self.time_gap_spinbox = CustomDoubleSpinBox(toolTip="Max time gap in seconds for trajectories.", value=1.0, minimum=0.1, maximum=99999.0, singleStep=0.1)
@@ -91,7 +92,8 @@ class BatchProcessDialog(BaseDialog):
 
     def on_tracking_method_changed(self, method):
         is_norfair = (method == "Norfair (Multi-Object Tracking)")
-        self.norfair_group.setVisible(is_norfair)
+        self.norfair_group.setVisible(is_norfair or method == "Centroid Tracker (Built-in)")
+        self.distance_fn_combo.setEnabled(is_norfair)  # the built-in tracker always uses the Euclidean centroid distance
         # The max_animals_spinbox is always visible now
         
     def calculate_optimal_distance(self):
@@ -163,9 +165,9 @@ class BatchProcessDialog(BaseDialog):
         self.toggle_controls(False); self.log_text_edit.clear()
         
         norfair_params = {'distance_function': self.distance_fn_combo.currentText(), 'distance_threshold': self.distance_threshold_spinbox.value(), 'hit_counter_max': self.hit_counter_max_spinbox.value(), 'initialization_delay': self.initialization_delay_spinbox.value(), 'past_detections_length': self.past_detections_spinbox.value()}
-        self.batch_worker = BatchProcessor(self.video_files, self.settings_line_edit.text(), self.output_dir_line_edit.text(), csv_dir=self.csv_dir_line_edit.text(), tracking_method=self.tracking_method_combo.currentText(), nofair_params=norfair_params, max_animals_per_tank=self.max_animals_spinbox.value(), frame_sample_rate=self.frame_sample_rate_spinbox.value(), save_video=self.save_video_checkbox.isChecked(), save_csv=self.save_csv_checkbox.isChecked(), save_centroid_csv=self.save_centroid_csv_checkbox.isChecked(), save_excel=self.save_excel_checkbox.isChecked(), save_trajectory_img=self.save_trajectory_img_checkbox.isChecked(), save_heatmap_img=self.save_heatmap_img_checkbox.isChecked(), time_gap_seconds=self.time_gap_spinbox.value(), draw_overlays=self.show_overlays_checkbox.isChecked())
+        self.batch_worker = BatchProcessor(self.video_files, self.settings_line_edit.text(), self.output_dir_line_edit.text(), csv_dir=self.csv_dir_line_edit.text(), tracking_method=self.tracking_method_combo.currentText(), nofair_params=norfair_params, max_animals_per_tank=self.max_animals_spinbox.value(), frame_sample_rate=self.frame_sample_rate_spinbox.value(), save_video=self.save_video_checkbox.isChecked(), save_csv=self.save_csv_checkbox.isChecked(), save_centroid_csv=self.save_centroid_csv_checkbox.isChecked(), save_excel=self.save_excel_checkbox.isChecked(), save_trajectory_img=self.save_trajectory_img_checkbox.isChecked(), save_heatmap_img=self.save_heatmap_img_checkbox.isChecked(), time_gap_seconds=self.time_gap_spinbox.value(), draw_overlays=self.show_overlays_checkbox.isChecked(), tracking_processes=self.tracking_processes_spinbox.value())
         self.batch_thread = QThread(); self.batch_worker.moveToThread(self.batch_thread)
-        self.batch_worker.overall_progress.connect(self.update_overall_progress); self.batch_worker.file_progress.connect(self.update_file_progress); self.batch_worker.log_message.connect(self.log_text_edit.append); self.batch_worker.finished.connect(self.on_processing_finished); self.batch_worker.time_updated.connect(self.update_time_labels); self.batch_worker.speed_updated.connect(self.update_speed_label); self.batch_thread.started.connect(self.batch_worker.run)
+        self.batch_worker.overall_progress.connect(self.update_overall_progress); self.batch_worker.progress_updated.connect(self.update_progress); self.batch_worker.log_message.connect(self.log_text_edit.append); self.batch_worker.finished.connect(self.on_processing_finished); self.batch_thread.started.connect(self.batch_worker.run)
         self.batch_thread.start()
     def cancel_processing(self):
         if self.batch_worker: self.batch_worker.stop(); self.cancel_btn.setEnabled(False)
@@ -182,6 +184,8 @@ class BatchProcessDialog(BaseDialog):
         self.elapsed_time_label.setText(f"Elapsed: {elapsed}"); self.etr_label.setText(f"ETR: {etr}")
     def update_speed_label(self, fps):
         self.speed_label.setText(f"Speed: {fps:.2f} FPS")
+    def update_progress(self, update):
+        self.update_file_progress(update.percent, update.done, update.total); self.update_time_labels(update.elapsed_text, update.remaining_text); self.update_speed_label(update.fps)
     def toggle_controls(self, enabled):
         self.start_btn.setEnabled(enabled); self.add_videos_btn.setEnabled(enabled); self.browse_settings_btn.setEnabled(enabled); self.browse_output_btn.setEnabled(enabled); self.browse_csv_dir_btn.setEnabled(enabled); self.add_directory_btn.setEnabled(enabled); self.remove_video_btn.setEnabled(enabled); self.clear_videos_btn.setEnabled(enabled)
         self.cancel_btn.setEnabled(not enabled)
@@ -3,6 +3,8 @@
 import os
 from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtCore import QThread
+from core.motion_gate import DEFAULT_THRESHOLD_PERCENT
+from core.model_export import BACKENDS, backend_available
 from workers.yolo_segmentation_processor import YoloSegmentationProcessor
 from widgets.base_dialog import BaseDialog 
 
@@ -26,6 +28,24 @@ class YoloSegmentationDialog(BaseDialog):
         self.confidence_spinbox = QtWidgets.QDoubleSpinBox(); self.confidence_spinbox.setRange(0.0, 1.0); self.confidence_spinbox.setSingleStep(0.05); self.confidence_spinbox.setValue(0.4)
         self.save_video_checkbox = QtWidgets.QCheckBox("Save Segmented Video"); self.save_video_checkbox.setChecked(True)
         self.save_csv_checkbox = QtWidgets.QCheckBox("Save Segmentations CSV"); self.save_csv_checkbox.setChecked(True)
+        self.pipeline_checkbox = QtWidgets.QCheckBox("Overlap Decoding, Inference and Encoding"); self.pipeline_checkbox.setToolTip("Decode the next frames and encode the previous ones while the model is running.")
+        self.resume_checkbox = QtWidgets.QCheckBox("Resume Interrupted Runs and Skip Completed Videos"); self.resume_checkbox.setToolTip("Continue each video from its last checkpoint instead of frame 0, and skip videos whose outputs are already complete.")
+        self.processes_spinbox = QtWidgets.QSpinBox(); self.processes_spinbox.setRange(1, max(1, os.cpu_count() or 1)); self.processes_spinbox.setToolTip("Number of videos processed at the same time, each in its own process with its own copy of the model.")
+        self.threads_spinbox = QtWidgets.QSpinBox(); self.threads_spinbox.setRange(0, max(1, os.cpu_count() or 1)); self.threads_spinbox.setSpecialValueText("Auto"); self.threads_spinbox.setToolTip("CPU threads each process may use. Auto divides the CPU cores evenly between the processes.")
+        self.stride_spinbox = QtWidgets.QSpinBox(); self.stride_spinbox.setRange(1, 30); self.stride_spinbox.setSuffix(" frame(s)"); self.stride_spinbox.setToolTip("Run the model on every N-th frame only. Skipped frames are decoded cheaply and filled with interpolated positions, marked in the 'interpolated' CSV column.")
+        self.tank_settings_line_edit = QtWidgets.QLineEdit(); self.tank_settings_line_edit.setPlaceholderText("Optional: grid settings (.json) to run the model on each tank separately"); self.tank_settings_line_edit.setToolTip("Cut every tank of the saved grid into its own crop before inference. Small animals stay larger in the model input and the CSV gets a 'tank_number' column, so Batch Processing can skip tank assignment.")
+        self.browse_tank_settings_btn = QtWidgets.QPushButton("Browse...")
+        self.imgsz_spinbox = QtWidgets.QSpinBox(); self.imgsz_spinbox.setRange(0, 4096); self.imgsz_spinbox.setSingleStep(32); self.imgsz_spinbox.setSuffix(" px"); self.imgsz_spinbox.setSpecialValueText("Model default"); self.imgsz_spinbox.setToolTip("Image size the model runs at. Per-tank crops usually allow a much smaller size than full frames.")
+        self.backend_combo = QtWidgets.QComboBox(); self.backend_combo.setToolTip("Runtime used for the model. ONNX Runtime and OpenVINO are usually much faster on the CPU; the .pt file is exported once per image size and the export is cached.")
+        for backend in BACKENDS:
+            self.backend_combo.addItem(backend if backend_available(backend) else f"{backend} (not installed)", backend)
+            if not backend_available(backend): self.backend_combo.model().item(self.backend_combo.count() - 1).setEnabled(False)
+        self.model_service_checkbox = QtWidgets.QCheckBox("Keep Model Warm in a Background Service"); self.model_service_checkbox.setToolTip("Load the model once in a background process that stays alive between runs and dialogs, so later runs skip model loading and warm-up. The service exits after 30 idle minutes.")
+        self.motion_gate_checkbox = QtWidgets.QCheckBox("Skip Static Frames"); self.motion_gate_checkbox.setToolTip("Only run the model on frames (or tanks, with per-tank crops) that changed since the model last saw them. Static ones reuse the previous results, marked in the 'carried' CSV column.")
+        self.motion_threshold_spinbox = QtWidgets.QDoubleSpinBox(); self.motion_threshold_spinbox.setRange(0.0, 100.0); self.motion_threshold_spinbox.setDecimals(2); self.motion_threshold_spinbox.setSingleStep(0.05); self.motion_threshold_spinbox.setValue(DEFAULT_THRESHOLD_PERCENT); self.motion_threshold_spinbox.setSuffix(" % changed"); self.motion_threshold_spinbox.setToolTip("Share of pixels that must change before the model runs again.")
+        self.batch_size_spinbox = QtWidgets.QSpinBox(); self.batch_size_spinbox.setRange(1, 256); self.batch_size_spinbox.setValue(12); self.batch_size_spinbox.setToolTip("Number of frames sent to the model at once.")
+        self.auto_batch_checkbox = QtWidgets.QCheckBox("Auto-tune"); self.auto_batch_checkbox.setToolTip("Benchmark several batch sizes on the first frames and use the fastest one. The choice is cached per model, resolution and computer.")
+        self.memory_limit_spinbox = QtWidgets.QSpinBox(); self.memory_limit_spinbox.setRange(0, 1024 * 1024); self.memory_limit_spinbox.setSingleStep(512); self.memory_limit_spinbox.setSuffix(" MB"); self.memory_limit_spinbox.setSpecialValueText("No limit"); self.memory_limit_spinbox.setToolTip("Auto-tuning will not pick a batch size whose inference needs more memory than this, on top of what the app already uses.")
         self.start_btn = QtWidgets.QPushButton("Start Segmentation"); self.cancel_btn = QtWidgets.QPushButton("Cancel")
         self.overall_progress_bar = QtWidgets.QProgressBar(); self.overall_progress_label = QtWidgets.QLabel("Waiting to start...")
         self.file_progress_bar = QtWidgets.QProgressBar(); self.file_progress_label = QtWidgets.QLabel("Frame: 0 / 0")
@@ -38,8 +58,17 @@ class YoloSegmentationDialog(BaseDialog):
         form_layout.addWidget(QtWidgets.QLabel("Output Directory:"), 4, 0); form_layout.addWidget(self.output_dir_line_edit, 5, 0); form_layout.addWidget(self.browse_output_btn, 5, 1)
         form_layout.addWidget(QtWidgets.QLabel("Confidence Threshold:"), 6, 0); form_layout.addWidget(self.confidence_spinbox, 6, 1)
         output_options_group = QtWidgets.QGroupBox("Output Options"); output_options_layout = QtWidgets.QHBoxLayout(output_options_group)
-        output_options_layout.addWidget(self.save_video_checkbox); output_options_layout.addWidget(self.save_csv_checkbox); output_options_layout.addStretch()
+        self.polygon_sidecar_checkbox = QtWidgets.QCheckBox("Store Masks in Binary Sidecar"); self.polygon_sidecar_checkbox.setToolTip("Write the mask outlines to a .polygons.npz file next to the CSV instead of as text in its 'polygon' column. Smaller and faster to load, but the CSV then needs the sidecar file to keep its masks.")
+        output_options_layout.addWidget(self.save_video_checkbox); output_options_layout.addWidget(self.save_csv_checkbox); output_options_layout.addWidget(self.polygon_sidecar_checkbox); output_options_layout.addStretch()
         form_layout.addWidget(output_options_group, 7, 0, 1, 3)
+        performance_group = QtWidgets.QGroupBox("Performance Options"); performance_layout = QtWidgets.QFormLayout(performance_group)
+        batch_layout = QtWidgets.QHBoxLayout(); batch_layout.addWidget(self.batch_size_spinbox); batch_layout.addWidget(self.auto_batch_checkbox); batch_layout.addStretch()
+        performance_layout.addRow(self.pipeline_checkbox); performance_layout.addRow(self.resume_checkbox); performance_layout.addRow("Batch Size:", batch_layout); performance_layout.addRow("Auto-tune Memory Ceiling:", self.memory_limit_spinbox); performance_layout.addRow("Parallel Processes:", self.processes_spinbox); performance_layout.addRow("CPU Threads per Process:", self.threads_spinbox); performance_layout.addRow("Inference Stride:", self.stride_spinbox)
+        tank_settings_layout = QtWidgets.QHBoxLayout(); tank_settings_layout.addWidget(self.tank_settings_line_edit); tank_settings_layout.addWidget(self.browse_tank_settings_btn)
+        performance_layout.addRow("Per-Tank Crops:", tank_settings_layout); performance_layout.addRow("Model Input Size:", self.imgsz_spinbox)
+        motion_gate_layout = QtWidgets.QHBoxLayout(); motion_gate_layout.addWidget(self.motion_gate_checkbox); motion_gate_layout.addWidget(self.motion_threshold_spinbox); motion_gate_layout.addStretch()
+        performance_layout.addRow("Motion Gate:", motion_gate_layout); performance_layout.addRow("Inference Backend:", self.backend_combo); performance_layout.addRow(self.model_service_checkbox)
+        form_layout.addWidget(performance_group, 8, 0, 1, 3)
 
         scroll_area = QtWidgets.QScrollArea(); scroll_area.setWidgetResizable(True); scroll_area.setWidget(main_widget)
         main_dialog_layout = QtWidgets.QVBoxLayout(self)
@@ -55,10 +84,15 @@ class YoloSegmentationDialog(BaseDialog):
         button_layout = QtWidgets.QHBoxLayout(); button_layout.addStretch(); button_layout.addWidget(self.cancel_btn); button_layout.addWidget(self.start_btn)
         main_dialog_layout.addLayout(button_layout)
 
-        self.add_videos_btn.clicked.connect(self.add_videos); self.add_directory_btn.clicked.connect(self.add_directory); self.remove_video_btn.clicked.connect(self.remove_selected); self.clear_videos_btn.clicked.connect(self.clear_all); self.browse_model_btn.clicked.connect(self.browse_model); self.browse_output_btn.clicked.connect(self.browse_output)
+        self.add_videos_btn.clicked.connect(self.add_videos); self.add_directory_btn.clicked.connect(self.add_directory); self.remove_video_btn.clicked.connect(self.remove_selected); self.clear_videos_btn.clicked.connect(self.clear_all); self.browse_model_btn.clicked.connect(self.browse_model); self.browse_output_btn.clicked.connect(self.browse_output); self.browse_tank_settings_btn.clicked.connect(self.browse_tank_settings)
         self.start_btn.clicked.connect(self.start_processing); self.cancel_btn.clicked.connect(self.cancel_processing)
-        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False); self.auto_batch_checkbox.stateChanged.connect(self.on_auto_batch_changed); self.on_auto_batch_changed()
+        self.motion_gate_checkbox.stateChanged.connect(self.on_motion_gate_changed); self.on_motion_gate_changed()
 
+    def on_auto_batch_changed(self, state=None):
+        is_auto = self.auto_batch_checkbox.isChecked(); self.batch_size_spinbox.setEnabled(not is_auto); self.memory_limit_spinbox.setEnabled(is_auto)
+    def on_motion_gate_changed(self, state=None):
+        self.motion_threshold_spinbox.setEnabled(self.motion_gate_checkbox.isChecked())
     def add_videos(self):
         files, _ = QtWidgets.QFileDialog.getOpenFileNames(self, "Select Video Files", "", "Video Files (*.mp4 *.avi *.mov *.mkv)")
         if files:
@@ -95,6 +129,9 @@ class YoloSegmentationDialog(BaseDialog):
     def browse_model(self):
         file, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Select YOLO Segmentation Model", "", "PyTorch Models (*.pt)");
         if file: self.model_line_edit.setText(file)
+    def browse_tank_settings(self):
+        file, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Select Grid Settings", "", "JSON Files (*.json)")
+        if file: self.tank_settings_line_edit.setText(file)
     def browse_output(self):
         directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Select Output Directory");
         if directory: self.output_dir_line_edit.setText(directory)
@@ -103,10 +140,11 @@ class YoloSegmentationDialog(BaseDialog):
         if not self.model_line_edit.text() or not os.path.exists(self.model_line_edit.text()): QtWidgets.QMessageBox.warning(self, "Input Error", "Please select a valid YOLO model (.pt) file."); return
         if not self.output_dir_line_edit.text() or not os.path.isdir(self.output_dir_line_edit.text()): QtWidgets.QMessageBox.warning(self, "Input Error", "Please select a valid output directory."); return
         if not self.save_video_checkbox.isChecked() and not self.save_csv_checkbox.isChecked(): QtWidgets.QMessageBox.warning(self, "Input Error", "Please select at least one output option."); return
+        if self.tank_settings_line_edit.text() and not os.path.isfile(self.tank_settings_line_edit.text()): QtWidgets.QMessageBox.warning(self, "Input Error", "The grid settings file for per-tank crops does not exist."); return
         self.toggle_controls(False); self.log_text_edit.clear()
-        self.yolo_worker = YoloSegmentationProcessor(self.video_files, self.model_line_edit.text(), self.output_dir_line_edit.text(), self.confidence_spinbox.value(), save_video=self.save_video_checkbox.isChecked(), save_csv=self.save_csv_checkbox.isChecked())
+        self.yolo_worker = YoloSegmentationProcessor(self.video_files, self.model_line_edit.text(), self.output_dir_line_edit.text(), self.confidence_spinbox.value(), save_video=self.save_video_checkbox.isChecked(), save_csv=self.save_csv_checkbox.isChecked(), pipeline=self.pipeline_checkbox.isChecked(), batch_size=self.batch_size_spinbox.value(), auto_batch_size=self.auto_batch_checkbox.isChecked(), memory_limit_mb=self.memory_limit_spinbox.value() or None, resume=self.resume_checkbox.isChecked(), num_processes=self.processes_spinbox.value(), threads_per_process=self.threads_spinbox.value() or None, frame_stride=self.stride_spinbox.value(), tank_settings_file=self.tank_settings_line_edit.text() or None, imgsz=self.imgsz_spinbox.value() or None, motion_gate=self.motion_gate_checkbox.isChecked(), motion_threshold=self.motion_threshold_spinbox.value(), backend=self.backend_combo.currentData(), use_model_service=self.model_service_checkbox.isChecked(), polygon_sidecar=self.polygon_sidecar_checkbox.isChecked())
         self.yolo_thread = QThread(); self.yolo_worker.moveToThread(self.yolo_thread)
-        self.yolo_worker.overall_progress.connect(self.update_overall_progress); self.yolo_worker.file_progress.connect(self.update_file_progress); self.yolo_worker.log_message.connect(self.log_text_edit.append); self.yolo_worker.error.connect(self.on_processing_error); self.yolo_worker.finished.connect(self.on_processing_finished); self.yolo_worker.time_updated.connect(self.update_time_labels); self.yolo_worker.speed_updated.connect(self.update_speed_label); self.yolo_thread.started.connect(self.yolo_worker.run)
+        self.yolo_worker.overall_progress.connect(self.update_overall_progress); self.yolo_worker.progress_updated.connect(self.update_progress); self.yolo_worker.log_message.connect(self.log_text_edit.append); self.yolo_worker.error.connect(self.on_processing_error); self.yolo_worker.finished.connect(self.on_processing_finished); self.yolo_thread.started.connect(self.yolo_worker.run)
         self.yolo_thread.start()
     def cancel_processing(self):
         if self.yolo_worker: self.yolo_worker.stop(); self.cancel_btn.setEnabled(False)
@@ -126,8 +164,10 @@ class YoloSegmentationDialog(BaseDialog):
         self.elapsed_time_label.setText(f"Elapsed: {elapsed}"); self.etr_label.setText(f"ETR: {etr}")
     def update_speed_label(self, fps):
         self.speed_label.setText(f"Speed: {fps:.2f} FPS")
+    def update_progress(self, update):
+        self.update_file_progress(update.percent, update.done, update.total); self.update_time_labels(update.elapsed_text, update.remaining_text); self.update_speed_label(update.fps)
     def toggle_controls(self, enabled):
-        self.start_btn.setEnabled(enabled); self.add_videos_btn.setEnabled(enabled); self.browse_model_btn.setEnabled(enabled); self.browse_output_btn.setEnabled(enabled); self.add_directory_btn.setEnabled(enabled); self.remove_video_btn.setEnabled(enabled); self.clear_videos_btn.setEnabled(enabled)
+        self.start_btn.setEnabled(enabled); self.add_videos_btn.setEnabled(enabled); self.browse_model_btn.setEnabled(enabled); self.browse_output_btn.setEnabled(enabled); self.pipeline_checkbox.setEnabled(enabled); self.resume_checkbox.setEnabled(enabled); self.processes_spinbox.setEnabled(enabled); self.threads_spinbox.setEnabled(enabled); self.stride_spinbox.setEnabled(enabled); self.tank_settings_line_edit.setEnabled(enabled); self.browse_tank_settings_btn.setEnabled(enabled); self.imgsz_spinbox.setEnabled(enabled); self.motion_gate_checkbox.setEnabled(enabled); self.backend_combo.setEnabled(enabled); self.model_service_checkbox.setEnabled(enabled); self.polygon_sidecar_checkbox.setEnabled(enabled); self.motion_threshold_spinbox.setEnabled(enabled and self.motion_gate_checkbox.isChecked()); self.auto_batch_checkbox.setEnabled(enabled); self.batch_size_spinbox.setEnabled(enabled and not self.auto_batch_checkbox.isChecked()); self.memory_limit_spinbox.setEnabled(enabled and self.auto_batch_checkbox.isChecked()); self.add_directory_btn.setEnabled(enabled); self.remove_video_btn.setEnabled(enabled); self.clear_videos_btn.setEnabled(enabled)
         self.cancel_btn.setEnabled(not enabled)
     def closeEvent(self, event):
         if self.yolo_thread and self.yolo_thread.isRunning():
@@ -1,16 +1,18 @@
 # EthoGrid_App/workers/detection_processor.py
 
-from PyQt5.QtCore import QThread, pyqtSignal, QPointF
+from PyQt5.QtCore import QThread, pyqtSignal
 from collections import defaultdict
+from core.result_extraction import TANK_COLUMN
+from core.tank_assignment import TankGrid
 
 class DetectionProcessor(QThread):
     processing_finished = pyqtSignal(dict, dict)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, detections, grid_transform, grid_settings, video_size, max_animals_per_tank, parent=None):
+    def __init__(self, table, grid_matrix, grid_settings, video_size, max_animals_per_tank, parent=None):
         super().__init__(parent)
-        self.detections = {k: list(v) for k, v in detections.items()} # Make a mutable copy
-        self.grid_transform = grid_transform
+        self.table = table  # DetectionTable; only read, the detection dicts are built fresh
+        self.grid_matrix = grid_matrix
         self.grid_settings = grid_settings
         self.video_size = video_size
         self.max_animals_per_tank = max_animals_per_tank
@@ -19,52 +21,23 @@ class DetectionProcessor(QThread):
     def stop(self):
         self._is_running = False
 
-    def _get_tank_for_point(self, x, y, w, h, cols, rows, inverse_transform):
-        transformed_point = inverse_transform.map(QPointF(x, y))
-        tx, ty = transformed_point.x(), transformed_point.y()
-        if not (0 <= tx < w and 0 <= ty < h): return None
-        cell_width, cell_height = w / cols, h / rows
-        col = min(cols - 1, max(0, int(tx / cell_width)))
-        row = min(rows - 1, max(0, int(ty / cell_height)))
-        return row * cols + col + 1
-
     def run(self):
         try:
-            w, h = self.video_size
-            cols, rows = self.grid_settings['cols'], self.grid_settings['rows']
-            inverse_transform, invertible = self.grid_transform.inverted()
-            if not invertible:
+            try:
+                grid = TankGrid(self.grid_matrix, self.video_size, self.grid_settings['cols'], self.grid_settings['rows'])
+            except ValueError:
                 self.error_occurred.emit("Grid transform is not invertible. Cannot process detections.")
                 return
 
-            # Step 1: Assign tank numbers to all detections
-            for frame_idx, dets in self.detections.items():
-                if not self._is_running: return
-                for det in dets:
-                    # Ensure cx/cy are calculated as floats
-                    if 'cx' not in det or det.get('cx') is None:
-                        det['cx'] = (float(det["x1"]) + float(det["x2"])) / 2.0
-                        det['cy'] = (float(det["y1"]) + float(det["y2"])) / 2.0
-                    det['tank_number'] = self._get_tank_for_point(det['cx'], det['cy'], w, h, cols, rows, inverse_transform)
+            # Step 1: Assign tank numbers to all detections at once (the table's centroids are already filled in)
+            tanks = grid.assign(self.table['cx'], self.table['cy'])
+            if not self._is_running: return
 
-            # Step 2: Filter detections based on max_animals_per_tank by confidence
-            filtered_detections = defaultdict(list)
-            for frame_idx, dets_in_frame in self.detections.items():
-                if not self._is_running: return
-                
-                dets_by_tank = defaultdict(list)
-                for det in dets_in_frame:
-                    if det.get('tank_number') is not None:
-                        # Ensure confidence is a float for sorting
-                        try:
-                            det['conf'] = float(det.get('conf', 0.0))
-                        except (ValueError, TypeError):
-                            det['conf'] = 0.0
-                        dets_by_tank[det['tank_number']].append(det)
-                
-                for tank_num, dets_in_tank in dets_by_tank.items():
-                    dets_in_tank.sort(key=lambda d: d['conf'], reverse=True)
-                    filtered_detections[frame_idx].extend(dets_in_tank[:self.max_animals_per_tank])
+            # Step 2: Keep the max_animals_per_tank most confident detections per frame and tank,
+            # selected on the table's columns so that only the kept rows become dicts
+            kept_rows = self.table.top_per_tank(self.max_animals_per_tank, tanks)
+            if not self._is_running: return
+            filtered_detections = self.table.frame_dicts(kept_rows, extra_columns={TANK_COLUMN: tanks})
 
             # Step 3: Generate timeline from the FILTERED detections
             tank_data_for_timeline = defaultdict(dict)
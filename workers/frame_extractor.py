@@ -5,6 +5,7 @@ import cv2
 import traceback
 import random
 from PyQt5.QtCore import QThread, pyqtSignal
+from core.video_source import open_video
 
 class FrameExtractor(QThread):
     overall_progress = pyqtSignal(int, int, str)
@@ -36,12 +37,12 @@ class FrameExtractor(QThread):
             self.log_message.emit(f"\n--- Extracting frames from: {filename} ---")
 
             try:
-                cap = cv2.VideoCapture(video_path)
-                if not cap.isOpened():
+                cap = open_video(video_path)
+                if not cap.is_opened():
                     self.log_message.emit(f"[WARNING] Could not open video: {filename}. Skipping.")
                     continue
                 
-                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                total_frames = cap.frame_count
                 if total_frames <= 0:
                     self.log_message.emit(f"[WARNING] Video has no frames: {filename}. Skipping.")
                     cap.release()
@@ -75,8 +76,7 @@ class FrameExtractor(QThread):
                     if not self.is_running:
                         break
                     
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-                    ret, frame = cap.read()
+                    ret, frame = cap.read() if cap.seek(frame_idx) else (False, None)
                     if ret:
                         output_filename = f"{video_name_prefix}_frame_{frame_idx:06d}.jpg"
                         output_path = os.path.join(self.output_dir, output_filename)
@@ -92,7 +92,7 @@ class FrameExtractor(QThread):
             except Exception as e:
                 self.log_message.emit(f"[ERROR] Failed to process {filename}: {e}")
                 self.log_message.emit(traceback.format_exc())
-                if 'cap' in locals() and cap.isOpened():
+                if 'cap' in locals():
                     cap.release()
                 continue
         
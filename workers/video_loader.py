@@ -1,8 +1,8 @@
 # EthoGrid_App/workers/video_loader.py
 
-import cv2
 import numpy as np
 from PyQt5.QtCore import QThread, pyqtSignal, QMutex
+from core.video_source import open_video
 
 class VideoLoader(QThread):
     """
@@ -29,15 +29,14 @@ class VideoLoader(QThread):
     def run(self):
         self.mutex.lock()
         try:
-            self.cap = cv2.VideoCapture(self.video_path)
-            if not self.cap.isOpened():
+            self.cap = open_video(self.video_path)
+            if not self.cap.is_opened():
                 self.error_occurred.emit("Failed to open video file")
                 return
 
-            self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+            self.total_frames = self.cap.frame_count
+            width, height = self.cap.width, self.cap.height
+            self.fps = self.cap.fps or 30.0
             if self.fps == 0: self.fps = 30.0
             self.video_loaded.emit(width, height, self.fps)
         except Exception as e:
@@ -51,7 +50,7 @@ class VideoLoader(QThread):
             try:
                 if self.seek_requested:
                     self.current_frame_idx = self.seek_frame
-                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame_idx)
+                    self.cap.seek(self.current_frame_idx)
                     self.seek_requested = False
                     ret, frame = self.cap.read()
                     if ret:
@@ -100,7 +99,7 @@ class VideoLoader(QThread):
     def stop(self):
         self.mutex.lock()
         self.running = False
-        if self.cap and self.cap.isOpened():
+        if self.cap and self.cap.is_opened():
             self.cap.release()
         self.mutex.unlock()
         self.wait()
\ No newline at end of file
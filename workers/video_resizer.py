@@ -4,10 +4,10 @@ import os
 import subprocess
 import traceback
 import shutil
-import cv2
 import re
 from PyQt5.QtCore import QThread, pyqtSignal
 from core.stopwatch import Stopwatch
+from core.video_source import probe_video
 
 def has_nvidia_gpu():
     """Checks if nvidia-smi command is available, indicating an NVIDIA GPU."""
@@ -97,15 +97,12 @@ class VideoResizer(QThread):
             self.speed_updated.emit(0.0)
 
             try:
-                cap = cv2.VideoCapture(video_path)
-                if not cap.isOpened():
+                info = probe_video(video_path)
+                if info is None:
                     self.log_message.emit(f"[WARNING] Could not open video. Skipping.")
                     continue
 
-                original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                original_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-                cap.release()
+                original_height, total_frames, original_fps = info.height, info.frame_count, info.fps
                 base_name = os.path.splitext(filename)[0]
 
                 if self.target_height >= original_height:
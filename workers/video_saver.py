@@ -2,8 +2,13 @@
 
 import cv2
 import numpy as np
-from PyQt5.QtCore import QThread, pyqtSignal, QPointF
+from PyQt5.QtCore import QThread, pyqtSignal
 from collections import defaultdict
+from core.arena_layout import ArenaLayout
+from core.tank_assignment import transform_matrix
+from core.polygon_store import polygon_points
+from core.mask_compositing import composite_masks
+from core.video_source import open_video
 
 class VideoSaver(QThread):
     progress_updated = pyqtSignal(int)
@@ -13,7 +18,7 @@ class VideoSaver(QThread):
     def __init__(self, source_video_path, output_video_path, detections, 
                  grid_settings, grid_transform, behavior_colors, 
                  video_size, fps, line_thickness, selected_cells, 
-                 timeline_segments, draw_grid=False, draw_overlays=True, parent=None):
+                 timeline_segments, draw_grid=False, draw_overlays=True, arena=None, parent=None):
         super().__init__(parent)
         self.source_path = source_video_path
         self.output_path = output_video_path
@@ -28,12 +33,14 @@ class VideoSaver(QThread):
         self.timeline_segments = timeline_segments
         self.draw_grid = draw_grid
         self.draw_overlays = draw_overlays
+        # Tank outlines and their label raster; masks are clipped to their tank through the raster
+        self.arena = arena if arena is not None else ArenaLayout.grid(transform_matrix(grid_transform), video_size, grid_settings['cols'], grid_settings['rows'])
         self.is_running = True
 
         original_w, original_h = self.video_size
         if self.draw_overlays:
             legend_width = 250
-            num_tanks = self.grid_settings['cols'] * self.grid_settings['rows']
+            num_tanks = len(self.arena)
             timeline_h = (num_tanks * 15) + 40 if num_tanks > 0 else 0
             final_w = original_w + legend_width
             final_h = original_h + timeline_h
@@ -47,30 +54,6 @@ class VideoSaver(QThread):
     def stop(self):
         self.is_running = False
 
-    def _get_clipped_mask(self, polygon_str, tank_number):
-        try:
-            seg_mask = np.zeros((self.video_size[1], self.video_size[0]), dtype=np.uint8)
-            poly_points = np.array([list(map(int, p.split(','))) for p in polygon_str.split(';')], dtype=np.int32)
-            cv2.fillPoly(seg_mask, [poly_points], 255)
-
-            tank_mask = np.zeros_like(seg_mask)
-            rows, cols = self.grid_settings['rows'], self.grid_settings['cols']
-            r = (int(tank_number) - 1) // cols
-            c = (int(tank_number) - 1) % cols
-            w, h = self.video_size
-            
-            p1 = self.grid_transform.map(QPointF(c * w / cols, r * h / rows))
-            p2 = self.grid_transform.map(QPointF((c + 1) * w / cols, r * h / rows))
-            p3 = self.grid_transform.map(QPointF((c + 1) * w / cols, (r + 1) * h / rows))
-            p4 = self.grid_transform.map(QPointF(c * w / cols, (r + 1) * h / rows))
-            tank_contour = np.array([(p1.x(), p1.y()), (p2.x(), p2.y()), (p3.x(), p3.y()), (p4.x(), p4.y())], dtype=np.int32)
-            cv2.fillPoly(tank_mask, [tank_contour], 255)
-            
-            clipped_mask = cv2.bitwise_and(seg_mask, tank_mask)
-            return clipped_mask
-        except:
-            return None
-
     def _draw_legend_on_frame(self, frame, original_video_width):
         if not self.behavior_colors: return
         y_offset = 0
@@ -83,7 +66,7 @@ class VideoSaver(QThread):
 
     def _draw_timeline_on_frame(self, frame, frame_idx, total_frames, original_video_height):
         new_h, new_w, _ = frame.shape
-        num_tanks = self.grid_settings['cols'] * self.grid_settings['rows']
+        num_tanks = len(self.arena)
         if new_h <= original_video_height or num_tanks == 0 or total_frames <= 1: return
         
         cv2.rectangle(frame, (0, original_video_height), (new_w, new_h), (10, 10, 10), -1)
@@ -94,8 +77,7 @@ class VideoSaver(QThread):
         bar_h_total = draw_area_h / num_tanks
         bar_h_visible = bar_h_total * 0.8
         
-        for i in range(num_tanks):
-            tank_id = i + 1
+        for i, tank_id in enumerate(self.arena.tank_numbers):
             y_pos = draw_area_y + i * bar_h_total
             cv2.rectangle(frame, (draw_area_x, int(y_pos)), (draw_area_x + draw_area_w, int(y_pos + bar_h_visible)), (74, 74, 74), -1)
             
@@ -120,41 +102,35 @@ class VideoSaver(QThread):
         else:
             processed_frame = original_frame.copy()
             
-        overlay = processed_frame.copy()
-        has_drawn_mask = False
-        
+        visible = []
         if frame_idx in self.detections:
             for det in self.detections[frame_idx]:
                 tank_num = det.get('tank_number')
                 if tank_num is not None and (not self.selected_cells or str(tank_num) in self.selected_cells):
                     track_id = det.get('track_id')
-                    
                     color_bgr = self.track_colors[track_id] if track_id is not None else self.behavior_colors.get(det["class_name"], (255, 255, 255))[::-1]
-                    
-                    if 'polygon' in det and det.get('polygon'):
-                        clipped_mask = self._get_clipped_mask(det['polygon'], tank_num)
-                        if clipped_mask is not None:
-                            final_mask = np.zeros((overlay.shape[0], overlay.shape[1]), dtype=np.uint8)
-                            final_mask[0:clipped_mask.shape[0], 0:clipped_mask.shape[1]] = clipped_mask
-                            overlay[final_mask > 0] = color_bgr
-                            has_drawn_mask = True
-                    
-                    x1, y1, x2, y2 = map(float, (det["x1"], det["y1"], det["x2"], det["y2"]))
-                    cx, cy = det.get('cx'), det.get('cy')
-                    
-                    cv2.rectangle(processed_frame, (int(x1), int(y1)), (int(x2), int(y2)), color_bgr, 2)
-                    if cx is not None and cy is not None:
-                        cv2.circle(processed_frame, (int(round(cx)), int(round(cy))), 8, (0, 0, 255), -1)
-                    
-                    label = f"T{int(tank_num)}: {int(track_id)}" if track_id is not None else f"T{int(tank_num)}"
-                    font_face, f_scale, f_thick = cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2
-                    (tw, th), _ = cv2.getTextSize(label, font_face, f_scale, f_thick)
-                    cv2.rectangle(processed_frame, (int(x1), int(y1) - th - 12), (int(x1) + tw, int(y1)), color_bgr, -1)
-                    cv2.putText(processed_frame, label, (int(x1), int(y1) - 7), font_face, f_scale, (0,0,0), f_thick, cv2.LINE_AA)
-        
-        if has_drawn_mask:
-            processed_frame = cv2.addWeighted(overlay, 0.4, processed_frame, 0.6, 0)
-        
+                    visible.append((det, tank_num, track_id, color_bgr))
+
+        # Masks of all visible animals, each clipped to its tank, are blended in one pass before the annotations
+        polygons = [polygon_points(det.get('polygon')) for det, _, _, _ in visible]
+        if any(p is not None for p in polygons):
+            composite_masks(processed_frame[0:original_h, 0:original_w], polygons, [color for _, _, _, color in visible],
+                            clip_labels=[int(tank_num) for _, tank_num, _, _ in visible], label_map=self.arena.labels)
+
+        for det, tank_num, track_id, color_bgr in visible:
+            x1, y1, x2, y2 = map(float, (det["x1"], det["y1"], det["x2"], det["y2"]))
+            cx, cy = det.get('cx'), det.get('cy')
+
+            cv2.rectangle(processed_frame, (int(x1), int(y1)), (int(x2), int(y2)), color_bgr, 2)
+            if cx is not None and cy is not None:
+                cv2.circle(processed_frame, (int(round(cx)), int(round(cy))), 8, (0, 0, 255), -1)
+
+            label = f"T{int(tank_num)}: {int(track_id)}" if track_id is not None else f"T{int(tank_num)}"
+            font_face, f_scale, f_thick = cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2
+            (tw, th), _ = cv2.getTextSize(label, font_face, f_scale, f_thick)
+            cv2.rectangle(processed_frame, (int(x1), int(y1) - th - 12), (int(x1) + tw, int(y1)), color_bgr, -1)
+            cv2.putText(processed_frame, label, (int(x1), int(y1) - 7), font_face, f_scale, (0,0,0), f_thick, cv2.LINE_AA)
+
         if self.draw_overlays:
             self._draw_legend_on_frame(processed_frame, original_w)
             self._draw_timeline_on_frame(processed_frame, frame_idx, total_frames, original_h)
@@ -163,12 +139,12 @@ class VideoSaver(QThread):
 
     def run(self):
         try:
-            cap = cv2.VideoCapture(self.source_path)
-            if not cap.isOpened():
+            cap = open_video(self.source_path)
+            if not cap.is_opened():
                 self.error_occurred.emit(f"Could not open source video: {self.source_path}")
                 return
                 
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            total_frames = cap.frame_count
             fourcc = cv2.VideoWriter_fourcc(*'mp4v')
             writer = cv2.VideoWriter(self.output_path, fourcc, self.fps, self.final_video_size)
             
@@ -6,6 +6,7 @@ import cv2
 import traceback
 from PyQt5.QtCore import QThread, pyqtSignal
 from core.stopwatch import Stopwatch
+from core.video_source import open_video
 
 try:
     import numpy as np
@@ -71,13 +72,13 @@ class YoloProcessor(QThread):
             self.log_message.emit(f"\n--- Starting processing for: {video_filename} ---")
             
             try:
-                cap = cv2.VideoCapture(video_path)
-                if not cap.isOpened():
+                cap = open_video(video_path)
+                if not cap.is_opened():
                     self.log_message.emit(f"[WARNING] Could not open video: {video_filename}. Skipping.")
                     continue
                 
-                width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                fps, total_frames = cap.get(cv2.CAP_PROP_FPS) or 30.0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                width, height = cap.width, cap.height
+                fps, total_frames = cap.fps, cap.frame_count
 
                 out_video = None
                 if self.save_video:
@@ -167,7 +168,7 @@ class YoloProcessor(QThread):
             except Exception as e:
                 self.log_message.emit(f"[ERROR] Failed during processing of {video_filename}: {e}")
                 self.log_message.emit(traceback.format_exc())
-                if 'cap' in locals() and cap.isOpened(): cap.release()
+                if 'cap' in locals(): cap.release()
                 if 'out_video' in locals() and out_video is not None: out_video.release()
                 continue
         
@@ -1,11 +1,23 @@
 # EthoGrid_App/workers/yolo_processor.py
 
 import os
-import csv
 import cv2
 import traceback
 from PyQt5.QtCore import QThread, pyqtSignal
-from core.stopwatch import Stopwatch
+from core.progress_reporter import ProgressReporter
+from core.stage_timer import NULL_STAGE_TIMER, STAGE_DECODE, STAGE_PREDICT, STAGE_POSTPROCESS, STAGE_DRAW, STAGE_ENCODE
+from core.inference_pipeline import InferencePipeline
+from core.batch_tuner import resolve_batch_size, DEFAULT_CANDIDATES
+from core.result_extraction import DetectionArrays, DETECTION_CSV_HEADER, TANK_COLUMN
+from core.checkpoint import ResumableOutputs, run_signature
+from core.multiprocess_inference import run_sharded, apply_thread_budget
+from core.stride_interpolation import StrideInterpolator, INTERPOLATED_COLUMN
+from core.tank_crops import TankCropLayout
+from core.frame_ring import FrameRing
+from core.video_source import open_video
+from core.motion_gate import MotionGate, CARRIED_COLUMN, DEFAULT_THRESHOLD_PERCENT
+from core.model_export import load_model, ensure_exported, backend_available, BACKEND_PYTORCH
+from core.model_service import ServiceModel
 
 try:
     import numpy as np
@@ -16,14 +28,17 @@ except ImportError:
 
 class YoloProcessor(QThread):
     overall_progress = pyqtSignal(int, int, str)
-    file_progress = pyqtSignal(int, int, int)
+    progress_updated = pyqtSignal(object)  # ProgressUpdate, rate-limited
     log_message = pyqtSignal(str)
     finished = pyqtSignal()
     error = pyqtSignal(str)
-    time_updated = pyqtSignal(str, str)
-    speed_updated = pyqtSignal(float)
 
-    def __init__(self, video_files, model_path, output_dir, confidence, save_video, save_csv, parent=None):
+    def __init__(self, video_files, model_path, output_dir, confidence, save_video, save_csv,
+                 pipeline=False, pipeline_queue_size=4, batch_size=12, auto_batch_size=False,
+                 memory_limit_mb=None, resume=False, checkpoint_seconds=300, num_processes=1,
+                 threads_per_process=None, frame_stride=1, tank_settings_file=None, imgsz=None,
+                 motion_gate=False, motion_threshold=DEFAULT_THRESHOLD_PERCENT, backend=BACKEND_PYTORCH, use_model_service=False,
+                 stage_timer=None, parent=None):
         super().__init__(parent)
         self.video_files = video_files
         self.model_path = model_path
@@ -31,8 +46,35 @@ class YoloProcessor(QThread):
         self.confidence = confidence
         self.save_video = save_video
         self.save_csv = save_csv
+        self.pipeline = pipeline
+        self.pipeline_queue_size = pipeline_queue_size
+        self.batch_size = batch_size
+        self.auto_batch_size = auto_batch_size
+        self.memory_limit_mb = memory_limit_mb
+        self.resume = resume
+        self.checkpoint_seconds = checkpoint_seconds
+        self.num_processes = num_processes
+        self.threads_per_process = threads_per_process
+        self.frame_stride = max(1, int(frame_stride))
+        self.tank_settings_file = tank_settings_file
+        self.imgsz = imgsz
+        self.motion_gate = motion_gate
+        self.motion_threshold = motion_threshold
+        self.backend = backend
+        self.use_model_service = use_model_service
+        self.stage_timer = stage_timer  # optional StageTimer, e.g. for benchmarks
         self.is_running = True
 
+    def _shard_kwargs(self):
+        return dict(model_path=self.model_path, output_dir=self.output_dir, confidence=self.confidence,
+                    save_video=self.save_video, save_csv=self.save_csv, pipeline=self.pipeline,
+                    pipeline_queue_size=self.pipeline_queue_size, batch_size=self.batch_size,
+                    auto_batch_size=self.auto_batch_size, memory_limit_mb=self.memory_limit_mb, resume=self.resume,
+                    checkpoint_seconds=self.checkpoint_seconds, threads_per_process=self.threads_per_process,
+                    frame_stride=self.frame_stride, tank_settings_file=self.tank_settings_file, imgsz=self.imgsz,
+                    motion_gate=self.motion_gate, motion_threshold=self.motion_threshold, backend=self.backend,
+                    use_model_service=self.use_model_service)
+
     def stop(self):
         self.log_message.emit("Stopping inference process...")
         self.is_running = False
@@ -42,9 +84,28 @@ class YoloProcessor(QThread):
             self.error.emit("Dependencies not found. Please run: pip install ultralytics numpy")
             return
 
+        if self.num_processes > 1 and len(self.video_files) > 1:
+            if self.backend != BACKEND_PYTORCH and backend_available(self.backend):
+                # Export once up front so the child processes only load the cached model
+                try: ensure_exported(self.model_path, self.backend, self.imgsz, log=self.log_message.emit)
+                except Exception as e: self.log_message.emit(f"[WARNING] {self.backend} export failed ({e}).")
+            # Each child process runs this same worker on its share of the videos
+            run_sharded(self, self._shard_kwargs(), self.num_processes, self.threads_per_process)
+            self.log_message.emit("\n--- YOLO Inference Complete ---" if self.is_running else "\n--- YOLO Inference Cancelled ---")
+            self.finished.emit()
+            return
+        if self.threads_per_process:
+            apply_thread_budget(self.threads_per_process)
+
         try:
             self.log_message.emit(f"Loading YOLO model from: {self.model_path}")
-            model = YOLO(self.model_path)
+            if self.use_model_service:
+                # The model stays loaded in a background process shared by every dialog and run
+                model = ServiceModel(self.model_path, self.backend, "detect", self.imgsz, log=self.log_message.emit)
+                weights_path, imgsz = model.weights_path, model.imgsz
+                self.log_message.emit("Using the warm model service.")
+            else:
+                model, weights_path, imgsz = load_model(self.model_path, self.backend, "detect", self.imgsz, log=self.log_message.emit)
             self.log_message.emit("Model loaded successfully.")
         except Exception as e:
             self.error.emit(f"Failed to load YOLO model: {e}")
@@ -52,20 +113,25 @@ class YoloProcessor(QThread):
 
         # Try GPU
         use_cuda = False
-        try:
-            import torch
-            if torch.cuda.is_available():
-                try:
-                    model.to("cuda")
-                    use_cuda = True
-                    self.log_message.emit("Using CUDA for inference.")
-                except Exception:
-                    use_cuda = True
-                    self.log_message.emit("CUDA available, using device='cuda' for predict.")
-            else:
-                self.log_message.emit("CUDA not available — using CPU.")
-        except Exception:
-            self.log_message.emit("torch not found — defaulting to CPU.")
+        if self.use_model_service:
+            self.log_message.emit("Device placement is handled by the model service.")
+        elif weights_path != self.model_path:
+            self.log_message.emit(f"Running the exported {self.backend} model on the CPU.")
+        else:
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    try:
+                        model.to("cuda")
+                        use_cuda = True
+                        self.log_message.emit("Using CUDA for inference.")
+                    except Exception:
+                        use_cuda = True
+                        self.log_message.emit("CUDA available, using device='cuda' for predict.")
+                else:
+                    self.log_message.emit("CUDA not available — using CPU.")
+            except Exception:
+                self.log_message.emit("torch not found — defaulting to CPU.")
 
         # Prepare class colors
         class_names = model.names
@@ -77,150 +143,238 @@ class YoloProcessor(QThread):
 
         centroid_color = (0, 0, 255)
 
-        # Adjust batch size depending on GPU memory
-        batch_size = 12
-
+        predict_kwargs = {"conf": self.confidence, "verbose": False}
+        if use_cuda:
+            predict_kwargs["device"] = "cuda"
+        if imgsz:
+            predict_kwargs["imgsz"] = imgsz
+        device_name = "cuda" if use_cuda else "cpu"
+        label_columns = []  # per-detection labels written after the detection columns
+        if self.tank_settings_file:
+            label_columns.append(TANK_COLUMN)
+            self.log_message.emit(f"Running the model on per-tank crops from {os.path.basename(self.tank_settings_file)}; "
+                                  f"detections are written with their '{TANK_COLUMN}' already assigned.")
+        if self.motion_gate:
+            label_columns.append(CARRIED_COLUMN)
+            self.log_message.emit(f"Motion gate enabled: {'tanks' if self.tank_settings_file else 'frames'} with less than {self.motion_threshold:g}% changed pixels "
+                                  f"reuse their previous detections (flagged in the '{CARRIED_COLUMN}' column).")
+        csv_header = DETECTION_CSV_HEADER + label_columns
+        if self.frame_stride > 1:
+            csv_header = csv_header + [INTERPOLATED_COLUMN]
+            self.log_message.emit(f"Running the model on 1 of every {self.frame_stride} frames; skipped frames get interpolated detections "
+                                  f"(flagged in the '{INTERPOLATED_COLUMN}' column). The annotated video shows the analysed frames only.")
+
+        progress = ProgressReporter(self.progress_updated.emit)
+        timer = self.stage_timer or NULL_STAGE_TIMER
         for idx, video_path in enumerate(self.video_files):
             if not self.is_running:
                 break
 
             video_filename = os.path.basename(video_path)
             self.overall_progress.emit(idx + 1, len(self.video_files), video_filename)
-            self.file_progress.emit(0, 0, 0)
-            self.time_updated.emit("00:00:00", "--:--:--")
-            self.speed_updated.emit(0.0)
+            progress.reset()
 
             base_name = os.path.splitext(video_filename)[0]
             self.log_message.emit(f"\n--- Starting processing for: {video_filename} ---")
+            outputs = None
 
             try:
-                cap = cv2.VideoCapture(video_path)
-                if not cap.isOpened():
+                cap = open_video(video_path)
+                if not cap.is_opened():
                     self.log_message.emit(f"[WARNING] Could not open video: {video_filename}. Skipping.")
                     continue
 
-                width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                fps, total_frames = cap.get(cv2.CAP_PROP_FPS) or 30.0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-                out_video = None
-                if self.save_video:
-                    out_video_path = os.path.join(self.output_dir, f"{base_name}_inference.mp4")
-                    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                    out_video = cv2.VideoWriter(out_video_path, fourcc, fps, (width, height))
-
-                all_detections_data = []
-                frame_idx = 0
-                frame_count_for_fps = 0
-                fps_check_time = 0
-
-                file_stopwatch = Stopwatch()
-                file_stopwatch.start()
-
-                # Batching buffers
-                batch_frames = []
-                batch_indices = []
-
-                def process_batch(frames_batch, indices_batch):
-                    nonlocal all_detections_data, out_video
-                    if not frames_batch:
-                        return
-
-                    predict_kwargs = {"conf": self.confidence, "verbose": False}
-                    if use_cuda:
-                        predict_kwargs["device"] = "cuda"
+                width, height = cap.width, cap.height
+                fps, total_frames = cap.fps, cap.frame_count
+
+                layout = None
+                if self.tank_settings_file:
+                    layout = TankCropLayout.from_settings_file(self.tank_settings_file, (width, height))
+                    if not len(layout):
+                        self.log_message.emit(f"[WARNING] No tank of the grid lies inside {video_filename}. Skipping.")
+                        cap.release()
+                        continue
+
+                outputs = ResumableOutputs(self.output_dir, base_name, "detections", "inference", csv_header,
+                                           run_signature(video_path, weights_path, self.confidence, self.save_video, self.save_csv,
+                                                         self.frame_stride, self.tank_settings_file, imgsz,
+                                                         self.motion_threshold if self.motion_gate else None),
+                                           self.save_csv, self.save_video, fps / self.frame_stride, (width, height),
+                                           checkpoint_seconds=self.checkpoint_seconds, log=self.log_message.emit)
+                if self.resume and outputs.is_complete():
+                    self.log_message.emit(f"Outputs for {video_filename} are already complete. Skipping.")
+                    cap.release(); outputs = None
+                    continue
+                start_frame = outputs.open(self.resume)
+                if start_frame > 0 and not cap.seek(start_frame):
+                    # Resuming at the wrong frame would attach detections to the wrong frame numbers
+                    self.log_message.emit(f"[ERROR] Could not seek {video_filename} to frame {start_frame} to resume; the checkpoint is kept. Skipping.")
+                    outputs.abort(); cap.release(); outputs = None
+                    continue
 
+                frame_idx = start_frame
+                progress.start(total_frames, start_frame)
+
+                warmup_frames = []
+                batch_size = self.batch_size
+                if self.auto_batch_size:
+                    def read_warmup_frames():
+                        while len(warmup_frames) < max(DEFAULT_CANDIDATES):
+                            ret, frame = cap.read()
+                            if not ret:
+                                break
+                            warmup_frames.append(frame)
+                        return warmup_frames if layout is None else layout.crops(warmup_frames)
+                    tune_w, tune_h = (width, height) if layout is None else layout.crop_size
+                    batch_size = resolve_batch_size(weights_path, lambda frames: model.predict(frames, **predict_kwargs),
+                                                    read_warmup_frames, tune_w, tune_h, device_name,
+                                                    self.memory_limit_mb, log=self.log_message.emit)
+                # In crop mode the batch size counts crops, so whole frames are batched until it is filled
+                frames_per_batch = batch_size if layout is None else max(1, batch_size // len(layout))
+                # Frames are decoded into recycled buffers; two batches cover the frame held back by a stride
+                ring = FrameRing((height, width, 3), preallocate=2 * frames_per_batch)
+
+                read_idx = start_frame
+                fallback_reported = False
+                interpolator = StrideInterpolator(label_columns) if self.frame_stride > 1 else None
+                gate = None
+                if self.motion_gate:
+                    gate = MotionGate((width, height), [box[1:] for box in layout.boxes] if layout is not None else None,
+                                      threshold_percent=self.motion_threshold)
+
+                def committed_frame():
+                    # With a stride, the last keyframe is held back until the next one is inferred
+                    if interpolator is not None and interpolator.pending_frame is not None:
+                        return interpolator.pending_frame
+                    return frame_idx
+
+                def read_batch():
+                    nonlocal read_idx
+                    frames_batch, indices_batch = [], []
+                    while len(frames_batch) < frames_per_batch:
+                        is_keyframe = read_idx % self.frame_stride == 0
+                        if warmup_frames:
+                            # Frames already decoded for auto-tuning are processed first
+                            frame = warmup_frames.pop(0)
+                        elif is_keyframe:
+                            frame = ring.read(cap)
+                            if frame is None:
+                                break
+                        elif cap.grab():
+                            frame = None  # skipped frames are only demuxed, never decoded
+                        else:
+                            break
+                        if is_keyframe:
+                            frames_batch.append(frame)
+                            indices_batch.append(read_idx)
+                        read_idx += 1
+                    return (frames_batch, indices_batch) if frames_batch else None
+
+                def run_model(inputs):
+                    nonlocal fallback_reported
                     try:
-                        results_list = model.predict(frames_batch, **predict_kwargs)
-                    except Exception:
-                        # fallback: process one by one
-                        results_list = [model.predict(f, **predict_kwargs)[0] for f in frames_batch]
-
-                    for res, fidx, frame in zip(results_list, indices_batch, frames_batch):
-                        if res.boxes is not None:
-                            for box in res.boxes:
-                                if self.save_video or self.save_csv:
-                                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                                    bw, bh = x2 - x1, y2 - y1
-                                    inset_x, inset_y = bw * 0.05, bh * 0.05
-
-                                    x1f = x1 + inset_x
-                                    y1f = y1 + inset_y
-                                    x2f = x2 - inset_x
-                                    y2f = y2 - inset_y
-
-                                    conf_val, cls_id = float(box.conf[0]), int(box.cls[0])
-                                    class_name = class_names.get(cls_id, "Unknown")
-                                    cx, cy = (x1f + x2f) / 2.0, (y1f + y2f) / 2.0
-
-                                    if self.save_video:
-                                        color = class_colors.get(class_name, (255, 255, 255))
-                                        cv2.rectangle(frame, (int(x1f), int(y1f)), (int(x2f), int(y2f)), color, 2)
-                                        label_text = f"{class_name} {conf_val:.2f}"
-                                        cv2.putText(frame, label_text, (int(x1f), int(y1f) - 10),
-                                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                                        cv2.circle(frame, (int(round(cx)), int(round(cy))), 4, centroid_color, -1)
-
-                                    if self.save_csv:
-                                        all_detections_data.append([
-                                            fidx, class_name, f"{conf_val:.4f}",
-                                            f"{x1f:.4f}", f"{y1f:.4f}", f"{x2f:.4f}", f"{y2f:.4f}",
-                                            f"{cx:.4f}", f"{cy:.4f}"
-                                        ])
-
-                        if self.save_video and out_video is not None:
-                            out_video.write(frame)
+                        return model.predict(inputs, **predict_kwargs)
+                    except Exception as e:
+                        if not fallback_reported:
+                            self.log_message.emit(f"[WARNING] Batched prediction of {len(inputs)} images failed ({e}). "
+                                                  "Falling back to one image at a time; consider a smaller batch size.")
+                            fallback_reported = True
+                        return [model.predict(f, **predict_kwargs)[0] for f in inputs]
+
+                def predict_batch(frames_batch, indices_batch):
+                    inputs = frames_batch if layout is None else layout.crops(frames_batch)
+                    return run_model(inputs) if gate is None else gate.predict(frames_batch, inputs, run_model)
+
+                def write_batch(frames_batch, indices_batch, results_list):
+                    nonlocal frame_idx
+                    result_columns = {CARRIED_COLUMN: results_list.carried} if gate is not None else {}
+                    if layout is None:
+                        dets = DetectionArrays(results_list, indices_batch, class_names)
+                        for name, values in result_columns.items(): dets.add_result_column(name, values)
+                    else:
+                        dets = layout.frame_detections(results_list, indices_batch, class_names, result_columns)
+                    if self.save_csv and interpolator is None:
+                        outputs.write_rows(dets.csv_rows(extra_columns=[getattr(dets, name).astype(str) for name in label_columns]))
+
+                    if self.save_video:
+                        with timer.measure(STAGE_DRAW):
+                            # Pixel coordinates are converted once for the whole batch
+                            x1i, y1i, x2i, y2i = (v.astype(np.int64).tolist() for v in (dets.x1, dets.y1, dets.x2, dets.y2))
+                            cxi, cyi = np.rint(dets.cx).astype(np.int64).tolist(), np.rint(dets.cy).astype(np.int64).tolist()
+                            names, confs = dets.class_name.tolist(), dets.conf.tolist()
+                            for k, frame in enumerate(frames_batch):
+                                for i in dets.frame_range(k):
+                                    color = class_colors.get(names[i], (255, 255, 255))
+                                    cv2.rectangle(frame, (x1i[i], y1i[i]), (x2i[i], y2i[i]), color, 2)
+                                    cv2.putText(frame, f"{names[i]} {confs[i]:.2f}", (x1i[i], y1i[i] - 10),
+                                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+                                    cv2.circle(frame, (cxi[i], cyi[i]), 4, centroid_color, -1)
+                                if interpolator is None:
+                                    with timer.measure(STAGE_ENCODE): outputs.write_frame(frame)
+
+                    if interpolator is not None:
+                        for k, frame in enumerate(frames_batch):
+                            columns = dets.columns(dets.frame_range(k))
+                            columns.update({name: getattr(dets, name)[dets.frame_range(k)] for name in label_columns})
+                            rows, released_frame = interpolator.push(indices_batch[k], columns, payload=frame if self.save_video else None)
+                            outputs.write_rows(rows)
+                            if released_frame is not None:
+                                with timer.measure(STAGE_ENCODE): outputs.write_frame(released_frame)
+                                ring.release([released_frame])
+                    if interpolator is None or not self.save_video:
+                        ring.release(frames_batch)
+
+                    covered = indices_batch[-1] + 1 - frame_idx
+                    frame_idx += covered
+                    outputs.end_batch(committed_frame())
+                    progress.update(frame_idx)
+
+                # Stage timings (for benchmarks); drawing and encoding are measured inside write_batch
+                read_batch, predict_batch = timer.timed(STAGE_DECODE, read_batch), timer.timed(STAGE_PREDICT, predict_batch)
+                write_batch = timer.timed(STAGE_POSTPROCESS, write_batch)
 
                 # Main loop
-                while self.is_running:
-                    ret, frame = cap.read()
-                    if not ret:
-                        if batch_frames:
-                            process_batch(batch_frames, batch_indices)
-                            batch_frames, batch_indices = [], []
-                        break
-
-                    batch_frames.append(frame.copy())
-                    batch_indices.append(frame_idx)
-
-                    frame_idx += 1
-                    frame_count_for_fps += 1
-
-                    if len(batch_frames) >= batch_size:
-                        process_batch(batch_frames, batch_indices)
-                        batch_frames, batch_indices = [], []
-
-                    current_time = file_stopwatch.get_elapsed_time(as_float=True)
-                    if current_time > fps_check_time + 1:
-                        processing_fps = frame_count_for_fps / (current_time - fps_check_time)
-                        self.speed_updated.emit(processing_fps)
-                        frame_count_for_fps, fps_check_time = 0, current_time
-
-                    if total_frames > 0:
-                        progress = int(frame_idx * 100 / total_frames)
-                        self.file_progress.emit(progress, frame_idx, total_frames)
-                        self.time_updated.emit(file_stopwatch.get_elapsed_time(),
-                                               file_stopwatch.get_etr(frame_idx, total_frames))
+                if self.pipeline:
+                    # Decode, inference and draw/encode overlap on separate threads
+                    InferencePipeline(read_batch, predict_batch, write_batch,
+                                      is_running=lambda: self.is_running,
+                                      queue_size=self.pipeline_queue_size).run()
+                else:
+                    while self.is_running:
+                        batch = read_batch()
+                        if batch is None:
+                            break
+                        frames_batch, indices_batch = batch
+                        write_batch(frames_batch, indices_batch, predict_batch(frames_batch, indices_batch))
 
                 cap.release()
-                if self.save_video and out_video is not None:
-                    out_video.release()
-                    self.log_message.emit(f"✓ Saved annotated video to: {os.path.basename(out_video_path)}")
-
-                if self.save_csv:
-                    out_csv_path = os.path.join(self.output_dir, f"{base_name}_detections.csv")
-                    with open(out_csv_path, 'w', newline='') as f:
-                        writer = csv.writer(f)
-                        writer.writerow(["frame_idx", "class_name", "conf", "x1", "y1", "x2", "y2", "cx", "cy"])
-                        writer.writerows(all_detections_data)
-                    self.log_message.emit(f"✓ Saved detections CSV to: {os.path.basename(out_csv_path)}")
+                progress.finish()
+                if not self.is_running:
+                    outputs.interrupt(committed_frame())
+                    continue
+                if interpolator is not None:
+                    rows, released_frame = interpolator.flush()
+                    outputs.write_rows(rows)
+                    if released_frame is not None:
+                        outputs.write_frame(released_frame)
+                outputs.finish(read_idx)
 
             except Exception as e:
                 self.log_message.emit(f"[ERROR] Failed during processing of {video_filename}: {e}")
                 self.log_message.emit(traceback.format_exc())
-                if 'cap' in locals() and cap.isOpened(): cap.release()
-                if 'out_video' in locals() and out_video is not None: out_video.release()
+                if 'cap' in locals(): cap.release()
+                if outputs is not None: outputs.abort()
                 continue
 
+            # The outputs are published; nothing below may be reported as a processing failure
+            if gate is not None:
+                total = gate.inferred + gate.skipped
+                self.log_message.emit(f"Motion gate skipped {gate.skipped} of {total} model inputs ({100.0 * gate.skipped / max(1, total):.1f}%).")
+            if self.save_video:
+                self.log_message.emit(f"✓ Saved annotated video to: {os.path.basename(outputs.video_path)}")
+            if self.save_csv:
+                self.log_message.emit(f"✓ Saved detections CSV to: {os.path.basename(outputs.csv_path)} ({outputs.csv_writer.rows_written} rows)")
+
         if self.is_running:
             self.log_message.emit("\n--- YOLO Inference Complete ---")
         else:
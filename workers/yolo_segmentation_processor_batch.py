@@ -6,6 +6,8 @@ import cv2
 import traceback
 from PyQt5.QtCore import QThread, pyqtSignal
 from core.stopwatch import Stopwatch
+from core.video_source import open_video
+from core.mask_compositing import composite_masks
 
 try:
     import numpy as np
@@ -57,11 +59,11 @@ class YoloSegmentationProcessor(QThread):
             self.log_message.emit(f"\n--- Starting segmentation for: {video_filename} ---")
             
             try:
-                cap = cv2.VideoCapture(video_path)
-                if not cap.isOpened(): self.log_message.emit(f"[WARNING] Could not open video: {video_filename}. Skipping."); continue
+                cap = open_video(video_path)
+                if not cap.is_opened(): self.log_message.emit(f"[WARNING] Could not open video: {video_filename}. Skipping."); continue
                 
-                width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                fps, total_frames = cap.get(cv2.CAP_PROP_FPS) or 30.0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                width, height = cap.width, cap.height
+                fps, total_frames = cap.fps, cap.frame_count
 
                 out_video = None
                 if self.save_video:
@@ -78,7 +80,7 @@ class YoloSegmentationProcessor(QThread):
                     ret, frame = cap.read()
                     if not ret: break
                     results_list = model.predict(frame, conf=self.confidence, verbose=False)
-                    results = results_list[0]; overlay = frame.copy(); has_drawn_mask = False
+                    results = results_list[0]; mask_polygons, mask_colors, annotations = [], [], []
                     if results.masks is not None:
                         for i in range(len(results.masks)):
                             if not self.is_running: break
@@ -102,11 +104,12 @@ class YoloSegmentationProcessor(QThread):
                                 polygon_points_str = ";".join([",".join(map(str, p[0])) for cnt in contours for p in cnt])
                                 all_detections_data.append([frame_idx, class_name, f"{conf:.4f}", f"{x1f:.4f}", f"{y1f:.4f}", f"{x2f:.4f}", f"{y2f:.4f}", f"{cx:.4f}", f"{cy:.4f}", polygon_points_str])
                             if self.save_video:
-                                overlay[mask_resized.astype(bool)] = color; has_drawn_mask = True
-                                cv2.rectangle(frame, (int(x1f), int(y1f)), (int(x2f), int(y2f)), color, 1)
-                                cv2.circle(frame, (int(round(cx)), int(round(cy))), 8, centroid_color, -1)
+                                mask_polygons.append(np.rint(results.masks.xy[i]).astype(np.int32)); mask_colors.append(color)
+                                annotations.append(((int(x1f), int(y1f)), (int(x2f), int(y2f)), (int(round(cx)), int(round(cy))), color))
                     if self.save_video:
-                        if has_drawn_mask: frame = cv2.addWeighted(overlay, 0.4, frame, 0.6, 0)
+                        composite_masks(frame, mask_polygons, mask_colors)
+                        for top_left, bottom_right, centroid, color in annotations:
+                            cv2.rectangle(frame, top_left, bottom_right, color, 1); cv2.circle(frame, centroid, 8, centroid_color, -1)
                         out_video.write(frame)
                     
                     frame_idx += 1
@@ -133,7 +136,7 @@ class YoloSegmentationProcessor(QThread):
                     self.log_message.emit(f"✓ Saved segmentations CSV to: {os.path.basename(out_csv_path)}")
             except Exception as e:
                 self.log_message.emit(f"[ERROR] Failed during processing of {video_filename}: {e}"); self.log_message.emit(traceback.format_exc())
-                if 'cap' in locals() and cap.isOpened(): cap.release()
+                if 'cap' in locals(): cap.release()
                 if 'out_video' in locals() and out_video is not None: out_video.release()
                 continue
         